@@ -0,0 +1,135 @@
+"""Load-test the chat request path: threaded sync `answer_query` vs streamed `answer_query_async`.
+
+Run from the `python/` directory:
+
+    python -m benchmarks.bench_chat_concurrency --users 1 10 50 100 --latency 0.2
+
+Backends are in-process stubs: embeddings and completions sleep for
+`--latency` seconds (the completion streams `--tokens` deltas over that
+time) and search runs against Qdrant's in-memory client. Caches are
+disabled so every request takes the full path. Reports time-to-first-token
+and completed requests per second for N simultaneous users.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+import types
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")
+
+import qdrant_client
+from qdrant_client.http.models import Distance, PointStruct, VectorParams
+
+import chat_app
+from vector_store import QdrantStore
+
+DIM = 8
+
+
+def _vector(seed: int):
+    return [float((seed * 31 + i * 7) % 11) + 1.0 for i in range(DIM)]
+
+
+def install_stubs(latency: float, n_tokens: int):
+    points = [PointStruct(id=i, vector=_vector(i), payload={"url": f"https://example.com/{i}/", "text": f"chunk {i}"})
+              for i in range(200)]
+    qdrant = qdrant_client.QdrantClient(":memory:")
+    qdrant.create_collection("docs", vectors_config=VectorParams(size=DIM, distance=Distance.COSINE))
+    qdrant.upsert("docs", points=points)
+    async_qdrant = qdrant_client.AsyncQdrantClient(":memory:")
+
+    def embed(model, input, **kwargs):
+        time.sleep(latency)
+        return types.SimpleNamespace(data=[types.SimpleNamespace(embedding=_vector(len(t))) for t in input])
+
+    def complete(**kwargs):
+        time.sleep(latency)
+        return types.SimpleNamespace(content=[types.SimpleNamespace(type="text", text="token " * n_tokens)],
+                                     usage=types.SimpleNamespace(input_tokens=100, output_tokens=n_tokens))
+
+    async def embed_async(model, input, **kwargs):
+        await asyncio.sleep(latency)
+        return types.SimpleNamespace(data=[types.SimpleNamespace(embedding=_vector(len(t))) for t in input])
+
+    class Stream:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def __aiter__(self):
+            usage = types.SimpleNamespace(input_tokens=100, output_tokens=1)
+            yield types.SimpleNamespace(type="message_start", message=types.SimpleNamespace(usage=usage))
+            for _ in range(n_tokens):
+                await asyncio.sleep(latency / n_tokens)
+                yield types.SimpleNamespace(type="content_block_delta",
+                                            delta=types.SimpleNamespace(type="text_delta", text="token "))
+            yield types.SimpleNamespace(type="message_delta", usage=types.SimpleNamespace(output_tokens=n_tokens))
+
+    chat_app.qdrant = qdrant
+    chat_app.async_qdrant = async_qdrant
+    chat_app.vector_store = QdrantStore(qdrant, "docs", async_qdrant)
+    chat_app.openai_client = types.SimpleNamespace(embeddings=types.SimpleNamespace(create=embed))
+    chat_app.anthropic_client = types.SimpleNamespace(messages=types.SimpleNamespace(create=complete))
+    chat_app.async_openai_client = types.SimpleNamespace(embeddings=types.SimpleNamespace(create=embed_async))
+    chat_app.async_anthropic_client = types.SimpleNamespace(messages=types.SimpleNamespace(stream=lambda **kw: Stream()))
+    chat_app.embedding_cache = None
+    chat_app.query_cache = None
+    return async_qdrant, points
+
+
+async def one_sync_request(i: int):
+    start = time.perf_counter()
+    await asyncio.to_thread(chat_app.answer_query, f"question {i}")
+    elapsed = time.perf_counter() - start
+    return elapsed, elapsed  # nothing is shown before the full answer
+
+
+async def one_async_request(i: int):
+    start = time.perf_counter()
+    first_token = None
+
+    async def on_token(token: str):
+        nonlocal first_token
+        if first_token is None:
+            first_token = time.perf_counter() - start
+
+    await chat_app.answer_query_async(f"question {i}", on_token=on_token)
+    return first_token, time.perf_counter() - start
+
+
+async def run(users: int, request):
+    start = time.perf_counter()
+    results = await asyncio.gather(*(request(i) for i in range(users)))
+    wall = time.perf_counter() - start
+    ttft = sorted(r[0] for r in results)
+    return statistics.median(ttft), ttft[int(0.95 * (len(ttft) - 1))], users / wall
+
+
+async def main_async(args):
+    async_qdrant, points = install_stubs(args.latency, args.tokens)
+    await async_qdrant.create_collection("docs", vectors_config=VectorParams(size=DIM, distance=Distance.COSINE))
+    await async_qdrant.upsert("docs", points=points)
+
+    print(f"stub latency {args.latency * 1e3:.0f} ms per backend call")
+    print(f"{'users':>6} {'path':>6} {'TTFT p50 ms':>12} {'TTFT p95 ms':>12} {'req/s':>8}")
+    for users in args.users:
+        for name, request in (("sync", one_sync_request), ("async", one_async_request)):
+            p50, p95, rps = await run(users, request)
+            print(f"{users:>6} {name:>6} {p50 * 1e3:>12.0f} {p95 * 1e3:>12.0f} {rps:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 10, 50, 100])
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per stubbed backend call")
+    parser.add_argument("--tokens", type=int, default=20, help="streamed deltas per answer")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Micro-benchmark the offset-mapped chunker against the previous decode-per-window chunker.
+
+Run from the `python/` directory (needs the cl100k_base tiktoken encoding):
+
+    python -m benchmarks.bench_chunking --tokens 20000 100000
+"""
+import argparse
+import random
+import time
+from typing import List
+
+import chunking
+
+SIZE, OVERLAP = 800, 40
+
+
+def decode_per_window(text: str, size: int = SIZE, overlap: int = OVERLAP) -> List[str]:
+    """The previous chunker: slice the token list per window and decode each slice separately."""
+    encoding = chunking.get_encoding()
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= size:
+        return [text] if text.strip() else []
+    chunks = []
+    for i in range(0, len(tokens), size - overlap):
+        chunk = encoding.decode(tokens[i:i + size])
+        if chunk.strip():
+            chunks.append(chunk.strip())
+    return chunks
+
+
+def make_page(n_tokens: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    words = ["Ruter", "billett", "linje", "31", "Jernbanetorget", "avgang", "sone", "1", "reisende", "æøå"]
+    sentences = []
+    while len(sentences) * 12 < n_tokens:
+        sentences.append(" ".join(rng.choice(words) for _ in range(rng.randint(6, 16))) + ".")
+    return " ".join(sentences)
+
+
+def timed(fn, text: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tokens", type=int, nargs="+", default=[5000, 20000, 100000], help="approx. page sizes")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    chunking.get_encoding()  # load the tokenizer outside the timings
+    print(f"{'tokens':>8} {'decode/window ms':>17} {'offsets ms':>11} {'offsets+snap ms':>16} {'chunks':>7}")
+    for n_tokens in args.tokens:
+        text = make_page(n_tokens)
+        old = timed(decode_per_window, text, args.repeat)
+        new = timed(chunking.chunk_text, text, args.repeat)
+        snapped = timed(lambda t: chunking.chunk_text(t, snap=True), text, args.repeat)
+        n_chunks = len(chunking.chunk_text(text))
+        print(f"{len(chunking.get_encoding().encode(text)):>8} {old * 1e3:>17.2f} {new * 1e3:>11.2f} "
+              f"{snapped * 1e3:>16.2f} {n_chunks:>7}")
+
+
+if __name__ == "__main__":
+    main()
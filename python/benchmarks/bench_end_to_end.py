@@ -0,0 +1,360 @@
+"""End-to-end throughput of indexing and latency of answering, against local stubs only.
+
+Run from the `python/` directory:
+
+    python -m benchmarks.bench_end_to_end --pages 200 --queries 200 --json results.jsonl
+
+Everything external is replaced by something local, so runs are repeatable
+and free:
+
+- the website is a generated static site (`--pages` pages of `--words`
+  words, each linking to a few others) served from a temp directory;
+- OpenAI embeddings and Anthropic messages are answered by an in-process
+  HTTP stub that sleeps `--embed-latency` / `--llm-latency` seconds per
+  request, so the real SDK clients, retries and connection pools are used;
+- Qdrant is the in-memory client.
+
+The indexing stages are first timed in isolation (crawl incl. parsing,
+chunking, embedding, upserting) and then together through `index_website`
+(a full, non-incremental run with the configured pipeline), with the
+politeness delay replaced by `--crawl-delay`. The one-off collection
+(re)creation pause is reported separately and not counted in the end-to-end
+rates. Queries then go through `answer_query` one at a time with
+the query and embedding caches disabled.
+
+State files (index state, BM25 index, frontier, caches) live in a temp
+working directory. Chunking needs tiktoken's `cl100k_base` data, which is
+downloaded on first use unless it is already in TIKTOKEN_CACHE_DIR.
+
+With `--json` one result line (parameters, rates, latencies and the git
+commit) is appended to the file, for comparing runs across commits.
+"""
+import argparse
+import base64
+import hashlib
+import json
+import logging
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from functools import partial
+from http.server import BaseHTTPRequestHandler, SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# --- Fixtures ---
+def make_site(directory: str, n_pages: int, n_words: int, n_links: int = 5, seed: int = 0) -> list:
+    """Write `n_pages` HTML pages into `directory`; returns the vocabulary used."""
+    rng = random.Random(seed)
+    vocabulary = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 10)))
+                  for _ in range(5000)]
+    for page in range(n_pages):
+        sentences, words = [], 0
+        while words < n_words:
+            length = rng.randint(6, 20)
+            sentences.append(" ".join(rng.choices(vocabulary, k=length)).capitalize() + ".")
+            words += length
+        paragraphs = [" ".join(sentences[i:i + 5]) for i in range(0, len(sentences), 5)]
+        links = "".join(f'<li><a href="/page{rng.randrange(1, n_pages)}.html">related</a></li>' for _ in range(n_links))
+        body = "".join(f"<p>{p}</p>" for p in paragraphs)
+        with open(os.path.join(directory, "index.html" if page == 0 else f"page{page}.html"), "w") as f:
+            f.write(f"<html><head><title>Page {page}</title></head><body><nav><ul>"
+                    f'<li><a href="/page{(page + 1) % n_pages or 1}.html">next</a></li>{links}</ul></nav>'
+                    f"<main><h1>Page {page}</h1>{body}</main></body></html>")
+    return vocabulary
+
+
+class _SiteHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class _StubAPIHandler(BaseHTTPRequestHandler):
+    """OpenAI /v1/embeddings and Anthropic /v1/messages (plain and streamed)."""
+    embed_latency = 0.0
+    llm_latency = 0.0
+    dimensions = 1536
+    answer_tokens = 50
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body: bytes, content_type: str = "application/json"):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path.endswith("/embeddings"):
+            self._embeddings(request)
+        elif self.path.endswith("/messages"):
+            self._messages(request)
+        else:
+            self.send_error(404)
+
+    def _embeddings(self, request):
+        time.sleep(self.embed_latency)
+        inputs = request["input"] if isinstance(request["input"], list) else [request["input"]]
+        data = []
+        for i, text in enumerate(inputs):
+            seed = int.from_bytes(hashlib.blake2b(str(text).encode("utf-8"), digest_size=8).digest(), "big")
+            vector = np.random.default_rng(seed).standard_normal(request.get("dimensions", self.dimensions))
+            vector = vector.astype(np.float32)
+            vector /= np.linalg.norm(vector)
+            embedding = (base64.b64encode(vector.tobytes()).decode("ascii")
+                         if request.get("encoding_format") == "base64" else vector.tolist())
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+        tokens = sum(len(str(text).split()) for text in inputs)
+        self._send(json.dumps({"object": "list", "data": data, "model": request.get("model"),
+                               "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}).encode("utf-8"))
+
+    def _messages(self, request):
+        input_tokens = sum(len(str(m.get("content", "")).split()) for m in request.get("messages", []))
+        message = {"id": "msg_bench", "type": "message", "role": "assistant", "model": request.get("model"),
+                   "stop_reason": None, "stop_sequence": None, "usage": {"input_tokens": input_tokens, "output_tokens": 1}}
+        if not request.get("stream"):
+            time.sleep(self.llm_latency)
+            message.update(content=[{"type": "text", "text": "token " * self.answer_tokens}], stop_reason="end_turn",
+                           usage={"input_tokens": input_tokens, "output_tokens": self.answer_tokens})
+            self._send(json.dumps(message).encode("utf-8"))
+            return
+
+        def event(name: str, data: dict):
+            self.wfile.write(f"event: {name}\ndata: {json.dumps({'type': name, **data})}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        event("message_start", {"message": {**message, "content": []}})
+        event("content_block_start", {"index": 0, "content_block": {"type": "text", "text": ""}})
+        for _ in range(self.answer_tokens):
+            time.sleep(self.llm_latency / self.answer_tokens)
+            event("content_block_delta", {"index": 0, "delta": {"type": "text_delta", "text": "token "}})
+        event("content_block_stop", {"index": 0})
+        event("message_delta", {"delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                "usage": {"output_tokens": self.answer_tokens}})
+        event("message_stop", {})
+
+
+def serve(handler) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# --- Harness ---
+def load_app(workdir: str, api_url: str):
+    """Import the indexer and chat app wired to the stubs, with their state files in `workdir`."""
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")
+    os.environ["OPENAI_BASE_URL"] = f"{api_url}/v1"
+    os.environ["ANTHROPIC_BASE_URL"] = api_url
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+    os.chdir(workdir)  # module-level caches and indexes are opened relative to the working directory
+
+    import qdrant_client
+    import chat_app
+    import scrape_website
+    from vector_store import QdrantStore
+
+    qdrant = qdrant_client.QdrantClient(":memory:")
+    scrape_website.qdrant = qdrant  # collections are opened per run, with this client
+    scrape_website.USE_EMBEDDING_CACHE = False  # every run embeds (and is timed) from scratch
+    chat_app.qdrant = qdrant
+    chat_app.vector_store = QdrantStore(qdrant, chat_app.COLLECTION_NAME)
+    chat_app.embedding_cache = None
+    chat_app.query_cache = None
+    return scrape_website, chat_app
+
+
+class _Timed:
+    """Wrap a function, accumulating its call count and wall time."""
+
+    def __init__(self, fn):
+        self.fn, self.calls, self.seconds = fn, 0, 0.0
+
+    def __call__(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self.fn(*args, **kwargs)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.calls += 1
+
+
+def percentiles(samples: list) -> dict:
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))] * 1000
+    return {"p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99), "mean_ms": statistics.mean(ordered) * 1000}
+
+
+def bench_stages(s, base_url: str, n_pages: int) -> dict:
+    from chunking import chunk_with_offsets
+    from crawl_frontier import CrawlFrontier
+    from page_processing import PageProcessor
+
+    started = time.perf_counter()
+    processor = PageProcessor(s.PARSE_WORKERS, s.CHUNK_SIZE, s.CHUNK_OVERLAP, s.CHUNK_SNAP_TO_SENTENCES)
+    try:
+        pages = list(s._crawl(base_url, max_pages=n_pages, processor=processor,
+                              content_filter=s._new_content_filter() if s.DEDUPLICATE_PAGES else None,
+                              frontier=CrawlFrontier(":memory:")))
+    finally:
+        processor.close()
+    crawl_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    chunks = [chunk for _, text, _ in pages
+              for chunk in chunk_with_offsets(text, s.CHUNK_SIZE, s.CHUNK_OVERLAP, s.CHUNK_SNAP_TO_SENTENCES)]
+    chunk_seconds = time.perf_counter() - started
+
+    texts = [chunk for chunk, _, _ in chunks]
+    started = time.perf_counter()
+    vectors = s._embed_texts(texts)
+    embed_seconds = time.perf_counter() - started
+
+    collection = s._Collection(s.COLLECTION_NAME, None)  # vector store writes only, no BM25 index
+    s._ensure_collection(collection.store, vector_size=len(vectors[0]), recreate=True)
+    ids = [s._point_id("bench", f"bench:{i}", s._chunk_hash(text)) for i, text in enumerate(texts)]
+    payloads = [{"site": "bench", "url": f"bench:{i}", "text": text} for i, text in enumerate(texts)]
+    started = time.perf_counter()
+    s._upsert_points(collection, ids, vectors, payloads)
+    upsert_seconds = time.perf_counter() - started
+
+    return {
+        "pages": len(pages), "chunks": len(texts),
+        "pages_per_s": len(pages) / crawl_seconds,
+        "chunks_per_s": len(texts) / chunk_seconds,
+        "embeddings_per_s": len(texts) / embed_seconds,
+        "upserts_per_s": len(texts) / upsert_seconds,
+    }
+
+
+def bench_index(s, base_url: str, n_pages: int) -> dict:
+    s.MAX_PAGES = n_pages
+    ensure, embed, upsert = _Timed(s._ensure_collection), _Timed(s._embed_texts), _Timed(s._upsert_points)
+    counted = {"chunks": 0}
+    new_chunks = s._new_chunks
+
+    def count_chunks(*args, **kwargs):
+        result = new_chunks(*args, **kwargs)
+        counted["chunks"] += len(result)
+        return result
+
+    s._ensure_collection, s._embed_texts, s._upsert_points, s._new_chunks = ensure, embed, upsert, count_chunks
+    started = time.perf_counter()
+    try:
+        if s.index_website(base_url, incremental=False):
+            raise RuntimeError(f"Indexing {base_url} failed")
+    finally:
+        s._ensure_collection, s._embed_texts, s._upsert_points, s._new_chunks = (
+            ensure.fn, embed.fn, upsert.fn, new_chunks)
+    seconds = time.perf_counter() - started - ensure.seconds
+    with open(s.site_path(s.INDEX_STATE_PATH, s.site_name(base_url)), "r", encoding="utf-8") as f:
+        pages = len(json.load(f)["pages"])
+    return {
+        "pages": pages, "chunks": counted["chunks"], "seconds": seconds, "collection_setup_s": ensure.seconds,
+        "pages_per_s": pages / seconds, "chunks_per_s": counted["chunks"] / seconds,
+        "embed_busy_s": embed.seconds, "upsert_busy_s": upsert.seconds,
+    }
+
+
+def bench_queries(chat_app, vocabulary: list, n_queries: int, seed: int = 1) -> dict:
+    rng = random.Random(seed)
+    queries = [" ".join(rng.choices(vocabulary, k=rng.randint(3, 8))) + "?" for _ in range(n_queries)]
+    chat_app.answer_query(queries[0])  # warm up connections and load the BM25 index
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        chat_app.answer_query(query)
+        latencies.append(time.perf_counter() - started)
+    return {"queries": n_queries, **percentiles(latencies)}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=200, help="pages in the generated site")
+    parser.add_argument("--words", type=int, default=1500, help="words per page")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dimensions", type=int, default=1536, help="embedding size returned by the stub")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="seconds per stubbed embeddings request")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per stubbed completion")
+    parser.add_argument("--crawl-delay", type=float, default=0.0,
+                        help="politeness delay per request; CRAWL_DELAY would dominate a local site")
+    parser.add_argument("--json", help="append the results as one JSON line to this file")
+    parser.add_argument("--verbose", action="store_true", help="keep the application's INFO logging")
+    args = parser.parse_args()
+    json_path = os.path.abspath(args.json) if args.json else None
+
+    with tempfile.TemporaryDirectory(prefix="bench_e2e_") as tmp:
+        site_dir, workdir = os.path.join(tmp, "site"), os.path.join(tmp, "work")
+        os.makedirs(site_dir)
+        os.makedirs(workdir)
+        vocabulary = make_site(site_dir, args.pages, args.words)
+        site = serve(partial(_SiteHandler, directory=site_dir))
+        _StubAPIHandler.embed_latency, _StubAPIHandler.llm_latency = args.embed_latency, args.llm_latency
+        _StubAPIHandler.dimensions = args.dimensions
+        api = serve(_StubAPIHandler)
+        base_url = f"http://127.0.0.1:{site.server_address[1]}/"
+        cwd = os.getcwd()
+        try:
+            s, chat_app = load_app(workdir, f"http://127.0.0.1:{api.server_address[1]}")
+            logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+            s._crawl = partial(s._crawl, delay=args.crawl_delay)  # the default is bound at definition time
+            s.USE_SITEMAPS = False
+            stages = bench_stages(s, base_url, args.pages)
+            end_to_end = bench_index(s, base_url, args.pages)
+            queries = bench_queries(chat_app, vocabulary, args.queries)
+        finally:
+            os.chdir(cwd)
+            site.shutdown()
+            api.shutdown()
+
+    result = {
+        "commit": git_commit(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "params": {"pages": args.pages, "words": args.words, "queries": args.queries, "dimensions": args.dimensions,
+                   "embed_latency": args.embed_latency, "llm_latency": args.llm_latency,
+                   "streaming": s.STREAMING_INDEXING, "parse_workers": s.PARSE_WORKERS,
+                   "crawl_concurrency": s.CRAWL_CONCURRENCY, "crawl_delay": args.crawl_delay,
+                   "embed_concurrency": s.EMBED_CONCURRENCY},
+        "stages": stages, "end_to_end": end_to_end, "query": queries,
+    }
+
+    print(f"commit {result['commit']}: {stages['pages']} pages, {stages['chunks']} chunks, "
+          f"stub latency embed {args.embed_latency * 1e3:.0f} ms / llm {args.llm_latency * 1e3:.0f} ms")
+    print(f"{'stage':>12} {'per s':>10}")
+    for name in ("pages", "chunks", "embeddings", "upserts"):
+        print(f"{name:>12} {stages[f'{name}_per_s']:>10.1f}")
+    print(f"end to end: {end_to_end['pages_per_s']:.1f} pages/s, {end_to_end['chunks_per_s']:.1f} chunks/s "
+          f"in {end_to_end['seconds']:.2f} s (+{end_to_end['collection_setup_s']:.2f} s collection setup)")
+    print(f"answer_query over {queries['queries']} queries: p50 {queries['p50_ms']:.1f} ms, "
+          f"p95 {queries['p95_ms']:.1f} ms, p99 {queries['p99_ms']:.1f} ms")
+    if json_path:
+        with open(json_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
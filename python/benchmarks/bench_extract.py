@@ -0,0 +1,108 @@
+"""Benchmark single-pass HTML extraction against the previous double BeautifulSoup parse.
+
+Run from the `python/` directory:
+
+    python -m benchmarks.bench_extract --corpus path/to/saved_pages
+
+`--corpus` is a directory of saved `*.html` pages; without it a synthetic
+corpus is generated. Reports pages/sec, peak traced memory and how closely
+the outputs agree with the BeautifulSoup baseline.
+"""
+import argparse
+import glob
+import os
+import random
+import re
+import time
+import tracemalloc
+from typing import Callable, List, Tuple
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+import html_extract
+
+PAGE_URL = "https://example.com/section/page/"
+
+
+def bs4_extract(html: str, page_url: str) -> Tuple[str, List[str]]:
+    """The previous approach: one parse for text, a second parse for links."""
+    soup = BeautifulSoup(html, 'html.parser')
+    for tag in soup(['script', 'style', 'nav', 'header', 'footer', 'aside']):
+        tag.decompose()
+    text = re.sub(r'\s+', ' ', soup.get_text(separator=' ', strip=True)).strip()
+    page_soup = BeautifulSoup(html, 'html.parser')
+    links = [urljoin(page_url, a['href'].strip()) for a in page_soup.find_all('a', href=True)]
+    return text, links
+
+
+def synthetic_corpus(n_pages: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    words = ["billett", "rute", "buss", "trikk", "t-bane", "sone", "reise", "app", "pris", "avgang"]
+    pages = []
+    for _ in range(n_pages):
+        paragraphs = "".join(
+            f"<p>{' '.join(rng.choice(words) for _ in range(rng.randint(20, 80)))} "
+            f"<a href='/rute/{rng.randint(1, 500)}'>linje {rng.randint(1, 99)}</a> &amp; mer</p>"
+            for _ in range(rng.randint(10, 60))
+        )
+        pages.append(
+            "<!DOCTYPE html><html><head><title>Side</title><style>p{color:red}</style>"
+            "<script>var x = '<p>not text</p>';</script></head><body>"
+            "<header><a href='/'>Hjem</a></header><nav><a href='/reise'>Reise</a><a href='/billetter'>Billetter</a></nav>"
+            f"<main><h1>Overskrift</h1>{paragraphs}</main><aside>Relatert</aside>"
+            "<footer>Kontakt <a href='https://example.com/kontakt?x=1#top'>oss</a></footer></body></html>"
+        )
+    return pages
+
+
+def load_corpus(directory: str) -> List[str]:
+    pages = []
+    for path in sorted(glob.glob(os.path.join(directory, "**", "*.htm*"), recursive=True)):
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            pages.append(f.read())
+    return pages
+
+
+def run(name: str, extract: Callable[[str, str], Tuple[str, List[str]]], pages: List[str]):
+    tracemalloc.start()
+    start = time.perf_counter()
+    outputs = [extract(html, PAGE_URL) for html in pages]
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<26} {len(pages) / elapsed:10.1f} pages/s {peak / 1e6:10.1f} MB peak")
+    return outputs
+
+
+def agreement(baseline, candidate) -> str:
+    exact_text = sum(b[0] == c[0] for b, c in zip(baseline, candidate))
+    same_links = sum(b[1] == c[1] for b, c in zip(baseline, candidate))
+    overlaps = []
+    for (b_text, _), (c_text, _) in zip(baseline, candidate):
+        b_words, c_words = set(b_text.split()), set(c_text.split())
+        overlaps.append(len(b_words & c_words) / len(b_words | c_words) if b_words | c_words else 1.0)
+    n = len(baseline)
+    return (f"identical text {exact_text}/{n}, identical links {same_links}/{n}, "
+            f"mean word Jaccard {sum(overlaps) / n:.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", help="directory of saved *.html pages (default: synthetic corpus)")
+    parser.add_argument("--pages", type=int, default=300, help="synthetic corpus size")
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus) if args.corpus else synthetic_corpus(args.pages)
+    print(f"{len(pages)} pages, {sum(map(len, pages)) / 1e6:.1f} MB of HTML")
+
+    baseline = run("bs4 (two parses)", bs4_extract, pages)
+    backends = ["html.parser"] + (["lxml"] if html_extract.etree is not None else [])
+    for backend in backends:
+        outputs = run(f"single pass ({backend})",
+                      lambda html, url: html_extract.extract_page(html, url, backend=backend), pages)
+        print(f"  vs bs4: {agreement(baseline, outputs)}")
+
+
+if __name__ == "__main__":
+    main()
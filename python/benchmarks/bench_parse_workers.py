@@ -0,0 +1,54 @@
+"""Benchmark parse + chunk throughput against the number of worker processes.
+
+Run from the `python/` directory:
+
+    python -m benchmarks.bench_parse_workers --corpus path/to/saved_pages --workers 0 1 2 4 8
+
+Pages are handed to a `PageProcessor` from a pool of crawl-like threads, the
+same way `index_website` does it; `0` workers means parsing in those threads.
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.bench_extract import PAGE_URL, load_corpus, synthetic_corpus
+from page_processing import PageProcessor
+
+
+def measure(pages, workers: int, threads: int, chunk_size: int, chunk_overlap: int):
+    processor = PageProcessor(workers, chunk_size, chunk_overlap)
+    try:
+        # Warm up worker processes (imports, tokenizer load) outside the timing.
+        for html in pages[:max(1, workers)]:
+            processor(html, "utf-8", PAGE_URL)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as crawl_threads:
+            results = list(crawl_threads.map(lambda html: processor(html, "utf-8", PAGE_URL), pages))
+        elapsed = time.perf_counter() - start
+    finally:
+        processor.close()
+    n_chunks = sum(len(page.chunks) for page in results)
+    return len(pages) / elapsed, n_chunks / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", help="directory of saved *.html pages (default: synthetic corpus)")
+    parser.add_argument("--pages", type=int, default=400, help="synthetic corpus size")
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2, 4, 8])
+    parser.add_argument("--threads", type=int, default=8, help="crawl threads submitting pages")
+    parser.add_argument("--chunk-size", type=int, default=800)
+    parser.add_argument("--chunk-overlap", type=int, default=40)
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus) if args.corpus else synthetic_corpus(args.pages)
+    pages = [html.encode("utf-8") for html in pages]
+    print(f"{len(pages)} pages, {sum(map(len, pages)) / 1e6:.1f} MB of HTML, {args.threads} crawl threads")
+    print(f"{'workers':>8} {'pages/s':>10} {'chunks/s':>10}")
+    for workers in args.workers:
+        pages_per_sec, chunks_per_sec = measure(pages, workers, args.threads, args.chunk_size, args.chunk_overlap)
+        print(f"{workers:>8} {pages_per_sec:>10.1f} {chunks_per_sec:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
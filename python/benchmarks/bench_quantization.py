@@ -0,0 +1,168 @@
+"""Memory, search latency and recall@k of shortened and quantized embeddings vs full float32 vectors.
+
+Run from the `python/` directory:
+
+    python -m benchmarks.bench_quantization --cache embedding_cache.sqlite
+    python -m benchmarks.bench_quantization --synthetic 100000
+    python -m benchmarks.bench_quantization --cache embedding_cache.sqlite --qdrant-url http://localhost:6333
+
+Vectors come from the shared embedding cache (real text-embedding-3 chunk
+embeddings written by `scrape_website.py`) or, failing that, from a
+synthetic clustered set whose variance falls off along the dimensions the
+way Matryoshka-trained embeddings do. `--queries` of them are held out as
+queries; the ground truth is the exact float32 top-k over the full vectors.
+
+Shortened vectors are the first `dimensions` components renormalized, which
+is what the API returns for `dimensions` with text-embedding-3 models.
+Each configuration is built as a `LocalStore` in a temp directory and
+searched through its public API, so the quantized scan plus full-precision
+rescoring of `--oversampling` x k candidates is what gets timed. RAM is the
+part scanned on every query (the float32 matrix, or the quantized codes);
+quantized stores also keep the float32 originals on disk for rescoring.
+
+With `--qdrant-url` the full-size vectors are also loaded into temporary
+Qdrant collections with scalar (int8) and product quantization, searched
+with rescoring, and dropped again. Qdrant's in-memory client (":memory:")
+accepts but ignores quantization, so use a real server for those numbers.
+"""
+import argparse
+import sqlite3
+import statistics
+import tempfile
+import time
+import uuid
+
+import numpy as np
+
+from embedding_cache import EMBEDDING_CACHE_PATH
+from vector_store import LocalStore, QdrantStore
+
+CONFIGS = [  # (dimensions, quantization); the first one is the current configuration
+    (None, None), (None, "float16"), (None, "int8"),
+    (512, None), (512, "int8"), (256, None), (256, "int8"),
+]
+
+
+def load_cached_vectors(path: str, model: str) -> np.ndarray:
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute("SELECT vector FROM embeddings WHERE model = ?", (model,)).fetchall()
+    finally:
+        conn.close()
+    return np.stack([np.frombuffer(blob, dtype=np.float32) for (blob,) in rows]) if rows else np.zeros((0, 0))
+
+
+def synthetic_vectors(n: int, dim: int = 1536, n_clusters: int = 500, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    spectrum = (1.0 / np.sqrt(1.0 + np.arange(dim) / 32.0)).astype(np.float32)
+    centers = rng.standard_normal((n_clusters, dim), dtype=np.float32) * spectrum
+    vectors = centers[rng.integers(0, n_clusters, n)]
+    vectors += 0.6 * rng.standard_normal((n, dim), dtype=np.float32) * spectrum
+    return vectors
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> list:
+    scores = queries @ corpus.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return [set(row.tolist()) for row in top]
+
+
+def recall(results: list, truth: list) -> float:
+    return statistics.mean(len(hits & expected) / len(expected) for hits, expected in zip(results, truth))
+
+
+def measure(search, queries: np.ndarray, k: int) -> tuple:
+    search(queries[0].tolist(), k)  # load the index
+    latencies, results = [], []
+    for query in queries:
+        started = time.perf_counter()
+        hits = search(query.tolist(), k)
+        latencies.append(time.perf_counter() - started)
+        results.append({int(hit.payload["row"]) for hit in hits})
+    latencies.sort()
+    return results, statistics.median(latencies) * 1e3, latencies[int(0.95 * (len(latencies) - 1))] * 1e3
+
+
+def bench_local(corpus: np.ndarray, queries: np.ndarray, truth: list, k: int, oversampling: float, directory: str):
+    payloads = [{"row": row} for row in range(len(corpus))]
+    ids = [str(uuid.UUID(int=row)) for row in range(len(corpus))]
+    for dimensions, quantization in CONFIGS:
+        dim = dimensions or corpus.shape[1]
+        if dim > corpus.shape[1]:
+            continue
+        name = f"{dim}-{quantization or 'float32'}"
+        writer = LocalStore(directory, name, quantization, oversampling)
+        writer.ensure_collection(dim)
+        for start in range(0, len(corpus), 10_000):
+            writer.upsert(ids[start:start + 10_000], corpus[start:start + 10_000, :dim],
+                          payloads[start:start + 10_000])
+        writer.flush()
+        del writer
+        reader = LocalStore(directory, name, oversampling=oversampling)
+        results, p50, p95 = measure(reader.search, normalize(queries[:, :dim]), k)
+        ram = dim * {None: 4, "float16": 2, "int8": 1}[quantization] + (4 if quantization == "int8" else 0)
+        disk = ram + (dim * 4 if quantization else 0)
+        yield name, ram, disk, p50, p95, recall(results, truth)
+
+
+def bench_qdrant(url: str, corpus: np.ndarray, queries: np.ndarray, truth: list, k: int, oversampling: float):
+    import qdrant_client
+
+    client = qdrant_client.QdrantClient(location=url) if url == ":memory:" else qdrant_client.QdrantClient(url=url)
+    dim = corpus.shape[1]
+    for quantization, ram in ((None, dim * 4), ("int8", dim), ("pq", dim * 4 // 16)):
+        store = QdrantStore(client, f"bench-quantization-{uuid.uuid4().hex[:8]}", quantization=quantization,
+                            oversampling=oversampling)
+        store.ensure_collection(dim)
+        try:
+            for start in range(0, len(corpus), 1000):
+                rows = range(start, min(start + 1000, len(corpus)))
+                store.upsert([str(uuid.UUID(int=row)) for row in rows], corpus[start:start + 1000].tolist(),
+                             [{"row": row} for row in rows])
+            results, p50, p95 = measure(store.search, queries, k)
+            yield f"qdrant {quantization or 'float32'}", ram, None, p50, p95, recall(results, truth)
+        finally:
+            client.delete_collection(store.collection_name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cache", default=EMBEDDING_CACHE_PATH, help="embedding cache to take real vectors from")
+    parser.add_argument("--model", default="text-embedding-3-small", help="full-size model key in the cache")
+    parser.add_argument("--synthetic", type=int, default=50_000, help="vectors to generate if the cache has too few")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--oversampling", type=float, default=2.0, help="candidates rescored per result")
+    parser.add_argument("--qdrant-url", help="also measure Qdrant quantization on this server")
+    args = parser.parse_args()
+
+    try:
+        vectors = load_cached_vectors(args.cache, args.model)
+    except sqlite3.Error:
+        vectors = np.zeros((0, 0))
+    source = f"{args.cache} ({args.model})"
+    if len(vectors) < 10 * args.queries:
+        vectors, source = synthetic_vectors(args.synthetic + args.queries), "synthetic"
+    vectors = normalize(vectors.astype(np.float32))
+    corpus, queries = vectors[:-args.queries], vectors[-args.queries:]
+    truth = exact_top_k(corpus, queries, args.k)
+
+    print(f"{len(corpus)} vectors of dim {corpus.shape[1]} from {source}, {len(queries)} held-out queries, "
+          f"recall@{args.k} against exact full-size float32, oversampling {args.oversampling}")
+    print(f"{'config':>18} {'RAM MB/1M':>10} {'disk MB/1M':>11} {'p50 ms':>8} {'p95 ms':>8} {f'recall@{args.k}':>10}")
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="bench_quantization_") as directory:
+        rows.extend(bench_local(corpus, queries, truth, args.k, args.oversampling, directory))
+    if args.qdrant_url:
+        rows.extend(bench_qdrant(args.qdrant_url, corpus, queries, truth, args.k, args.oversampling))
+    for name, ram, disk, p50, p95, score in rows:
+        disk_mb = f"{disk * 1e6 / 2**20:>11.0f}" if disk is not None else f"{'-':>11}"
+        print(f"{name:>18} {ram * 1e6 / 2**20:>10.0f} {disk_mb} {p50:>8.2f} {p95:>8.2f} {score:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
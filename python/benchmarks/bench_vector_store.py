@@ -0,0 +1,83 @@
+"""Compare top-k search latency of the local NumPy index and Qdrant.
+
+Run from the `python/` directory:
+
+    python -m benchmarks.bench_vector_store --points 10000 50000 --queries 200
+    python -m benchmarks.bench_vector_store --qdrant-url http://localhost:6333
+
+Random unit vectors of `--dim` dimensions are loaded into both backends
+through the `vector_store` interface used by the indexer, then the same
+queries are run against each. Without `--qdrant-url` Qdrant's in-memory
+client is used, which is itself brute force in Python and so not
+representative of a server; point it at a running Qdrant for a fair
+comparison (the collection `bench_vectors` is recreated there). Reports
+p50/p95 query latency and how often both backends return the same top-k IDs.
+"""
+import argparse
+import statistics
+import tempfile
+import time
+import uuid
+
+import numpy as np
+import qdrant_client
+
+from vector_store import LocalStore, QdrantStore
+
+COLLECTION = "bench_vectors"
+UPSERT_BATCH = 256
+
+
+def load(store, vectors: np.ndarray):
+    ids = [str(uuid.UUID(int=i)) for i in range(len(vectors))]
+    store.ensure_collection(vectors.shape[1], recreate=True)
+    for i in range(0, len(vectors), UPSERT_BATCH):
+        batch = slice(i, i + UPSERT_BATCH)
+        payloads = [{"url": f"https://example.com/{j}/", "text": f"chunk {j}"} for j in range(i, i + len(ids[batch]))]
+        store.upsert(ids[batch], vectors[batch].tolist(), payloads)
+    store.flush()
+
+
+def run(store, queries: np.ndarray, top_k: int):
+    latencies, results = [], []
+    for query in queries:
+        query = query.tolist()
+        started = time.perf_counter()
+        hits = store.search(query, top_k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        results.append([str(hit.id) for hit in hits])
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.95) - 1], results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--qdrant-url", default=None, help="Qdrant server to compare against (default: in-memory client)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    client = qdrant_client.QdrantClient(url=args.qdrant_url) if args.qdrant_url else qdrant_client.QdrantClient(":memory:")
+    print(f"dim {args.dim}, top-{args.top_k}, {args.queries} queries, qdrant: {args.qdrant_url or 'in-memory'}")
+    print(f"{'points':>8} {'backend':>8} {'p50 ms':>8} {'p95 ms':>8} {'same top-k':>11}")
+    for n_points in args.points:
+        vectors = rng.standard_normal((n_points, args.dim), dtype=np.float32)
+        queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+        with tempfile.TemporaryDirectory() as directory:
+            local = LocalStore(directory, COLLECTION)
+            load(local, vectors)
+            reader = LocalStore(directory, COLLECTION)  # fresh instance: memory-mapped, as the chat app sees it
+            local_p50, local_p95, local_results = run(reader, queries, args.top_k)
+        qdrant = QdrantStore(client, COLLECTION)
+        load(qdrant, vectors)
+        qdrant_p50, qdrant_p95, qdrant_results = run(qdrant, queries, args.top_k)
+        same = sum(a == b for a, b in zip(local_results, qdrant_results)) / len(queries)
+        print(f"{n_points:>8} {'local':>8} {local_p50:>8.2f} {local_p95:>8.2f} {'':>11}")
+        print(f"{n_points:>8} {'qdrant':>8} {qdrant_p50:>8.2f} {qdrant_p95:>8.2f} {same:>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Check the chat app's cold-start cost: import time against a budget, then client construction.
+
+Run from the `python/` directory:
+
+    python -m benchmarks.check_startup --runs 5 --budget 0.3
+
+Each run imports `chat_app` in a fresh interpreter under `python -X importtime`,
+after `chainlit` (which `chainlit run` has loaded before it imports the app),
+with a temporary working directory so no state files are touched. Reports the
+median import time, the slowest modules the app imports directly, and how long
+`init_clients()` then takes (client construction only, no requests). Exits with
+status 1 if the median import time is over `--budget` seconds or if a client
+library that should load lazily is imported with the app, so it can run in CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+LAZY_MODULES = ("openai", "anthropic", "qdrant_client")  # imported by chat_app.init_clients, not at import
+
+_CHILD = f"""
+import json, sys, time
+import chainlit
+started = time.perf_counter()
+import chat_app
+imported = time.perf_counter() - started
+eager = [name for name in {LAZY_MODULES!r} if name in sys.modules]
+started = time.perf_counter()
+chat_app.init_clients()
+print(json.dumps({{"import": imported, "init": time.perf_counter() - started, "eager": eager}}))
+"""
+
+
+def _import_times(stderr: str):
+    """(cumulative seconds, nesting depth, module) per line of `-X importtime` output, in import order."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line.split(":", 1)[1].split("|")
+        rows.append((int(cumulative) / 1e6, (len(name) - len(name.lstrip()) - 1) // 2, name.strip()))
+    return rows
+
+
+def measure_once(app_dir: str) -> dict:
+    env = dict(os.environ, PYTHONPATH=app_dir, PYTHONDONTWRITEBYTECODE="1")
+    env.setdefault("OPENAI_API_KEY", "benchmark")
+    env.setdefault("ANTHROPIC_API_KEY", "benchmark")
+    with tempfile.TemporaryDirectory() as workdir:
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", _CHILD], cwd=workdir, env=env,
+                              capture_output=True, text=True)
+    if proc.returncode:
+        raise SystemExit("\n".join(line for line in proc.stderr.splitlines() if not line.startswith("import time:")))
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    rows = _import_times(proc.stderr)
+    app_row = next(i for i, (_, depth, name) in enumerate(rows) if depth == 0 and name == "chat_app")
+    app_start = max(i for i, (_, depth, name) in enumerate(rows[:app_row]) if depth == 0) + 1  # after chainlit
+    result["chainlit"] = next(cum for cum, depth, name in rows if depth == 0 and name == "chainlit")
+    result["modules"] = {name: cum for cum, depth, name in rows[app_start:app_row] if depth == 1}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to measure (the median is reported)")
+    parser.add_argument("--budget", type=float, default=0.3, help="max median seconds for `import chat_app`")
+    parser.add_argument("--top", type=int, default=8, help="slowest direct imports of chat_app to list")
+    args = parser.parse_args()
+
+    app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    runs = [measure_once(app_dir) for _ in range(args.runs)]
+    import_time = statistics.median(run["import"] for run in runs)
+    modules = {name: statistics.median(run["modules"].get(name, 0.0) for run in runs) for name in runs[0]["modules"]}
+
+    print(f"import chainlit      {statistics.median(run['chainlit'] for run in runs) * 1e3:8.0f} ms")
+    print(f"import chat_app      {import_time * 1e3:8.0f} ms  (budget {args.budget * 1e3:.0f} ms)")
+    for name, seconds in sorted(modules.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {name:<18} {seconds * 1e3:8.1f} ms")
+    print(f"init_clients()       {statistics.median(run['init'] for run in runs) * 1e3:8.0f} ms")
+
+    failures = []
+    if import_time > args.budget:
+        failures.append(f"import chat_app took {import_time * 1e3:.0f} ms, over the {args.budget * 1e3:.0f} ms budget")
+    eager = sorted({name for run in runs for name in run["eager"]})
+    if eager:
+        failures.append(f"imported with chat_app instead of on first use: {', '.join(eager)}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Offline recall@k of dense, sparse (BM25) and hybrid (RRF) retrieval in the chat app.
+
+Run from the `python/` directory after `scrape_website.py` has built the
+collection and `bm25_index.npz`:
+
+    python -m benchmarks.eval_retrieval --queries labeled.jsonl --k 1 5 10
+    python -m benchmarks.eval_retrieval --synthetic 200
+
+A labeled file has one JSON object per line: {"query": "...", "urls": [...]},
+where `urls` are the pages that answer the question. Without one,
+`--synthetic` samples a run of `--words` consecutive words from random
+indexed chunks and expects that chunk's page back. Such queries share
+their exact wording with the target and so favour keyword search; prefer
+real labeled questions when judging the dense side. A query counts as
+recalled at k when any of the top k chunks comes from one of its pages;
+the score is averaged over all queries. Query embeddings go through the
+chat app's embedding cache, so repeated runs are cheap.
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from typing import Dict, List, Tuple
+
+import chat_app
+
+MODES = ("dense", "sparse", "hybrid")
+
+
+def load_queries(path: str) -> List[Tuple[str, set]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [(item["query"], set(item["urls"])) for item in map(json.loads, f) if item.get("urls")]
+
+
+def synthetic_queries(n: int, n_words: int, seed: int = 0) -> List[Tuple[str, set]]:
+    index = chat_app.bm25_index
+    if index is None or not len(index):
+        raise SystemExit(f"BM25 index '{chat_app.BM25_INDEX_PATH}' is empty or disabled; cannot sample queries.")
+    rng = random.Random(seed)
+    payloads = [payload for payload in index.payloads() if len(payload["text"].split()) >= n_words]
+    queries = []
+    for payload in rng.sample(payloads, min(n, len(payloads))):
+        words = payload["text"].split()
+        start = rng.randrange(len(words) - n_words + 1)
+        queries.append((" ".join(words[start:start + n_words]), {payload["url"]}))
+    return queries
+
+
+def evaluate(queries: List[Tuple[str, set]], ks: List[int], modes=MODES) -> Dict[str, Dict[int, float]]:
+    recalled = {mode: {k: 0 for k in ks} for mode in modes}
+    for query, relevant in queries:
+        vector = chat_app._embed_query(query)
+        for mode in modes:
+            hit_urls = [hit.payload.get("url") for hit in chat_app.retrieve(query, vector, max(ks), mode)]
+            for k in ks:
+                recalled[mode][k] += any(url in relevant for url in hit_urls[:k])
+    return {mode: {k: count / len(queries) for k, count in by_k.items()} for mode, by_k in recalled.items()}
+
+
+def keyword_latency_ms(queries: List[Tuple[str, set]], top_k: int) -> float:
+    latencies = []
+    for query, _ in queries:
+        started = time.perf_counter()
+        chat_app.bm25_index.search(query, top_k)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", help="labeled JSONL file of {query, urls}")
+    parser.add_argument("--synthetic", type=int, default=100, help="number of sampled queries without --queries")
+    parser.add_argument("--words", type=int, default=6, help="words per synthetic query")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 5, 10])
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries) if args.queries else synthetic_queries(args.synthetic, args.words)
+    if not queries:
+        raise SystemExit("No queries to evaluate.")
+    results = evaluate(queries, args.k)
+    print(f"{len(queries)} queries ({'labeled' if args.queries else 'synthetic'}), "
+          f"candidates per retriever {chat_app.HYBRID_CANDIDATES}, RRF k {chat_app.RRF_K}")
+    print(f"{'mode':>8} " + " ".join(f"{f'recall@{k}':>10}" for k in args.k))
+    for mode, by_k in results.items():
+        print(f"{mode:>8} " + " ".join(f"{by_k[k]:>10.3f}" for k in args.k))
+    print(f"BM25 lookup p50: {keyword_latency_ms(queries, max(args.k)):.3f} ms over {len(chat_app.bm25_index)} chunks")
+
+
+if __name__ == "__main__":
+    main()
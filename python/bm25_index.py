@@ -0,0 +1,230 @@
+import json
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from vector_store import SearchHit, Where
+
+# Route numbers, stop names and product codes survive as tokens: no stemming, no stop words.
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+class BM25Index:
+    """Sparse keyword index over the indexed chunks, scored with Okapi BM25.
+
+    Postings are stored in CSR form (per-term slices of doc and term-frequency
+    arrays), so a query only touches the postings of its own terms. The index
+    keeps the chunk payloads, so keyword hits have the same shape as vector
+    hits. `add`/`remove` are buffered and applied by `save()`, which rewrites
+    the index file atomically; readers load lazily and reload when it changes.
+    Searches can be restricted to chunks whose payload matches `where`.
+    """
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._loaded_mtime = None
+        self._reset_state()
+
+    def _reset_state(self):
+        self._terms: List[str] = []
+        self._vocab: Dict[str, int] = {}
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._docs = np.zeros(0, dtype=np.int32)
+        self._tfs = np.zeros(0, dtype=np.float32)
+        self._lengths = np.zeros(0, dtype=np.float32)
+        self._norm = np.zeros(0, dtype=np.float32)
+        self._ids: List[str] = []
+        self._payloads: List[dict] = []
+        self._row_of: Dict[str, int] = {}
+        self._payload_index = {}
+        self._pending = {}  # id -> (payload, term Counter), applied by save()
+        self._removed = set()
+        self._dirty = False
+
+    def _adopt(self, terms, offsets, docs, tfs, lengths, ids, payloads):
+        self._terms = terms
+        self._vocab = {term: i for i, term in enumerate(terms)}
+        self._offsets, self._docs, self._tfs, self._lengths = offsets, docs, tfs, lengths
+        avgdl = float(lengths.mean()) if len(lengths) else 1.0
+        self._norm = (self.k1 * (1 - self.b + self.b * lengths / max(avgdl, 1e-9))).astype(np.float32)
+        self._ids, self._payloads = ids, payloads
+        self._row_of = {pid: row for row, pid in enumerate(ids)}
+        self._payload_index = {}  # (field, value) -> rows, filled on first use
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def _ensure_loaded(self):
+        if self._dirty:
+            return  # unsaved local changes take precedence
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return
+        if mtime == self._loaded_mtime:
+            return
+        with np.load(self.path, allow_pickle=False) as data:
+            meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+            self._adopt(meta["terms"], data["offsets"], data["docs"], data["tfs"], data["lengths"],
+                        meta["ids"], meta["payloads"])
+        self._loaded_mtime = mtime
+        logging.info(f"Loaded BM25 index with {len(self._ids)} chunks and {len(self._terms)} terms from {self.path}.")
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._ids)
+
+    def payloads(self) -> List[dict]:
+        """Payloads of all saved chunks."""
+        with self._lock:
+            self._ensure_loaded()
+            return list(self._payloads)
+
+    def reset(self):
+        """Start from an empty index (for full rebuilds); takes effect on `save()`."""
+        with self._lock:
+            self._reset_state()
+            self._dirty = True
+
+    def discard(self):
+        """Drop unsaved changes; the saved index is reloaded on next use."""
+        with self._lock:
+            self._reset_state()
+            self._loaded_mtime = None
+
+    def add(self, ids: List[str], texts: List[str], payloads: List[dict]):
+        counts = [Counter(tokenize(text)) for text in texts]
+        with self._lock:
+            self._ensure_loaded()
+            for pid, payload, terms in zip(ids, payloads, counts):
+                self._pending[str(pid)] = (payload, terms)
+            self._dirty = True
+
+    def remove(self, ids: List[str]):
+        with self._lock:
+            self._ensure_loaded()
+            for pid in ids:
+                pid = str(pid)
+                self._pending.pop(pid, None)
+                self._removed.add(pid)
+            self._dirty = True
+
+    def save(self):
+        """Merge buffered changes into the postings arrays and write the index atomically."""
+        with self._lock:
+            if not self._dirty:
+                return
+            n_old = len(self._ids)
+            alive = np.ones(n_old + len(self._pending), dtype=bool)
+            for pid in self._removed | set(self._pending):
+                row = self._row_of.get(pid)
+                if row is not None:
+                    alive[row] = False  # removed, or replaced by a pending version
+
+            terms = list(self._terms)
+            vocab = dict(self._vocab)
+            new_terms, new_docs, new_tfs, new_lengths = [], [], [], []
+            for j, (payload, counts) in enumerate(self._pending.values()):
+                for term, tf in counts.items():
+                    if term not in vocab:
+                        vocab[term] = len(terms)
+                        terms.append(term)
+                    new_terms.append(vocab[term])
+                    new_docs.append(n_old + j)
+                    new_tfs.append(tf)
+                new_lengths.append(sum(counts.values()))
+
+            term_ids = np.concatenate([np.repeat(np.arange(len(self._terms)), np.diff(self._offsets)),
+                                       np.asarray(new_terms, dtype=np.int64)])
+            docs = np.concatenate([self._docs, np.asarray(new_docs, dtype=np.int32)])
+            tfs = np.concatenate([self._tfs, np.asarray(new_tfs, dtype=np.float32)])
+            keep = alive[docs]
+            term_ids, docs, tfs = term_ids[keep], docs[keep], tfs[keep]
+            docs = (np.cumsum(alive) - 1)[docs].astype(np.int32)
+            used, term_ids = np.unique(term_ids, return_inverse=True)
+            order = np.lexsort((docs, term_ids))
+            term_ids, docs, tfs = term_ids[order], docs[order], tfs[order]
+            offsets = np.zeros(len(used) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(term_ids, minlength=len(used)), out=offsets[1:])
+            terms = [terms[i] for i in used]
+            lengths = np.concatenate([self._lengths, np.asarray(new_lengths, dtype=np.float32)])[alive]
+            ids = [pid for pid, ok in zip(list(self._ids) + list(self._pending), alive) if ok]
+            payloads = [pl for pl, ok in zip(self._payloads + [pl for pl, _ in self._pending.values()], alive) if ok]
+
+            meta = json.dumps({"terms": terms, "ids": ids, "payloads": payloads}).encode("utf-8")
+            tmp_path = self.path + ".tmp.npz"
+            np.savez(tmp_path, offsets=offsets, docs=docs, tfs=tfs, lengths=lengths,
+                     meta=np.frombuffer(meta, dtype=np.uint8))
+            os.replace(tmp_path, self.path)
+            self._adopt(terms, offsets, docs, tfs, lengths, ids, payloads)
+            self._pending, self._removed, self._dirty = {}, set(), False
+            self._loaded_mtime = os.stat(self.path).st_mtime
+            logging.info(f"Saved BM25 index with {len(ids)} chunks and {len(terms)} terms to {self.path}.")
+
+    def _mask_where(self, where: Dict[str, str]) -> np.ndarray:
+        """Boolean mask of the chunks whose payload matches every field of `where`."""
+        mask = np.ones(len(self._ids), dtype=bool)
+        for key in where.items():
+            rows = self._payload_index.get(key)
+            if rows is None:
+                field, value = key
+                rows = self._payload_index[key] = np.asarray(
+                    [row for row, payload in enumerate(self._payloads) if payload.get(field) == value], dtype=np.int64)
+            matches = np.zeros(len(self._ids), dtype=bool)
+            matches[rows] = True
+            mask &= matches
+        return mask
+
+    def search(self, query: str, top_k: int, where: Where = None) -> List[SearchHit]:
+        """Return the `top_k` chunks with the highest BM25 score for `query` (saved state only)."""
+        with self._lock:
+            self._ensure_loaded()
+            offsets, docs, tfs, norm = self._offsets, self._docs, self._tfs, self._norm
+            term_rows = [self._vocab[term] for term in set(tokenize(query)) if term in self._vocab]
+            ids, payloads = self._ids, self._payloads
+            mask: Optional[np.ndarray] = self._mask_where(where) if where else None
+        n_docs = len(ids)
+        if not term_rows or not n_docs:
+            return []
+        scores = np.zeros(n_docs, dtype=np.float32)
+        for row in term_rows:
+            start, end = offsets[row], offsets[row + 1]
+            postings, tf = docs[start:end], tfs[start:end]
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            scores[postings] += idf * tf * (self.k1 + 1) / (tf + norm[postings])
+        if mask is not None:
+            scores[~mask] = 0
+        candidates = np.flatnonzero(scores)
+        k = min(top_k, len(candidates))
+        if k <= 0:
+            return []
+        top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [SearchHit(ids[row], float(scores[row]), payloads[row]) for row in top]
+
+
+def reciprocal_rank_fusion(result_lists: List[List[SearchHit]], top_k: int, k: int = 60) -> List[SearchHit]:
+    """Fuse ranked hit lists by summing 1 / (k + rank) per chunk ID; scores become RRF scores."""
+    fused: Dict[str, float] = {}
+    payloads: Dict[str, dict] = {}
+    for hits in result_lists:
+        for rank, hit in enumerate(hits, start=1):
+            key = str(hit.id)
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank)
+            payloads.setdefault(key, hit.payload)
+    ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top_k]
+    return [SearchHit(key, score, payloads[key]) for key, score in ranked]
@@ -1,37 +1,80 @@
 import asyncio
+import contextlib
 import logging
 import os
-from typing import List, Tuple
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 
-import qdrant_client
-from openai import OpenAI
-import anthropic
 import chainlit as cl
+from chainlit.config import config as chainlit_config
 from dotenv import load_dotenv
 
+from bm25_index import BM25Index, reciprocal_rank_fusion
+from context_packing import assemble_context
+from embedding_cache import model_key, open_cache
+import metrics
+from query_cache import QueryCache, normalize_query
+from sites import SITES_CONFIG_PATH, load_sites, site_collection, site_path
+from vector_store import SearchHit, open_store
+
 # --- Configuration ---
 # Load environment variables from .env file
 load_dotenv()
 
-COLLECTION_NAME = "docs"
+COLLECTION_NAME = "docs"  # must match scrape_website.py
+SITE_TO_INDEX = "https://ruter.no"  # must match scrape_website.py (the only site when there is no SITES_CONFIG_PATH file)
+SITE_COLLECTIONS = "shared"  # must match scrape_website.py: "shared" (filtered on the "site" payload) or "per_site"
 QDRANT_URL = "http://localhost:6333"
 EMBED_MODEL = "text-embedding-3-small"
+EMBED_DIMENSIONS = None  # must match scrape_website.py
 LLM_MODEL = "claude-3-haiku-20240307"
+USE_EMBEDDING_CACHE = True  # reuse query vectors from embedding_cache.sqlite
+USE_QUERY_CACHE = True  # reuse answers for repeated or near-identical questions
+QUERY_CACHE_MAX_ENTRIES = 1000
+QUERY_CACHE_TTL = 3600  # seconds
+SEMANTIC_CACHE_THRESHOLD = 0.95  # min cosine similarity between query embeddings to reuse an answer
+INDEX_VERSION_PATH = "index_version"  # touched by scrape_website.py after each re-index; clears the query cache
+HTTP_MAX_CONNECTIONS = 100  # per async client; shared by all conversations in this process
+VECTOR_STORE_BACKEND = "qdrant"  # must match scrape_website.py: "qdrant" or "local"
+LOCAL_INDEX_DIR = "local_index"  # files of the "local" backend; loaded lazily on first use
+VECTOR_QUANTIZATION = None  # must match scrape_website.py for Qdrant (the local backend reads it from its files)
+QUANTIZATION_OVERSAMPLING = 2.0  # quantized candidates per result that are rescored with the full vectors
+RETRIEVAL_MODE = "hybrid"  # "dense" (vectors only), "sparse" (BM25 only) or "hybrid" (both, fused with RRF)
+BM25_INDEX_PATH = "bm25_index.npz"  # written by scrape_website.py
+HYBRID_CANDIDATES = 20  # hits taken from each retriever before fusion
+RRF_K = 60  # reciprocal rank fusion constant; higher flattens the rank weighting
+CONTEXT_TOKEN_BUDGET = 3000  # max tokens of retrieved text sent to the LLM per question
+NEAR_DUPLICATE_MAX_DISTANCE = 10  # SimHash bits (of 64) within which two context blocks count as duplicates; unrelated text is ~32 apart
+METRICS_ENABLED = False  # time embedding, search, packing and completion per question (see metrics.py)
+METRICS_PORT = 9464  # Prometheus endpoint (GET /metrics) served when METRICS_ENABLED
+PROFILE_DIR = None  # write a cProfile dump per answered question into this directory (debugging only)
+WARM_UP_ON_START = True  # under `chainlit run`: build and connect the clients and check the collections in the background at start-up
+STATUS_REFRESH_INTERVAL = 30  # seconds between background re-checks of the collection status shown to new chats
 
 # Setup basic logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # --- Initialize Clients ---
-# TODO: Implement client initialization with proper error handling
-# 1. Check for required API keys in environment variables
-# 2. Initialize OpenAI, Anthropic, and Qdrant clients
-# 3. Handle initialization errors gracefully
-# 4. Consider how to inform users of setup issues
-
-# Example global variable declarations (you'll assign them in the try block)
+# The clients are built on first use (or by the warm-up task, see _refresh_status_forever):
+# importing openai, anthropic and qdrant_client takes longer than the rest of the app together.
+# Clients assigned before that (e.g. by the benchmarks) are kept.
 openai_client = None
 anthropic_client = None
 qdrant = None # Renaming for consistency with later usage
+# Async variants used by the Chainlit handlers; one instance (and connection pool) per process.
+async_openai_client = None
+async_anthropic_client = None
+async_qdrant = None
+vector_store = None  # search goes through this (Qdrant or local, see vector_store.py); "shared" layout only
+bm25_index = BM25Index(BM25_INDEX_PATH) if RETRIEVAL_MODE != "dense" and SITE_COLLECTIONS == "shared" else None
+site_indexes = {}  # "per_site" layout: site name -> (vector store, BM25 index or None)
+SITES = load_sites(SITES_CONFIG_PATH, SITE_TO_INDEX)
+embedding_cache = open_cache() if USE_EMBEDDING_CACHE else None
+query_cache = QueryCache(QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_TTL, SEMANTIC_CACHE_THRESHOLD,
+                         INDEX_VERSION_PATH) if USE_QUERY_CACHE else None
+_clients_ready = False
+_clients_lock = threading.Lock()
 
 if not os.getenv("OPENAI_API_KEY"):
     logging.error("CRITICAL: OPENAI_API_KEY environment variable not found. Set it in your .env file.")
@@ -40,89 +83,596 @@ if not os.getenv("ANTHROPIC_API_KEY"):
     logging.error("CRITICAL: ANTHROPIC_API_KEY environment variable not found. Set it in your .env file.")
     # For a real app, you might raise SystemExit here.
 
-try:
-    # Initialize API clients here
-    openai_client = OpenAI() # API key is read from OPENAI_API_KEY environment variable by default
-    anthropic_client = anthropic.Anthropic() # API key is read from ANTHROPIC_API_KEY by default
-    qdrant = qdrant_client.QdrantClient(url=QDRANT_URL) # Use QDRANT_URL constant
-    
-    logging.info("OpenAI, Anthropic, and Qdrant clients initialized successfully.")
 
-except Exception as e:
-    logging.error(f"CRITICAL: Failed to initialize one or more API clients during setup: {e}", exc_info=True)
-    raise SystemExit(f"Application cannot start due to API client initialization failure: {e}")
+def init_clients():
+    """Build the API clients and vector stores that are not set yet; raises if one cannot be built."""
+    global openai_client, anthropic_client, qdrant, async_openai_client, async_anthropic_client, async_qdrant
+    global vector_store, _clients_ready
+    with _clients_lock:
+        if _clients_ready:
+            return
+        started = time.perf_counter()
+        import anthropic
+        import httpx
+        from openai import AsyncOpenAI, OpenAI
+
+        http_limits = httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_CONNECTIONS)
+        if openai_client is None:
+            openai_client = OpenAI() # API key is read from OPENAI_API_KEY environment variable by default
+        if anthropic_client is None:
+            anthropic_client = anthropic.Anthropic() # API key is read from ANTHROPIC_API_KEY by default
+        if async_openai_client is None:
+            async_openai_client = AsyncOpenAI(http_client=httpx.AsyncClient(limits=http_limits, timeout=60))
+        if async_anthropic_client is None:
+            async_anthropic_client = anthropic.AsyncAnthropic(
+                http_client=httpx.AsyncClient(limits=http_limits, timeout=600))
+        if VECTOR_STORE_BACKEND == "qdrant" and qdrant is None:
+            import qdrant_client
+            qdrant = qdrant_client.QdrantClient(url=QDRANT_URL) # Use QDRANT_URL constant
+            async_qdrant = qdrant_client.AsyncQdrantClient(url=QDRANT_URL, limits=http_limits)
+        if vector_store is None and not site_indexes:
+            if SITE_COLLECTIONS == "per_site":
+                for site in SITES:
+                    site_indexes[site.name] = (
+                        open_store(VECTOR_STORE_BACKEND, site_collection(COLLECTION_NAME, site.name, True),
+                                   qdrant=qdrant, async_qdrant=async_qdrant, local_dir=LOCAL_INDEX_DIR,
+                                   quantization=VECTOR_QUANTIZATION, oversampling=QUANTIZATION_OVERSAMPLING),
+                        BM25Index(site_path(BM25_INDEX_PATH, site.name)) if RETRIEVAL_MODE != "dense" else None,
+                    )
+            else:
+                vector_store = open_store(VECTOR_STORE_BACKEND, COLLECTION_NAME, qdrant=qdrant,
+                                          async_qdrant=async_qdrant, local_dir=LOCAL_INDEX_DIR,
+                                          quantization=VECTOR_QUANTIZATION, oversampling=QUANTIZATION_OVERSAMPLING)
+        _clients_ready = True
+        logging.info(f"OpenAI, Anthropic, and {VECTOR_STORE_BACKEND} vector store clients initialized "
+                     f"in {time.perf_counter() - started:.2f}s.")
+
+
+def _ensure_clients() -> bool:
+    """Build the clients if needed; False (logged) if that fails."""
+    if _clients_ready:
+        return True
+    try:
+        init_clients()
+        return True
+    except Exception as e:
+        logging.error(f"CRITICAL: Failed to initialize one or more API clients: {e}", exc_info=True)
+        return False
+
+
+async def _ensure_clients_async() -> bool:
+    """`_ensure_clients` off the event loop: the first call imports the client libraries."""
+    return _clients_ready or await asyncio.to_thread(_ensure_clients)
+
+
+def _collect_metrics():
+    """Counters kept by the caches, exported next to the request timings."""
+    if embedding_cache is not None:
+        yield "chat_embedding_cache_hits_total", "counter", embedding_cache.hits
+        yield "chat_embedding_cache_misses_total", "counter", embedding_cache.misses
+    if query_cache is not None:
+        yield "chat_query_cache_exact_hits_total", "counter", query_cache.exact_hits
+        yield "chat_query_cache_semantic_hits_total", "counter", query_cache.semantic_hits
+        yield "chat_query_cache_misses_total", "counter", query_cache.misses
+
+
+if METRICS_ENABLED:
+    metrics.enable()
+    metrics.register_collector(_collect_metrics)
+    metrics.serve(METRICS_PORT)
+
+_EMBED_OPTIONS = {"dimensions": EMBED_DIMENSIONS} if EMBED_DIMENSIONS else {}
 
 SYSTEM_PROMPT = (
     "You are an assistant that answers **only** from the provided <context>. "
     "If the answer cannot be found, simply reply with `I don't know`."
 )
 
-def check_qdrant_collection() -> Tuple[bool, str]:
-    """Checks if the Qdrant collection exists and has points."""
-    # TODO: 1. Verify that `qdrant` client is initialized
-    # TODO: 2. Call Qdrant to fetch collection metadata for COLLECTION_NAME
-    # TODO: 3. Determine if the collection exists (404 vs success)
-    # TODO: 4. Check `points_count` > 0
-    # TODO: 5. Return (True, status_message) or (False, error_message)
-    # TODO: 6. Wrap all calls in try/except and log any errors
-    pass
-
-
-def answer_query(query: str, top_k: int = 5) -> Tuple[str, List[str]]:
-    """Retrieve context from Qdrant and ask Anthropic; return (answer, sources)."""
-    # TODO: 0. Verify that openai_client, anthropic_client and qdrant are all initialized
-    
-    # TODO: 1. Generate an embedding for `query` using OpenAI
-    #    - Use openai_client.embeddings.create(...)
-    #    - Extract the vector from the response
-    
-    # TODO: 2. Search Qdrant with that embedding
-    #    - Use qdrant.search(...)
-    #    - Request payloads so you get stored text and URLs
-    
-    # TODO: 3. Extract and assemble:
-    #    - A list of source URLs
-    #    - A combined context string from the returned document texts
-    
-    # TODO: 4. Build your prompt:
-    #    - Wrap your context in <context>…</context>
-    #    - Append “User Question: {query}”
-    #    - Apply your SYSTEM_PROMPT
-    
-    # TODO: 5. Send the prompt to Anthropic for completion
-    #    - Use anthropic_client.messages.create(...)
-    #    - Extract the answer text
-    
-    # TODO: 6. Add proper try/except around each external call
-    #    - Log or return useful error messages if something fails
-    
-    # TODO: 7. Return a tuple of (answer_text, sources_list)
-    #    - Ensure you return unique/filtered URLs
-    
-    pass
+def _indexes(site: Optional[str] = None) -> List[Tuple[object, Optional[BM25Index], Optional[dict]]]:
+    """(vector store, BM25 index, payload filter) to search for `site`, or for every site if None."""
+    if SITE_COLLECTIONS == "per_site":
+        names = [site] if site is not None else list(site_indexes)
+        return [(*site_indexes[name], None) for name in names]
+    return [(vector_store, bm25_index, {"site": site} if site is not None else None)]
+
+
+def _has_index() -> bool:
+    return vector_store is not None or bool(site_indexes)
+
+
+def _unknown_site(site: Optional[str]) -> bool:
+    return site is not None and all(site != known.name for known in SITES)
+
+
+def _collection_status(points_count: int, site: Optional[str] = None) -> Tuple[bool, str]:
+    scope = f"Collection '{COLLECTION_NAME}'" if site is None else f"Site '{site}'"
+    if points_count == 0:
+        return False, f"{scope} is empty. Please run `scrape_website.py` first."
+    return True, f"{scope} is ready with {points_count} indexed chunks."
+
+
+def _not_found(site: Optional[str]) -> Tuple[bool, str]:
+    scope = f"Collection '{COLLECTION_NAME}'" if site is None else f"Site '{site}'"
+    return False, f"{scope} not found. Please run `scrape_website.py` first."
+
+
+def check_qdrant_collection(site: Optional[str] = None) -> Tuple[bool, str]:
+    """Checks if the collection(s) holding `site` (or all sites) exist in the vector store and have points."""
+    if not _ensure_clients() or not _has_index():
+        return False, "Vector store is not initialized."
+    if _unknown_site(site):
+        return False, f"Unknown site '{site}'."
+    points_count, found = 0, False
+    for store, _, where in _indexes(site):
+        try:
+            points_count += store.count(where)
+            found = True
+        except Exception as e:
+            logging.error(f"Could not fetch collection '{store.collection_name}': {e}")
+    if not found:
+        return _not_found(site)
+    return _collection_status(points_count, site)
+
+
+async def check_qdrant_collection_async(site: Optional[str] = None) -> Tuple[bool, str]:
+    """Async variant of `check_qdrant_collection`; also loads the local indexes."""
+    if not await _ensure_clients_async() or not _has_index():
+        return False, "Vector store is not initialized."
+    if _unknown_site(site):
+        return False, f"Unknown site '{site}'."
+    points_count, found = 0, False
+    for store, index, where in _indexes(site):
+        try:
+            points_count += await store.count_async(where)
+            if index is not None:
+                await asyncio.to_thread(len, index)  # load the keyword index before the first question
+            found = True
+        except Exception as e:
+            logging.error(f"Could not fetch collection '{store.collection_name}': {e}")
+    if not found:
+        return _not_found(site)
+    return _collection_status(points_count, site)
+
+
+# --- Collection status for new chats ---
+# New chats show a cached status instead of querying the vector store each time. Under `chainlit run`
+# the warm-up task re-checks it every STATUS_REFRESH_INTERVAL; entries older than two intervals
+# (no warm-up task, or it is stuck) are checked again when a chat starts.
+_status_cache: Dict[Optional[str], Tuple[float, Tuple[bool, str]]] = {}  # site (None = all) -> (checked at, status)
+
+
+async def refresh_collection_status():
+    """Re-check the status of all sites and of each chat profile's site, and (re)load the keyword indexes."""
+    for site in [None] + ([known.name for known in SITES] if len(SITES) > 1 else []):
+        _status_cache[site] = (time.monotonic(), await check_qdrant_collection_async(site))
+
+
+async def _warm_up_connections():
+    """Send one cheap request with each async API client, so the first question does not wait for connecting."""
+    import httpx
+
+    requests = {
+        "OpenAI": async_openai_client.models.list(),
+        # This SDK version has no models API; any response opens the connection.
+        "Anthropic": async_anthropic_client.get("/v1/models", cast_to=httpx.Response),
+    }
+    results = await asyncio.gather(*requests.values(), return_exceptions=True)
+    for name, result in zip(requests, results):
+        if isinstance(result, Exception):
+            logging.warning(f"Warm-up request to {name} failed: {result}")
+
+
+async def _refresh_status_forever():
+    """Warm-up task: build the clients, connect them, then keep the collection status fresh.
+
+    Runs on the server's event loop, where the async clients' connection pools are used.
+    """
+    if await _ensure_clients_async():
+        await _warm_up_connections()
+    while True:
+        try:
+            await refresh_collection_status()  # counting the points also connects the async vector store client
+        except Exception as e:
+            logging.error(f"Collection status refresh failed: {e}", exc_info=True)
+        await asyncio.sleep(STATUS_REFRESH_INTERVAL)
+
+
+def _warm_up_with_server():
+    """Start `_refresh_status_forever` when the Chainlit server starts, which is after this module is loaded."""
+    from chainlit.server import app
+
+    serve = app.router.lifespan_context
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        task = asyncio.create_task(_refresh_status_forever(), name="chat-warm-up")
+        try:
+            async with serve(app) as state:
+                yield state
+        finally:
+            task.cancel()
+
+    app.router.lifespan_context = lifespan
+
+
+async def _chat_status(site: Optional[str]) -> Tuple[bool, str]:
+    """Collection status for a new chat about `site`, from the cache while it is fresh."""
+    entry = _status_cache.get(site)
+    if entry is not None and time.monotonic() - entry[0] < 2 * STATUS_REFRESH_INTERVAL:
+        return entry[1]
+    status = await check_qdrant_collection_async(site)
+    _status_cache[site] = (time.monotonic(), status)
+    return status
+
+
+if WARM_UP_ON_START and chainlit_config.run.module_name:  # the module is being loaded by `chainlit run`
+    _warm_up_with_server()
+
+
+def _embed_query(query: str) -> List[float]:
+    """Embed the user query, reusing the vector from the shared embedding cache when possible."""
+    _ensure_clients()
+    def embed(texts: List[str]) -> List[List[float]]:
+        with metrics.span("chat_embed"):
+            response = openai_client.embeddings.create(model=EMBED_MODEL, input=texts, **_EMBED_OPTIONS)
+        return [item.embedding for item in response.data]
+
+    if embedding_cache is None:
+        return embed([query])[0]
+    vector = embedding_cache.embed(model_key(EMBED_MODEL, EMBED_DIMENSIONS), [query], embed)[0]
+    logging.info(f"Embedding cache: {embedding_cache.stats()}")
+    return vector
+
+
+async def _embed_query_async(query: str) -> List[float]:
+    """Async variant of `_embed_query`; the SQLite cache is read and written in a worker thread."""
+    key = model_key(EMBED_MODEL, EMBED_DIMENSIONS)
+    if embedding_cache is not None:
+        cached = (await asyncio.to_thread(embedding_cache.get_many, key, [query]))[0]
+        if cached is not None:
+            logging.info(f"Embedding cache: {embedding_cache.stats()}")
+            return cached
+    with metrics.span("chat_embed"):
+        response = await async_openai_client.embeddings.create(model=EMBED_MODEL, input=[query], **_EMBED_OPTIONS)
+    vector = response.data[0].embedding
+    if embedding_cache is not None:
+        await asyncio.to_thread(embedding_cache.put_many, key, [query], [vector])
+    return vector
+
+
+def _merge(result_lists: List[List[SearchHit]], n: int) -> List[SearchHit]:
+    """Best `n` hits of several indexes by score (BM25 scores of different indexes are only roughly comparable)."""
+    if len(result_lists) == 1:
+        return result_lists[0][:n]
+    return sorted((hit for hits in result_lists for hit in hits), key=lambda hit: hit.score, reverse=True)[:n]
+
+
+def _fuse(query: str, dense_hits, top_k: int, mode: str, indexes):
+    keyword_indexes = [(index, where) for _, index, where in indexes if index is not None]
+    if mode == "dense" or not keyword_indexes:
+        return dense_hits[:top_k]
+    n_sparse = max(top_k, HYBRID_CANDIDATES)
+    with metrics.span("chat_search", retriever="sparse"):
+        keyword_hits = _merge([index.search(query, n_sparse, where) for index, where in keyword_indexes], n_sparse)
+    if mode == "sparse":
+        return keyword_hits[:top_k]
+    return reciprocal_rank_fusion([dense_hits, keyword_hits], top_k, RRF_K)
+
+
+def retrieve(query: str, query_vector: List[float], top_k: int, mode: str = RETRIEVAL_MODE,
+             site: Optional[str] = None):
+    """Return the `top_k` chunks for a query using dense, sparse (BM25) or hybrid (RRF-fused) retrieval.
+
+    With a `site` only that site's chunks are searched, otherwise all sites'.
+    """
+    _ensure_clients()
+    n_dense = top_k if mode == "dense" else max(top_k, HYBRID_CANDIDATES)
+    indexes = _indexes(site)
+    with metrics.span("chat_search", retriever="dense"):
+        dense_hits = [] if mode == "sparse" else _merge(
+            [store.search(query_vector, n_dense, where) for store, _, where in indexes], n_dense)
+    return _fuse(query, dense_hits, top_k, mode, indexes)
+
+
+async def retrieve_async(query: str, query_vector: List[float], top_k: int, mode: str = RETRIEVAL_MODE,
+                         site: Optional[str] = None):
+    """Async variant of `retrieve`; the in-process BM25 lookup stays synchronous."""
+    await _ensure_clients_async()
+    n_dense = top_k if mode == "dense" else max(top_k, HYBRID_CANDIDATES)
+    indexes = _indexes(site)
+    with metrics.span("chat_search", retriever="dense"):
+        dense_hits = [] if mode == "sparse" else _merge(await asyncio.gather(
+            *(store.search_async(query_vector, n_dense, where) for store, _, where in indexes)), n_dense)
+    return _fuse(query, dense_hits, top_k, mode, indexes)
+
+
+def _cached_answer(normalized_query: str, query_vector: Optional[List[float]] = None,
+                   site: Optional[str] = None) -> Optional[Tuple[str, List[str]]]:
+    """Look up the query cache (answers for the same `site` only): exact match without a vector, semantic match with one."""
+    if query_cache is None:
+        return None
+    if query_vector is None:
+        cached = query_cache.get_exact(normalized_query, site)
+        kind = "exact"
+    else:
+        cached = query_cache.get_similar(query_vector, site)
+        kind = "semantic"
+    if cached is not None:
+        logging.info(f"Query cache: {kind} hit ({query_cache.stats()})")
+    return cached
+
+
+def _build_prompt(query: str, hits) -> Tuple[str, List[str]]:
+    """Assemble the LLM prompt from the search hits; returns (prompt, unique source URLs).
+
+    Overlapping and near-duplicate chunks are collapsed and the rest packed
+    into CONTEXT_TOKEN_BUDGET tokens (see context_packing.py).
+    """
+    with metrics.span("chat_context"):
+        context, sources, stats = assemble_context(hits, CONTEXT_TOKEN_BUDGET, NEAR_DUPLICATE_MAX_DISTANCE)
+    metrics.inc("chat_context_tokens_total", stats.tokens_after)
+    logging.info(f"Context: {stats.tokens_before} -> {stats.tokens_after} tokens "
+                 f"({stats.hits} hits -> {stats.blocks} blocks; {stats.merged} merged, "
+                 f"{stats.duplicates} near-duplicates, {stats.dropped} over budget)")
+    prompt = f"<context>\n{context}\n</context>\n\nUser Question: {query}"
+    return prompt, sources
+
+
+def _profile_path(name: str) -> Optional[str]:
+    return os.path.join(PROFILE_DIR, f"{name}-{time.time():.6f}.prof") if PROFILE_DIR else None
+
+
+def _record_usage(input_tokens: int, output_tokens: int):
+    """Count the prompt and completion tokens Anthropic reports for one answer."""
+    metrics.inc("chat_llm_input_tokens_total", input_tokens)
+    metrics.inc("chat_llm_output_tokens_total", output_tokens)
+
+
+# Steps shared by `_answer_query` and `_answer_query_async`, which differ only in how they call the APIs.
+
+def _unanswerable(clients_ready: bool, site: Optional[str]) -> Optional[Tuple[str, List[str]]]:
+    """The reply to give without looking anything up, or None if the question can be answered."""
+    if not clients_ready or not _has_index():
+        return "The assistant is not configured correctly (API clients missing).", []
+    if _unknown_site(site):
+        return f"Unknown site '{site}'.", []
+    return None
+
+
+_FAILURES = {  # step -> (log message, reply)
+    "embed": ("Failed to embed query", "Sorry, I could not process your question (embedding failed)."),
+    "search": ("Search failed", "Sorry, I could not search the knowledge base."),
+    "completion": ("Anthropic completion failed", "Sorry, I could not generate an answer right now."),
+}
+
+
+def _failed(step: str, error: Exception, sources: Optional[List[str]] = None) -> Tuple[str, List[str]]:
+    """Log a failed step of answering and return the apology shown instead of the answer."""
+    logging.error(f"{_FAILURES[step][0]}: {error}", exc_info=True)
+    return _FAILURES[step][1], sources or []
+
+
+def _completion_request(prompt: str) -> dict:
+    """Arguments of the Anthropic messages call that answers `prompt`."""
+    return {"model": LLM_MODEL, "max_tokens": 1024, "system": SYSTEM_PROMPT,
+            "messages": [{"role": "user", "content": prompt}]}
+
+
+def _finish_answer(normalized_query: str, query_vector: List[float], site: Optional[str], answer: str,
+                   sources: List[str], input_tokens: int, output_tokens: int) -> Tuple[str, List[str]]:
+    """Count the completion's tokens and cache the answer; returns (answer, sources)."""
+    if metrics.enabled():
+        _record_usage(input_tokens, output_tokens)
+    if query_cache is not None:
+        query_cache.put(normalized_query, query_vector, (answer, sources), site)
+    return answer, sources
+
+
+def answer_query(query: str, top_k: int = 5, site: Optional[str] = None) -> Tuple[str, List[str]]:
+    """Retrieve context from the vector store and ask Anthropic; return (answer, sources).
+
+    With a `site` (a name from the sites config) only that site's chunks are searched.
+    """
+    with metrics.profiled(_profile_path("answer_query")), metrics.span("chat_answer"):
+        return _answer_query(query, top_k, site)
+
+
+def _answer_query(query: str, top_k: int, site: Optional[str]) -> Tuple[str, List[str]]:
+    clients_ready = _ensure_clients() and openai_client is not None and anthropic_client is not None
+    unanswerable = _unanswerable(clients_ready, site)
+    if unanswerable is not None:
+        return unanswerable
+
+    normalized_query = normalize_query(query)
+    cached = _cached_answer(normalized_query, site=site)
+    if cached is not None:
+        return cached
+
+    try:
+        query_vector = _embed_query(query)
+    except Exception as e:
+        return _failed("embed", e)
+
+    cached = _cached_answer(normalized_query, query_vector, site)
+    if cached is not None:
+        return cached
+
+    try:
+        hits = retrieve(query, query_vector, top_k, site=site)
+    except Exception as e:
+        return _failed("search", e)
+
+    if not hits:
+        return "I don't know", []
+
+    prompt, sources = _build_prompt(query, hits)
+
+    try:
+        with metrics.span("chat_completion"):
+            response = anthropic_client.messages.create(**_completion_request(prompt))
+        answer = "".join(block.text for block in response.content if block.type == "text")
+    except Exception as e:
+        return _failed("completion", e, sources)
+
+    return _finish_answer(normalized_query, query_vector, site, answer, sources,
+                          response.usage.input_tokens, response.usage.output_tokens)
+
+
+async def answer_query_async(query: str, top_k: int = 5,
+                             on_token: Optional[Callable[[str], Awaitable[None]]] = None,
+                             site: Optional[str] = None) -> Tuple[str, List[str]]:
+    """Async variant of `answer_query` that streams the completion.
+
+    Every text delta from Anthropic is passed to `on_token` as it arrives.
+    Cached and error answers are returned without streaming.
+    """
+    with metrics.profiled(_profile_path("answer_query_async")), metrics.span("chat_answer"):
+        return await _answer_query_async(query, top_k, on_token, site)
+
+
+async def _answer_query_async(query: str, top_k: int, on_token: Optional[Callable[[str], Awaitable[None]]],
+                              site: Optional[str]) -> Tuple[str, List[str]]:
+    started = time.perf_counter()
+    clients_ready = (await _ensure_clients_async() and async_openai_client is not None
+                     and async_anthropic_client is not None)
+    unanswerable = _unanswerable(clients_ready, site)
+    if unanswerable is not None:
+        return unanswerable
+
+    normalized_query = normalize_query(query)
+    cached = _cached_answer(normalized_query, site=site)
+    if cached is not None:
+        return cached
+
+    try:
+        query_vector = await _embed_query_async(query)
+    except Exception as e:
+        return _failed("embed", e)
+
+    cached = _cached_answer(normalized_query, query_vector, site)
+    if cached is not None:
+        return cached
+
+    try:
+        hits = await retrieve_async(query, query_vector, top_k, site=site)
+    except Exception as e:
+        return _failed("search", e)
+
+    if not hits:
+        return "I don't know", []
+
+    prompt, sources = _build_prompt(query, hits)
+
+    parts = []
+    input_tokens = output_tokens = 0
+    try:
+        with metrics.span("chat_completion"):
+            async with async_anthropic_client.messages.stream(**_completion_request(prompt)) as stream:
+                # Iterate the raw events rather than `text_stream`: the final output token
+                # count only arrives in the message_delta event, which the SDK's message
+                # snapshot does not pick up.
+                async for event in stream:
+                    if event.type == "content_block_delta" and event.delta.type == "text_delta":
+                        if not parts:
+                            metrics.observe("chat_first_token_seconds", time.perf_counter() - started)
+                        parts.append(event.delta.text)
+                        if on_token is not None:
+                            await on_token(event.delta.text)
+                    elif event.type == "message_start":
+                        input_tokens = event.message.usage.input_tokens
+                    elif event.type == "message_delta":
+                        output_tokens = event.usage.output_tokens
+    except Exception as e:
+        return _failed("completion", e, sources)
+
+    return _finish_answer(normalized_query, query_vector, site, "".join(parts), sources, input_tokens, output_tokens)
+
+
+def _format_sources(sources: List[str]) -> str:
+    if not sources:
+        return ""
+    source_lines = "\n".join(f"- {url}" for url in sources)
+    return f"\n\n**Sources:**\n{source_lines}"
+
+
+def _format_answer(answer: str, sources: List[str]) -> str:
+    return answer + _format_sources(sources)
 
 
 # --- Chainlit Callbacks ---
 
+ALL_SITES_PROFILE = "All sites"
+
+
+@cl.set_chat_profiles
+async def chat_profiles(current_user: Optional[cl.User] = None):
+    """With more than one site, let users pick the site their questions are about (or all of them)."""
+    if len(SITES) < 2:
+        return []
+    return [cl.ChatProfile(name=ALL_SITES_PROFILE, markdown_description="Answers from every indexed site.",
+                           default=True)] + [
+        cl.ChatProfile(name=site.name, markdown_description=f"Answers from {site.url} only.") for site in SITES]
+
+
+def _session_site() -> Optional[str]:
+    """The site chosen through the chat profile, or None for all sites."""
+    profile = cl.user_session.get("chat_profile")
+    return None if not profile or profile == ALL_SITES_PROFILE else profile
+
+
 @cl.on_chat_start
 async def on_chat_start():
     """Initialize the chat session."""
-    # TODO: 1. Verify that OpenAI, Anthropic and Qdrant clients are all initialized
-    # TODO: 2. Run `check_qdrant_collection` asynchronously
-    # TODO: 3. Based on its result, send either a welcome or warning message
-    # TODO: 4. Set `cl.user_session.set("ready_to_chat", True/False)` accordingly
-    # TODO: 5. Handle and log any unexpected exceptions
-    pass
+    try:
+        if (not await _ensure_clients_async() or async_openai_client is None or async_anthropic_client is None
+                or not _has_index()):
+            cl.user_session.set("ready_to_chat", False)
+            await cl.Message(content="The assistant is not configured correctly. Check the server logs.").send()
+            return
+
+        site = _session_site()
+        ready, status = await _chat_status(site)
+        cl.user_session.set("site", site)
+        cl.user_session.set("ready_to_chat", ready)
+        if ready:
+            subject = site or ("the indexed websites" if len(SITES) > 1 else "the indexed website")
+            await cl.Message(content=f"Hi! Ask me anything about {subject}. ({status})").send()
+        else:
+            await cl.Message(content=f"Warning: {status}").send()
+    except Exception as e:
+        logging.error(f"Error during chat start: {e}", exc_info=True)
+        cl.user_session.set("ready_to_chat", False)
+        await cl.Message(content="Something went wrong while starting the chat.").send()
 
 
 @cl.on_message
 async def on_message(message: cl.Message):
-    """Handle incoming user messages."""
-    # TODO: 1. Check `cl.user_session.get("ready_to_chat")` and bail if False
-    # TODO: 2. Validate/extract the text query from `message.content`
-    # TODO: 3. Send a “Thinking…” placeholder response
-    # TODO: 4. Call `answer_query` in a background thread
-    # TODO: 5. Format the returned answer and sources into Markdown
-    # TODO: 6. Update or replace the placeholder with the final content
-    # TODO: 7. Wrap each step in try/except to catch/log errors and inform the user
-    #await cl.Message(content=).send()
\ No newline at end of file
+    """Handle incoming user messages, streaming the answer as it is generated."""
+    if not cl.user_session.get("ready_to_chat"):
+        await cl.Message(content="The knowledge base is not ready yet. Please run the indexer and reload.").send()
+        return
+
+    query = (message.content or "").strip()
+    if not query:
+        await cl.Message(content="Please type a question.").send()
+        return
+
+    reply = cl.Message(content="")
+    await reply.send()
+    streamed = False
+
+    async def on_token(token: str):
+        nonlocal streamed
+        streamed = True
+        await reply.stream_token(token)
+
+    try:
+        answer, sources = await answer_query_async(query, on_token=on_token, site=cl.user_session.get("site"))
+        if streamed and reply.content == answer:
+            reply.content = answer + _format_sources(sources)
+        else:
+            reply.content = _format_answer(answer, sources)
+    except Exception as e:
+        logging.error(f"Error answering query: {e}", exc_info=True)
+        reply.content = "Sorry, something went wrong while answering your question."
+    await reply.update()
@@ -0,0 +1,116 @@
+import re
+from typing import List, Tuple
+
+import numpy as np
+import tiktoken
+
+# Kept free of API clients and other import-time side effects so that
+# worker processes can import it cheaply.
+
+# Sentence ends and line breaks that a chunk boundary may snap back to.
+_BOUNDARY = re.compile(r"[.!?…:](?=\s)|\n")
+_SNAP_MIN_FRACTION = 0.75  # never shrink a chunk below this share of `size` when snapping
+
+
+def get_encoding() -> tiktoken.Encoding:
+    """Return the tokenizer used by the embedding model (loaded once per process)."""
+    global _encoding
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding("cl100k_base")
+    return _encoding
+
+_encoding = None
+_token_byte_lengths = {}  # encoding name -> array of the UTF-8 byte length of every token id
+
+
+def _byte_lengths(encoding: tiktoken.Encoding) -> np.ndarray:
+    lengths = _token_byte_lengths.get(encoding.name)
+    if lengths is None:
+        lengths = np.zeros(encoding.n_vocab, dtype=np.int64)
+        for token in range(encoding.n_vocab):
+            try:
+                lengths[token] = len(encoding.decode_single_token_bytes(token))
+            except KeyError:  # unused ids between the ordinary and the special tokens
+                pass
+        _token_byte_lengths[encoding.name] = lengths
+    return lengths
+
+
+def _token_offsets(encoding: tiktoken.Encoding, tokens: List[int], text: str) -> np.ndarray:
+    """Character offset of the start of each token, as `Encoding.decode_with_offsets` gives it.
+
+    Computed with array operations instead of a Python loop over the tokens:
+    byte offsets are the running sum of token byte lengths, and a byte offset
+    becomes a character offset by subtracting the UTF-8 continuation bytes up to
+    and including it (so a token starting inside a multi-byte character gets
+    that character's offset).
+    """
+    lengths = _byte_lengths(encoding)[np.fromiter(tokens, dtype=np.int64, count=len(tokens))]
+    byte_starts = np.cumsum(lengths) - lengths
+    try:
+        data = text.encode("utf-8")
+    except UnicodeEncodeError:  # lone surrogates, which the tokenizer replaced
+        data = encoding.decode_bytes(tokens)
+    continuation = np.flatnonzero((np.frombuffer(data, dtype=np.uint8) & 0xC0) == 0x80)
+    return byte_starts - np.searchsorted(continuation, byte_starts, side="right")
+
+
+def _strip_span(text: str, start: int, end: int) -> Tuple[int, int]:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def chunk_spans(text: str, size: int = 800, overlap: int = 40, snap: bool = False) -> List[Tuple[int, int]]:
+    """Return (start, end) character offsets of overlapping ~`size`-token windows over `text`.
+
+    The text is encoded once and token boundaries are mapped back to
+    character offsets, so chunks are slices of the original string instead of
+    separately decoded token lists. With `snap`, a window end is moved back to
+    the last sentence or line break in its final quarter, if there is one.
+    Spans are trimmed of surrounding whitespace.
+    """
+    encoding = get_encoding()
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= size:
+        span = _strip_span(text, 0, len(text))
+        return [span] if span[0] < span[1] else []
+
+    step = size - overlap
+    if step <= 0:
+        raise ValueError("Overlap cannot be greater than or equal to chunk size.")
+
+    offsets = _token_offsets(encoding, tokens, text)
+    n_tokens = len(tokens)
+    spans = []
+    start_token = 0
+    while start_token < n_tokens:
+        end_token = min(start_token + size, n_tokens)
+        start_char = int(offsets[start_token])
+        end_char = int(offsets[end_token]) if end_token < n_tokens else len(text)
+        if snap and end_token < n_tokens:
+            search_from = int(offsets[start_token + max(1, int(size * _SNAP_MIN_FRACTION))])
+            breaks = [m.end() for m in _BOUNDARY.finditer(text, search_from, end_char)]
+            if breaks:
+                end_char = breaks[-1]
+                end_token = max(start_token + 1, int(np.searchsorted(offsets, end_char, side="left")))
+        span = _strip_span(text, start_char, end_char)
+        if span[0] < span[1]:
+            spans.append(span)
+        if end_token >= n_tokens:
+            break
+        start_token = max(end_token - overlap, start_token + 1)
+    return spans
+
+
+def chunk_with_offsets(text: str, size: int = 800, overlap: int = 40,
+                       snap: bool = False) -> List[Tuple[str, int, int]]:
+    """Like `chunk_spans`, but returns (chunk_text, start, end) tuples."""
+    return [(text[start:end], start, end) for start, end in chunk_spans(text, size, overlap, snap)]
+
+
+def chunk_text(text: str, size: int = 800, overlap: int = 40, snap: bool = False) -> List[str]:
+    """Split text into overlapping chunks of approximately `size` tokens using tiktoken."""
+    return [text[start:end] for start, end in chunk_spans(text, size, overlap, snap)]
@@ -0,0 +1,126 @@
+import hashlib
+import threading
+from collections import Counter
+from typing import Iterable, List, Optional, Tuple
+
+from simhash import hamming_distance, simhash
+
+_MIN_BOILERPLATE_CHARS = 20  # shorter blocks ("Ja", "1", table cells) are never treated as boilerplate
+
+
+def block_hash(block: str) -> Optional[str]:
+    """Hash of a text block for boilerplate counting, or None for blocks too short to count."""
+    if len(block) < _MIN_BOILERPLATE_CHARS:
+        return None
+    return hashlib.blake2b(block.lower().encode("utf-8"), digest_size=8).hexdigest()
+
+
+def strip_boilerplate(blocks: List[str], boilerplate: frozenset) -> Tuple[str, List[str], int, int]:
+    """Join `blocks` into page text without known boilerplate blocks.
+
+    Returns (text, hashes of all countable blocks, blocks dropped, characters dropped).
+    """
+    kept, hashes, dropped, dropped_chars = [], [], 0, 0
+    for block in blocks:
+        digest = block_hash(block)
+        if digest is not None:
+            hashes.append(digest)
+            if digest in boilerplate:
+                dropped += 1
+                dropped_chars += len(block)
+                continue
+        kept.append(block)
+    return " ".join(kept), hashes, dropped, dropped_chars
+
+
+def page_fingerprint(text: str) -> Tuple[str, int]:
+    """(exact content hash, SimHash) of a page's text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest(), simhash(text)
+
+
+class ContentFilter:
+    """Crawl-time duplicate-page detection and site-wide boilerplate learning.
+
+    Boilerplate: every parsed page reports the hashes of its text blocks; a
+    block found on at least `min_pages` pages and on `min_fraction` of the
+    pages seen so far becomes boilerplate and is dropped from pages parsed
+    after that. Learning is online, so the first pages of a crawl keep their
+    copies; pass the set learned by a previous run as `known_boilerplate`.
+
+    Duplicates: pages whose text hashes to an already accepted page are exact
+    duplicates; pages whose SimHash is within `max_distance` bits of one are
+    near duplicates. Near-duplicate lookup splits fingerprints into
+    `max_distance + 1` bands, one of which must match exactly (pigeonhole), so
+    it does not scan every page.
+    """
+
+    def __init__(self, max_distance: int = 6, min_pages: int = 5, min_fraction: float = 0.3,
+                 known_boilerplate: Iterable[str] = ()):
+        self.max_distance = max_distance
+        self.min_pages = min_pages
+        self.min_fraction = min_fraction
+        self.boilerplate = frozenset(known_boilerplate)  # replaced, never mutated, so readers need no lock
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+        self.boilerplate_blocks = 0
+        self.boilerplate_chars = 0
+        self._lock = threading.Lock()
+        self._block_pages = Counter()
+        self._pages_parsed = 0
+        self._content_hashes = {}
+        n_bands = max_distance + 1
+        self._band_bits = [64 // n_bands + (1 if i < 64 % n_bands else 0) for i in range(n_bands)]
+        self._bands = [{} for _ in range(n_bands)]
+
+    def observe(self, block_hashes: List[str], dropped: int, dropped_chars: int):
+        """Count the blocks of one parsed page and promote frequent ones to boilerplate."""
+        with self._lock:
+            self._pages_parsed += 1
+            self.boilerplate_blocks += dropped
+            self.boilerplate_chars += dropped_chars
+            learned = []
+            for digest in set(block_hashes):
+                self._block_pages[digest] += 1
+                count = self._block_pages[digest]
+                if (count >= self.min_pages and count >= self.min_fraction * self._pages_parsed
+                        and digest not in self.boilerplate):
+                    learned.append(digest)
+            if learned:
+                self.boilerplate = self.boilerplate | frozenset(learned)
+
+    def _band_keys(self, fingerprint: int) -> List[Tuple[int, int]]:
+        keys, shift = [], 0
+        for band, bits in enumerate(self._band_bits):
+            keys.append((band, (fingerprint >> shift) & ((1 << bits) - 1)))
+            shift += bits
+        return keys
+
+    def _add(self, url: str, content_hash: str, fingerprint: int):
+        self._content_hashes.setdefault(content_hash, url)
+        for band, key in self._band_keys(fingerprint):
+            self._bands[band].setdefault(key, []).append((fingerprint, url))
+
+    def register(self, url: str, content_hash: str, fingerprint: int):
+        """Record an accepted page (e.g. one not modified since the last crawl)."""
+        with self._lock:
+            self._add(url, content_hash, fingerprint)
+
+    def check(self, url: str, content_hash: str, fingerprint: int) -> Optional[Tuple[str, str]]:
+        """Return ("exact" | "near", original URL) for a duplicate, else register the page and return None."""
+        with self._lock:
+            original = self._content_hashes.get(content_hash)
+            if original is not None and original != url:
+                self.exact_duplicates += 1
+                return "exact", original
+            for band, key in self._band_keys(fingerprint):
+                for other, other_url in self._bands[band].get(key, ()):
+                    if other_url != url and hamming_distance(fingerprint, other) <= self.max_distance:
+                        self.near_duplicates += 1
+                        return "near", other_url
+            self._add(url, content_hash, fingerprint)
+        return None
+
+    def stats(self) -> str:
+        return (f"{self.exact_duplicates} exact and {self.near_duplicates} near-duplicate pages skipped, "
+                f"{self.boilerplate_blocks} boilerplate blocks ({self.boilerplate_chars} chars) dropped, "
+                f"{len(self.boilerplate)} boilerplate blocks known")
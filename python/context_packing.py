@@ -0,0 +1,105 @@
+from typing import List, NamedTuple, Tuple
+
+from chunking import get_encoding
+from simhash import hamming_distance, simhash
+
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+
+
+class ContextStats(NamedTuple):
+    tokens_before: int  # tokens of the hit texts joined as-is
+    tokens_after: int  # tokens of the assembled context
+    hits: int
+    blocks: int  # blocks in the assembled context
+    merged: int  # hits folded into an overlapping neighbour from the same page
+    duplicates: int  # near-duplicate hits and blocks dropped
+    dropped: int  # blocks that did not fit the token budget
+
+
+def _merge_adjacent(hits) -> Tuple[List[list], int]:
+    """Merge overlapping or touching chunks of the same page using their char_start/char_end payloads.
+
+    Returns [rank, url, start, end, text] blocks in best-rank order and the
+    number of hits merged away. Hits without offsets are kept as they are.
+    """
+    blocks, by_url = [], {}
+    for rank, hit in enumerate(hits):
+        payload = hit.payload or {}
+        block = [rank, payload.get("url", ""), payload.get("char_start"), payload.get("char_end"), payload.get("text", "")]
+        if block[2] is None or block[3] is None:
+            blocks.append(block)
+        else:
+            by_url.setdefault(block[1], []).append(block)
+
+    merged = 0
+    for spans in by_url.values():
+        spans.sort(key=lambda block: block[2])
+        current = spans[0]
+        for span in spans[1:]:
+            offset, overlap = span[2] - current[2], min(current[3], span[3]) - span[2]
+            # Offsets are only comparable if the overlapping text agrees (the page may have changed between runs).
+            if overlap < 0 or current[4][offset:offset + overlap] != span[4][:overlap]:
+                blocks.append(current)
+                current = span
+                continue
+            if span[3] > current[3]:
+                current[4] += span[4][current[3] - span[2]:]
+                current[3] = span[3]
+            current[0] = min(current[0], span[0])
+            merged += 1
+        blocks.append(current)
+    blocks.sort(key=lambda block: block[0])
+    return blocks, merged
+
+
+def _drop_near_duplicates(items: list, texts: List[str], max_distance: int) -> list:
+    """Keep the `items` (in rank order) whose text's SimHash is not within `max_distance` bits of a kept one."""
+    kept, fingerprints = [], []
+    for item, text in zip(items, texts):
+        fingerprint = simhash(text)
+        if any(hamming_distance(fingerprint, other) <= max_distance for other in fingerprints):
+            continue
+        fingerprints.append(fingerprint)
+        kept.append(item)
+    return kept
+
+
+def assemble_context(hits, token_budget: int, max_distance: int = 10) -> Tuple[str, List[str], ContextStats]:
+    """Build the LLM context from ranked search hits within `token_budget` tokens.
+
+    Hits whose SimHash is within `max_distance` bits of a better-ranked hit
+    are dropped as near duplicates, before overlapping chunks of the same page
+    are merged, so a chunk repeated inside another page's merged block is
+    still caught; merged blocks that nearly duplicate a better-ranked block
+    are dropped too. The rest are packed greedily in rank order: a block that
+    does not fit is skipped in favour of smaller ones further down, and a
+    first block larger than the whole budget is truncated. Tokens are counted
+    with the tiktoken encoding used for chunking, which approximates the LLM's
+    own tokenizer. Returns (context, source URLs of the packed blocks, stats).
+    """
+    encoding = get_encoding()
+    texts = [(hit.payload or {}).get("text", "") for hit in hits]
+    tokens_before = len(encoding.encode(CONTEXT_SEPARATOR.join(texts), disallowed_special=())) if texts else 0
+
+    unique_hits = _drop_near_duplicates(hits, texts, max_distance)
+    blocks, merged = _merge_adjacent(unique_hits)
+    kept = _drop_near_duplicates(blocks, [block[4] for block in blocks], max_distance)
+
+    separator_tokens = len(encoding.encode(CONTEXT_SEPARATOR))
+    packed, used = [], 0
+    for block in kept:
+        cost = len(encoding.encode(block[4], disallowed_special=())) + (separator_tokens if packed else 0)
+        if used + cost <= token_budget:
+            packed.append(block)
+            used += cost
+        elif not packed:
+            truncated = encoding.decode(encoding.encode(block[4], disallowed_special=())[:token_budget])
+            packed.append(block[:4] + [truncated])
+            used = token_budget
+
+    context = CONTEXT_SEPARATOR.join(block[4] for block in packed)
+    sources = list(dict.fromkeys(block[1] for block in packed if block[1]))
+    tokens_after = len(encoding.encode(context, disallowed_special=())) if context else 0
+    stats = ContextStats(tokens_before, tokens_after, len(hits), len(packed),
+                         merged, len(hits) - len(unique_hits) + len(blocks) - len(kept), len(kept) - len(packed))
+    return context, sources, stats
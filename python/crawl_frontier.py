@@ -0,0 +1,173 @@
+import gzip
+import json
+import logging
+import sqlite3
+import threading
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+# --- Configuration ---
+CRAWL_FRONTIER_PATH = "crawl_frontier.sqlite"  # checkpoint of the current crawl (None = in memory, no resume)
+_REPLAY_BATCH = 200  # completed pages read from disk at a time when resuming
+
+
+def _parse_lastmod(value: Optional[str]) -> Optional[float]:
+    """Parse a sitemap <lastmod> (W3C datetime) into a POSIX timestamp, or None."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.strip().replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def parse_sitemap(content: bytes) -> Tuple[List[Tuple[str, Optional[float]]], List[str]]:
+    """Parse a sitemap or sitemap index (optionally gzipped).
+
+    Returns ([(page_url, lastmod_timestamp)], [child_sitemap_url]).
+    """
+    if content[:2] == b"\x1f\x8b":
+        content = gzip.decompress(content)
+    try:
+        root = ET.fromstring(content)
+    except ET.ParseError as e:
+        logging.warning(f"Could not parse sitemap: {e}")
+        return [], []
+    pages, children = [], []
+    for entry in root:
+        tag = entry.tag.rsplit("}", 1)[-1]
+        fields = {child.tag.rsplit("}", 1)[-1]: (child.text or "").strip() for child in entry}
+        if not fields.get("loc"):
+            continue
+        if tag == "url":
+            pages.append((fields["loc"], _parse_lastmod(fields.get("lastmod"))))
+        elif tag == "sitemap":
+            children.append(fields["loc"])
+    return pages, children
+
+
+class CrawlFrontier:
+    """SQLite-backed crawl frontier: queued, in-flight and finished URLs plus the scraped text.
+
+    The frontier doubles as the `seen` set, so memory stays flat however
+    large the crawl. URLs are handed out by depth (BFS), then most recent
+    sitemap `lastmod` first, then discovery order. Every finished page is
+    checkpointed with its text and HTTP validators, so an interrupted crawl of
+    the same base URL resumes where it stopped: finished pages are replayed
+    from disk instead of being fetched again. A crawl that runs to completion
+    is marked finished and the next `start` begins afresh.
+    """
+
+    def __init__(self, path: str = CRAWL_FRONTIER_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS urls ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " url TEXT NOT NULL UNIQUE,"
+            " state TEXT NOT NULL,"  # queued | in_flight | done | skipped | failed
+            " depth INTEGER NOT NULL,"
+            " lastmod REAL,"
+            " text TEXT,"  # NULL for done pages that were not modified since the last run
+            " validators TEXT)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS urls_queue ON urls (state, depth, lastmod IS NULL, lastmod DESC, seq)")
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def start(self, base_url: str) -> bool:
+        """Prepare a crawl of `base_url`; returns True when resuming an unfinished one."""
+        with self._lock:
+            resuming = self._meta("base_url") == base_url and self._meta("finished") == "0"
+            self._conn.execute("BEGIN")
+            if resuming:
+                self._conn.execute("UPDATE urls SET state = 'queued' WHERE state = 'in_flight'")
+            else:
+                self._conn.execute("DELETE FROM urls")
+                self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('base_url', ?)", (base_url,))
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('finished', '0')")
+            self._conn.execute("COMMIT")
+            return resuming
+
+    def finish(self):
+        """Mark the crawl complete, so the next `start` does not resume it."""
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('finished', '1')")
+
+    def add(self, entries: Iterable[Tuple[str, int, Optional[float]]]) -> int:
+        """Queue (url, depth, lastmod) entries not seen before; returns how many were new."""
+        rows = [(url, depth, lastmod) for url, depth, lastmod in entries]
+        if not rows:
+            return 0
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO urls (url, state, depth, lastmod) VALUES (?, 'queued', ?, ?)", rows)
+            self._conn.execute("COMMIT")
+            return self._conn.total_changes - before
+
+    def pop(self) -> Optional[Tuple[str, int]]:
+        """Return the next (url, depth) to fetch and mark it in flight, or None if the queue is empty."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT seq, url, depth FROM urls WHERE state = 'queued'"
+                " ORDER BY depth, lastmod IS NULL, lastmod DESC, seq LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE urls SET state = 'in_flight' WHERE seq = ?", (row[0],))
+            return row[1], row[2]
+
+    def complete(self, url: str, text: Optional[str], validators: Optional[dict]):
+        """Checkpoint a fetched page (`text` None for a page not modified since the last run)."""
+        with self._lock:
+            self._conn.execute("UPDATE urls SET state = 'done', text = ?, validators = ? WHERE url = ?",
+                               (text, json.dumps(validators) if validators else None, url))
+
+    def mark(self, url: str, state: str):
+        """Set the state of a URL that produced no page: 'skipped', 'failed' or back to 'queued'."""
+        with self._lock:
+            self._conn.execute("UPDATE urls SET state = ? WHERE url = ?", (state, url))
+
+    def completed_pages(self) -> Iterator[Tuple[str, Optional[str], Optional[dict]]]:
+        """Yield (url, text, validators) for every checkpointed page, reading in small batches."""
+        last_seq = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT seq, url, text, validators FROM urls WHERE state = 'done' AND seq > ? ORDER BY seq LIMIT ?",
+                    (last_seq, _REPLAY_BATCH),
+                ).fetchall()
+            if not rows:
+                return
+            for seq, url, text, validators in rows:
+                last_seq = seq
+                yield url, text, json.loads(validators) if validators else None
+
+    def stats(self) -> str:
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT state, COUNT(*) FROM urls GROUP BY state").fetchall())
+        return ", ".join(f"{counts.get(state, 0)} {state}" for state in ("done", "queued", "skipped", "failed"))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_frontier(path: Optional[str] = CRAWL_FRONTIER_PATH) -> CrawlFrontier:
+    """Open the persistent frontier at `path`, falling back to an in-memory one (no resume)."""
+    if path:
+        try:
+            return CrawlFrontier(path)
+        except sqlite3.Error as e:
+            logging.warning(f"Crawl frontier at {path} unavailable, crawling without checkpoints: {e}")
+    return CrawlFrontier(":memory:")
@@ -0,0 +1,147 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from typing import Callable, List, Optional
+
+import numpy as np
+
+# --- Configuration ---
+EMBEDDING_CACHE_PATH = "embedding_cache.sqlite"  # shared by scrape_website.py and chat_app.py
+EMBEDDING_CACHE_MAX_ENTRIES = 200_000  # ~1.2 GB of 1536-dim float32 vectors at most
+
+
+def model_key(model: str, dimensions: Optional[int] = None) -> str:
+    """Cache key for the vectors of `model`, shortened to `dimensions` if given."""
+    return model if dimensions is None else f"{model}@{dimensions}"
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Size-bounded, on-disk LRU cache of embedding vectors keyed by (model, sha256(text)).
+
+    Vectors are stored as raw float32 blobs in SQLite, so the same file can be
+    shared between the indexer and the chat app. `hits` and `misses` count
+    lookups since the cache was opened.
+
+    The number of rows is counted once on open and then kept up to date from
+    this process's inserts; only when that says `max_entries` is exceeded is
+    the table counted again (other processes may have written to it) and the
+    least recently used entries evicted.
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " text_hash TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (model, text_hash))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        (self._size,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Return the cached vector for each text, or None where it is not cached."""
+        hashes = [_text_hash(t) for t in texts]
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit.
+            for i in range(0, len(hashes), 500):
+                batch = hashes[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *batch],
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model, h) for h in found],
+                )
+            self.hits += sum(1 for h in hashes if h in found)
+            self.misses += sum(1 for h in hashes if h not in found)
+        return [np.frombuffer(found[h], dtype=np.float32).tolist() if h in found else None for h in hashes]
+
+    def put_many(self, model: str, texts: List[str], vectors: List[List[float]]):
+        """Store vectors for `texts`, evicting least recently used entries beyond `max_entries`."""
+        if not texts:
+            return
+        now = time.time()
+        rows = [
+            (model, _text_hash(t), np.asarray(v, dtype=np.float32).tobytes(), now)
+            for t, v in zip(texts, vectors)
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            inserted = self._conn.executemany("INSERT OR IGNORE INTO embeddings VALUES (?, ?, ?, ?)", rows).rowcount
+            if inserted < len(rows):  # some texts were cached already: refresh them
+                self._conn.executemany(
+                    "UPDATE embeddings SET vector = ?, last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(vector, last_used, m, h) for m, h, vector, last_used in rows],
+                )
+            self._size += inserted
+            if self._size > self.max_entries:
+                (self._size,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+                if self._size > self.max_entries:
+                    self._conn.execute(
+                        "DELETE FROM embeddings WHERE rowid IN "
+                        "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                        (self._size - self.max_entries,),
+                    )
+                    self._size = self.max_entries
+            self._conn.execute("COMMIT")
+
+    def embed(self, model: str, texts: List[str],
+              embed_fn: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        """Return vectors for `texts`, calling `embed_fn` only for texts that are not cached.
+
+        If `embed_fn` returns fewer vectors than requested, the result is cut
+        short at the first text that could not be embedded.
+        """
+        vectors = self.get_many(model, texts)
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            # Embed each distinct missing text once.
+            unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+            new_vectors = embed_fn(unique_texts)
+            self.put_many(model, unique_texts[:len(new_vectors)], new_vectors)
+            by_text = dict(zip(unique_texts, new_vectors))
+            for i in missing:
+                vectors[i] = by_text.get(texts[i])
+        if None in vectors:
+            vectors = vectors[:vectors.index(None)]
+        return vectors
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        hit_rate = self.hits / total if total else 0.0
+        return f"{self.hits} hits, {self.misses} misses ({hit_rate:.0%} hit rate)"
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_cache(path: str = EMBEDDING_CACHE_PATH) -> Optional[EmbeddingCache]:
+    """Open the shared embedding cache, or return None (caching disabled) if it cannot be opened."""
+    try:
+        return EmbeddingCache(path)
+    except sqlite3.Error as e:
+        logging.warning(f"Embedding cache at {path} unavailable, embeddings will not be cached: {e}")
+        return None
@@ -0,0 +1,194 @@
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import openai
+
+# --- Configuration ---
+EMBED_MAX_INPUTS_PER_REQUEST = 2048  # OpenAI embeddings limit on inputs per request
+EMBED_MAX_TOKENS_PER_REQUEST = 300_000  # OpenAI embeddings limit on total tokens per request
+EMBED_MAX_RETRIES = 6
+
+
+class _AdaptiveLimit:
+    """Concurrency limit that shrinks on rate limiting and slowly grows back (AIMD)."""
+
+    def __init__(self, maximum: int):
+        self.maximum = max(1, maximum)
+        self.limit = self.maximum
+        self._in_use = 0
+        self._successes = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self._in_use >= self.limit:
+                self._cond.wait()
+            self._in_use += 1
+
+    def release(self):
+        with self._cond:
+            self._in_use -= 1
+            self._cond.notify_all()
+
+    def on_success(self, remaining_requests: Optional[int] = None):
+        with self._cond:
+            if remaining_requests is not None and remaining_requests < self.limit:
+                self.limit = max(1, remaining_requests)
+                return
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < self.maximum:
+                self.limit += 1
+                self._successes = 0
+                self._cond.notify_all()
+
+    def on_rate_limited(self):
+        with self._cond:
+            self.limit = max(1, self.limit // 2)
+            self._successes = 0
+
+
+def _header_int(headers, name: str) -> Optional[int]:
+    try:
+        return int(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+def _retry_reason(error: openai.APIError) -> str:
+    """Label of a retried request error for the `retries` counts."""
+    if isinstance(error, openai.RateLimitError):
+        return "rate_limited"
+    if isinstance(error, openai.APITimeoutError):
+        return "timeout"
+    if isinstance(error, openai.APIConnectionError):
+        return "connection"
+    return "server_error"
+
+
+def _retry_after(headers) -> Optional[float]:
+    """Seconds to wait according to Retry-After / retry-after-ms, if the server sent them."""
+    if headers is None:
+        return None
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        try:
+            return float(headers.get(name)) * scale
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+class EmbeddingExecutor:
+    """Embeds texts with token-packed batches sent concurrently, backing off on rate limits.
+
+    Batches are packed up to `max_tokens` (counted with `encoding`) and
+    `max_inputs` texts per request. Up to `concurrency` requests run at once;
+    429 responses halve the concurrency and wait for Retry-After (or an
+    exponential backoff), and the `x-ratelimit-remaining-requests` header caps
+    it proactively. Output order always matches the input order.
+
+    `dimensions` asks text-embedding-3 models for shortened vectors.
+
+    `retry_counts()` reports the failed requests that were retried by reason
+    ("rate_limited", "timeout", "connection" or "server_error").
+    """
+
+    def __init__(self, client: openai.OpenAI, model: str, encoding, concurrency: int = 4,
+                 max_tokens: int = EMBED_MAX_TOKENS_PER_REQUEST, max_inputs: int = EMBED_MAX_INPUTS_PER_REQUEST,
+                 max_retries: int = EMBED_MAX_RETRIES, dimensions: Optional[int] = None):
+        # We handle retries ourselves so rate limits feed back into the concurrency limit.
+        self.client = client.with_options(max_retries=0)
+        self.model = model
+        self.encoding = encoding
+        self.max_tokens = max_tokens
+        self.max_inputs = max_inputs
+        self.max_retries = max_retries
+        self.dimensions = dimensions
+        self._options = {"dimensions": dimensions} if dimensions else {}
+        self._limit = _AdaptiveLimit(concurrency)
+        self._pool = ThreadPoolExecutor(max_workers=self._limit.maximum, thread_name_prefix="embed")
+        self._stats_lock = threading.Lock()
+        self.requests_sent = 0
+        self.rate_limited = 0
+        self._retries = Counter()
+        self.tokens_embedded = 0  # as reported by the API
+
+    def retry_counts(self) -> Dict[str, int]:
+        """Retried requests so far by reason."""
+        with self._stats_lock:
+            return dict(self._retries)
+
+    def pack_batches(self, texts: List[str]) -> List[List[int]]:
+        """Group text indices into batches that respect the per-request token and input limits."""
+        batches, current, current_tokens = [], [], 0
+        token_counts = [len(tokens) for tokens in self.encoding.encode_batch(texts, disallowed_special=())]
+        for i, n_tokens in enumerate(token_counts):
+            if current and (current_tokens + n_tokens > self.max_tokens or len(current) >= self.max_inputs):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += n_tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _embed_batch(self, batch_texts: List[str]) -> List[List[float]]:
+        for attempt in range(self.max_retries + 1):
+            self._limit.acquire()
+            try:
+                with self._stats_lock:
+                    self.requests_sent += 1
+                raw = self.client.embeddings.with_raw_response.create(model=self.model, input=batch_texts,
+                                                                      **self._options)
+            except (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError) as e:
+                headers = getattr(getattr(e, "response", None), "headers", None)
+                if isinstance(e, openai.RateLimitError):
+                    with self._stats_lock:
+                        self.rate_limited += 1
+                    self._limit.on_rate_limited()
+                if attempt == self.max_retries:
+                    raise
+                with self._stats_lock:
+                    self._retries[_retry_reason(e)] += 1
+                delay = _retry_after(headers) or min(60.0, 2 ** attempt) * (0.5 + random.random() / 2)
+                logging.warning(f"Embedding request failed ({type(e).__name__}), retrying in {delay:.1f}s "
+                                f"with concurrency {self._limit.limit}.")
+            else:
+                self._limit.on_success(_header_int(raw.headers, "x-ratelimit-remaining-requests"))
+                response = raw.parse()
+                if response.usage is not None:
+                    with self._stats_lock:
+                        self.tokens_embedded += response.usage.total_tokens
+                return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+            finally:
+                self._limit.release()
+            time.sleep(delay)
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed `texts`, returning vectors in the same order.
+
+        If a batch ultimately fails, the result is cut short before that batch's
+        first text, matching the contract callers already check for.
+        """
+        if not texts:
+            return []
+        batches = self.pack_batches(texts)
+        futures = [self._pool.submit(self._embed_batch, [texts[i] for i in batch]) for batch in batches]
+        vectors = []
+        for n, (batch, future) in enumerate(zip(batches, futures)):
+            try:
+                vectors.extend(future.result())
+            except Exception as e:
+                logging.error(f"Error embedding batch starting at index {batch[0]}: {e}")
+                for pending in futures[n + 1:]:
+                    pending.cancel()
+                break
+            logging.info(f"Embedded batch {n + 1}/{len(batches)} ({len(batch)} texts)")
+        return vectors
+
+    def close(self):
+        self._pool.shutdown(wait=True)
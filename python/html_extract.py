@@ -0,0 +1,131 @@
+import re
+from html.parser import HTMLParser
+from typing import List, Tuple
+from urllib.parse import urljoin
+
+try:
+    from lxml import etree
+except ImportError:  # lxml is optional; fall back to the stdlib parser
+    etree = None
+
+# Tags whose content is not useful for the RAG model (links inside them are still followed).
+IGNORED_TAGS = frozenset({"script", "style", "nav", "header", "footer", "aside"})
+# Tags that start a new text block (see `extract_blocks`).
+BLOCK_TAGS = frozenset({"address", "article", "blockquote", "br", "dd", "details", "div", "dl", "dt", "figcaption",
+                        "figure", "form", "h1", "h2", "h3", "h4", "h5", "h6", "hr", "li", "main", "ol", "p", "pre",
+                        "section", "summary", "table", "td", "th", "tr", "ul"})
+HTML_PARSER_BACKEND = "auto"  # "auto" (lxml if installed), "lxml" or "html.parser"
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class _PageHandler:
+    """Collects visible text blocks and raw <a href> values in a single pass over parser events.
+
+    Text nodes are grouped into blocks at block-level tag boundaries.
+
+    Works both as an lxml parser target (start/end/data/close) and, via
+    `_StdlibParser`, with the stdlib `html.parser` tokenizer.
+    """
+
+    def __init__(self):
+        self.blocks = []  # lists of stripped text nodes
+        self.hrefs = []
+        self._ignored_depth = 0
+        self._text_node = []
+        self._block_open = False
+
+    def _flush(self):
+        # Parsers may split one text node into several data events (e.g. around entities).
+        if self._text_node:
+            stripped = "".join(self._text_node).strip()
+            if stripped:
+                if not self._block_open:
+                    self.blocks.append([])
+                    self._block_open = True
+                self.blocks[-1].append(stripped)
+            self._text_node = []
+
+    def start(self, tag, attrs):
+        self._flush()
+        tag = tag.lower()
+        if tag in BLOCK_TAGS:
+            self._block_open = False
+        if tag in IGNORED_TAGS:
+            self._ignored_depth += 1
+        elif tag == "a":
+            href = attrs.get("href")
+            if href is not None:  # like BeautifulSoup's href=True, an empty href links to the page itself
+                self.hrefs.append(href)
+
+    def end(self, tag):
+        self._flush()
+        tag = tag.lower()
+        if tag in BLOCK_TAGS:
+            self._block_open = False
+        if tag in IGNORED_TAGS and self._ignored_depth:
+            self._ignored_depth -= 1
+
+    def data(self, data):
+        if not self._ignored_depth:
+            self._text_node.append(data)
+
+    def close(self):
+        self._flush()
+        return self
+
+
+class _StdlibParser(HTMLParser):
+    def __init__(self, handler: _PageHandler):
+        super().__init__(convert_charrefs=True)
+        self.handler = handler
+
+    def handle_starttag(self, tag, attrs):
+        self.handler.start(tag, dict(attrs))
+
+    def handle_endtag(self, tag):
+        self.handler.end(tag)
+
+    def handle_data(self, data):
+        self.handler.data(data)
+
+
+def _resolve_backend(backend: str) -> str:
+    if backend == "auto":
+        return "lxml" if etree is not None else "html.parser"
+    if backend == "lxml" and etree is None:
+        raise ImportError("HTML_PARSER_BACKEND is 'lxml' but lxml is not installed.")
+    return backend
+
+
+def extract_blocks(html: str, page_url: str, backend: str = HTML_PARSER_BACKEND) -> Tuple[List[str], List[str]]:
+    """Return (text_blocks, absolute_links) for a page, parsing the HTML only once.
+
+    Each block is the whitespace-collapsed text between block-level tags, so
+    joining the blocks with single spaces gives `extract_page`'s text.
+    """
+    handler = _PageHandler()
+    if _resolve_backend(backend) == "lxml":
+        parser = etree.HTMLParser(target=handler)
+        parser.feed(html)
+        parser.close()
+    else:
+        parser = _StdlibParser(handler)
+        parser.feed(html)
+        parser.close()
+        handler.close()
+    blocks = [_WHITESPACE.sub(" ", " ".join(parts)) for parts in handler.blocks]
+    links = [urljoin(page_url, href.strip()) for href in handler.hrefs]
+    return blocks, links
+
+
+def extract_page(html: str, page_url: str, backend: str = HTML_PARSER_BACKEND) -> Tuple[str, List[str]]:
+    """Return (clean_text, absolute_links) for a page, parsing the HTML only once.
+
+    Text matches the previous BeautifulSoup-based extraction: script, style,
+    nav, header, footer and aside content is dropped, text nodes are stripped,
+    joined with single spaces and whitespace is collapsed. Links are resolved
+    against `page_url` but not normalized.
+    """
+    blocks, links = extract_blocks(html, page_url, backend)
+    return " ".join(blocks), links
@@ -0,0 +1,220 @@
+import cProfile
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+# --- Configuration ---
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)  # seconds
+
+_enabled = False
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, tuple], float] = {}
+_gauges: Dict[Tuple[str, tuple], float] = {}
+_histograms: Dict[Tuple[str, tuple], list] = {}  # [count per bucket..., +Inf count, sum]
+_collectors = []
+_profiling = False
+
+
+def enable():
+    """Start recording. Until this is called every function here is a no-op."""
+    global _enabled
+    _enabled = True
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def inc(name: str, value: float = 1, **labels):
+    """Add `value` to the counter `name` (by convention ending in `_total`)."""
+    if not _enabled:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name: str, value: float, **labels):
+    if not _enabled:
+        return
+    with _lock:
+        _gauges[(name, tuple(sorted(labels.items())))] = value
+
+
+def observe(name: str, seconds: float, **labels):
+    """Record one duration in the histogram `name`."""
+    if not _enabled:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * (len(DURATION_BUCKETS) + 2)
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if seconds <= bound:
+                histogram[i] += 1
+                break
+        else:
+            histogram[-2] += 1
+        histogram[-1] += seconds
+
+
+class _Span:
+    __slots__ = ("name", "labels", "started")
+
+    def __init__(self, name: str, labels: dict):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str, **labels):
+    """Context manager timing its block into the histogram `<name>_seconds`."""
+    if not _enabled:
+        return _NO_SPAN
+    return _Span(f"{name}_seconds", labels)
+
+
+def register_collector(collect: Callable[[], Iterable[tuple]]):
+    """Export values that are already counted elsewhere (cache hits, retries, ...).
+
+    `collect` is only called when metrics are rendered and returns
+    (name, "counter" | "gauge", value) tuples, optionally followed by a dict
+    of labels.
+    """
+    with _lock:
+        _collectors.append(collect)
+
+
+def _format_labels(labels: tuple, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    with _lock:
+        counters, gauges = dict(_counters), dict(_gauges)
+        histograms = {key: list(value) for key, value in _histograms.items()}
+        collectors = list(_collectors)
+    for collect in collectors:
+        try:
+            for name, kind, value, *labels in collect():
+                key = (name, tuple(sorted(labels[0].items())) if labels else ())
+                (counters if kind == "counter" else gauges)[key] = value
+        except Exception as e:
+            logging.warning(f"Metrics collector {collect} failed: {e}")
+
+    lines, typed = [], set()
+    for kind, values in (("counter", counters), ("gauge", gauges)):
+        for (name, labels), value in sorted(values.items()):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+    for (name, labels), histogram in sorted(histograms.items()):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} histogram")
+        cumulative = 0
+        for bound, count in zip(DURATION_BUCKETS + ("+Inf",), histogram[:-1]):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(labels, (('le', bound),))} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {histogram[-1]}")
+        lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path: str):
+    """Atomically write all metrics to `path` (for node_exporter's textfile collector)."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(render())
+    os.replace(tmp_path, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(port: int, host: str = "0.0.0.0") -> Optional[ThreadingHTTPServer]:
+    """Serve GET /metrics on `port` from a daemon thread; returns None if the port is unavailable."""
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        logging.warning(f"Could not serve metrics on port {port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logging.info(f"Serving Prometheus metrics on http://{host}:{port}/metrics")
+    return server
+
+
+@contextmanager
+def profiled(path: Optional[str]):
+    """Profile the block with cProfile and dump the stats to `path` (`python -m pstats path` to read).
+
+    A no-op without a `path`, or while another block is already being
+    profiled, so concurrent requests do not end up in one dump.
+    """
+    global _profiling
+    with _lock:
+        if not path or _profiling:
+            path = None
+        else:
+            _profiling = True
+    if path is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        with _lock:
+            _profiling = False
+        try:
+            profiler.dump_stats(path)
+            logging.info(f"Wrote profile to {path}")
+        except OSError as e:
+            logging.warning(f"Could not write profile to {path}: {e}")
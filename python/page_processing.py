@@ -0,0 +1,70 @@
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+from chunking import chunk_with_offsets
+from content_filter import strip_boilerplate
+from html_extract import extract_blocks
+
+# Workers are started from a process that already runs crawl and client threads; forking
+# it could copy a lock held by one of them. A forkserver (spawn where there is none)
+# starts them from a clean single-threaded process instead.
+_MP_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+class ProcessedPage(NamedTuple):
+    text: str
+    links: List[str]
+    chunks: List[Tuple[str, int, int]]
+    block_hashes: List[str]  # for boilerplate learning (see content_filter.py)
+    boilerplate_blocks: int
+    boilerplate_chars: int
+
+
+def process_page(html: bytes, encoding: Optional[str], page_url: str, chunk_size: int, chunk_overlap: int,
+                 snap: bool = False, boilerplate: frozenset = frozenset()) -> ProcessedPage:
+    """Parse raw page bytes, drop `boilerplate` blocks and chunk the remaining text.
+
+    `chunks` holds (chunk_text, start, end) tuples as produced by `chunk_with_offsets`.
+
+    Top-level and side-effect free so it can run in a worker process.
+    """
+    html_text = html.decode(encoding or "utf-8", errors="replace")
+    blocks, links = extract_blocks(html_text, page_url)
+    text_content, block_hashes, dropped, dropped_chars = strip_boilerplate(blocks, boilerplate)
+    chunks = chunk_with_offsets(text_content, chunk_size, chunk_overlap, snap) if text_content else []
+    return ProcessedPage(text_content, links, chunks, block_hashes, dropped, dropped_chars)
+
+
+class PageProcessor:
+    """Runs `process_page` inline (`workers=0`) or in a pool of worker processes.
+
+    Calls are blocking and thread-safe, so crawl threads can hand pages to the
+    pool and keep the CPU-bound parsing and tokenization off the GIL.
+    """
+
+    def __init__(self, workers: int, chunk_size: int, chunk_overlap: int, snap: bool = False,
+                 initializer: Optional[Callable] = None, initargs: tuple = ()):
+        self.workers = max(0, workers)
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.snap = snap
+        # `initializer(*initargs)` runs once in each worker process, as in ProcessPoolExecutor.
+        self._pool = (ProcessPoolExecutor(max_workers=self.workers,
+                                          mp_context=multiprocessing.get_context(_MP_START_METHOD),
+                                          initializer=initializer, initargs=initargs)
+                      if self.workers else None)
+        if self._pool:
+            logging.info(f"Parsing and chunking pages in {self.workers} worker processes.")
+
+    def __call__(self, html: bytes, encoding: Optional[str], page_url: str,
+                 boilerplate: frozenset = frozenset()) -> ProcessedPage:
+        args = (html, encoding, page_url, self.chunk_size, self.chunk_overlap, self.snap, boilerplate)
+        if self._pool is None:
+            return process_page(*args)
+        return self._pool.submit(process_page, *args).result()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
@@ -0,0 +1,116 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+Answer = Tuple[str, List[str]]
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation so trivial variants share a cache entry."""
+    return re.sub(r"\s+", " ", query).strip().lower().rstrip("?!. ")
+
+
+class QueryCache:
+    """Two-tier cache of (answer, sources) for the chat app.
+
+    Tier 1 is an exact match on the normalized query text. Tier 2 reuses the
+    answer of a previous query whose embedding has cosine similarity of at
+    least `threshold` with the new one. Entries expire after `ttl` seconds,
+    the least recently used entry is evicted beyond `max_entries`, and
+    everything is dropped when the index version file written by the indexer
+    changes. Answers are only reused within the same `scope` (the site a
+    question was asked about).
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 3600, threshold: float = 0.95,
+                 version_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.version_path = version_path
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (scope, normalized query) -> (expires_at, unit vector, answer)
+        self._matrices = {}  # scope -> (keys, stacked unit vectors), rebuilt lazily after changes
+        self._version = self._read_version()
+
+    def _read_version(self) -> Optional[float]:
+        if not self.version_path:
+            return None
+        try:
+            return os.stat(self.version_path).st_mtime
+        except OSError:
+            return None
+
+    def _check_version(self):
+        version = self._read_version()
+        if version != self._version:
+            self._version = version
+            self._entries.clear()
+            self._matrices = {}
+
+    def _expire(self):
+        now = time.monotonic()
+        expired = [key for key, (expires_at, _, _) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrices = {}
+
+    def get_exact(self, normalized_query: str, scope: Optional[str] = None) -> Optional[Answer]:
+        key = (scope, normalized_query)
+        with self._lock:
+            self._check_version()
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry[2]
+
+    def get_similar(self, vector: List[float], scope: Optional[str] = None) -> Optional[Answer]:
+        """Return the answer for the most similar cached query above the threshold; counts a miss otherwise."""
+        query = np.asarray(vector, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        with self._lock:
+            self._expire()
+            if not self._entries:
+                self.misses += 1
+                return None
+            if scope not in self._matrices:
+                keys = [key for key in self._entries if key[0] == scope]
+                self._matrices[scope] = keys, np.stack([self._entries[key][1] for key in keys]) if keys else None
+            keys, matrix = self._matrices[scope]
+            if not keys:
+                self.misses += 1
+                return None
+            scores = matrix @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            key = keys[best]
+            self._entries.move_to_end(key)
+            self.semantic_hits += 1
+            return self._entries[key][2]
+
+    def put(self, normalized_query: str, vector: List[float], answer: Answer, scope: Optional[str] = None):
+        unit = np.asarray(vector, dtype=np.float32)
+        unit /= np.linalg.norm(unit) or 1.0
+        key = (scope, normalized_query)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, unit, answer)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrices = {}
+
+    def stats(self) -> str:
+        return f"{self.exact_hits} exact hits, {self.semantic_hits} semantic hits, {self.misses} misses"
@@ -1,33 +1,73 @@
+import hashlib
+import json
 import logging
 import os
-import re
 import uuid
 import time
+import threading
 from collections import deque
-from typing import List, Tuple
-from urllib.parse import urljoin, urlparse
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
+from queue import Empty, Full, Queue
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union
+from urllib.parse import urljoin, urlparse, urlunparse
 
 import requests
-from bs4 import BeautifulSoup
-import numpy as np
-import qdrant_client
-from qdrant_client.http.models import Distance, VectorParams
-from openai import OpenAI
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
-import tiktoken
 
-# --- Configuration ---
-# Load environment variables from .env file
-load_dotenv()
+from bm25_index import BM25Index
+from chunking import chunk_text, chunk_with_offsets, get_encoding
+from content_filter import ContentFilter, page_fingerprint, strip_boilerplate
+from crawl_frontier import CRAWL_FRONTIER_PATH, CrawlFrontier, open_frontier, parse_sitemap
+from embedding_cache import EmbeddingCache, model_key, open_cache
+from embedding_executor import EmbeddingExecutor
+from html_extract import extract_blocks
+import metrics
+from page_processing import PageProcessor
+from sites import SITES_CONFIG_PATH, Site, load_sites, site_collection, site_name, site_path
+from vector_store import open_store
 
+# --- Configuration ---
 # These can be overridden with environment variables for quick tuning.
 MAX_PAGES = 50  # crawl limit per website
 CHUNK_SIZE = 800  # in tokens (approx.)
 CHUNK_OVERLAP = 40 # overlap between chunks
-COLLECTION_NAME = "docs"
+CHUNK_SNAP_TO_SENTENCES = True  # end chunks on a sentence break when one is close to the token limit
+COLLECTION_NAME = "docs"  # Qdrant alias (or local index) searched by chat_app.py; "docs_<site>" per site with SITE_COLLECTIONS "per_site"
 QDRANT_URL = "http://localhost:6333"
 EMBED_MODEL = "text-embedding-3-small"
-SITE_TO_INDEX = "https://ruter.no"
+EMBED_DIMENSIONS = None  # shortened text-embedding-3 vectors (e.g. 512 or 256) instead of the full 1536; must match chat_app.py
+SITE_TO_INDEX = "https://ruter.no"  # indexed when there is no SITES_CONFIG_PATH file listing the sites (see sites.py)
+SITE_COLLECTIONS = "shared"  # "shared" (one collection, searched with a "site" payload filter) or "per_site"; must match chat_app.py
+PARALLEL_SITES = 4  # sites crawled and indexed at the same time
+MAX_CONCURRENT_FETCHES = 16  # page fetches in flight across all sites
+CRAWL_CONCURRENCY = 8  # max pages fetched in parallel per site (1 = sequential crawl)
+CRAWL_DELAY = 0.1  # politeness delay in seconds between requests to the same host
+USE_SITEMAPS = True  # seed the crawl with the URLs in the site's robots.txt sitemaps (newest lastmod first)
+REQUEST_TIMEOUT = 10  # seconds
+PARSE_WORKERS = 0  # worker processes for parsing + chunking pages while indexing (0 = in the crawl threads)
+BATCH_SIZE_EMBEDDING = 1000  # chunks handed to the embedding executor at once in streaming mode
+EMBED_CONCURRENCY = 4  # embedding requests in flight across all sites; reduced automatically on rate limiting
+BATCH_SIZE_QDRANT = 100  # points per Qdrant upsert
+INCREMENTAL_INDEXING = True  # only re-embed new/changed chunks; False rebuilds the indexed sites
+INDEX_STATE_PATH = "index_state.json"  # per-page ETag/Last-Modified and chunk IDs from the last run (one file per site)
+INDEX_VERSION_PATH = "index_version"  # rewritten after every run that changed the collection (see chat_app.py)
+USE_EMBEDDING_CACHE = True  # reuse vectors from embedding_cache.sqlite instead of re-calling the API
+STREAMING_INDEXING = True  # overlap scrape/chunk/embed/upsert instead of running them one after another
+PIPELINE_QUEUE_SIZE = 1000  # max chunks buffered between the crawl and embedding stages
+UPSERT_WORKERS = 2  # concurrent Qdrant upsert threads in streaming mode
+VECTOR_STORE_BACKEND = "qdrant"  # "qdrant" (server at QDRANT_URL) or "local" (memory-mapped NumPy index, see vector_store.py)
+LOCAL_INDEX_DIR = "local_index"  # where the "local" backend keeps its files
+DEDUPLICATE_PAGES = True  # skip duplicate pages and drop site-wide boilerplate blocks while crawling
+NEAR_DUPLICATE_MAX_DISTANCE = 6  # SimHash bits (of 64) within which a page counts as a near duplicate
+BOILERPLATE_MIN_PAGES = 5  # a text block must appear on at least this many pages ...
+BOILERPLATE_MIN_FRACTION = 0.3  # ... and on this share of the pages parsed so far to count as boilerplate
+BM25_INDEX_PATH = "bm25_index.npz"  # keyword index over the same chunks for hybrid search in chat_app.py (None = off; one per collection)
+VECTOR_QUANTIZATION = None  # None (float32), "int8" (Qdrant scalar or local), "pq" (Qdrant product) or "float16" (local only)
+QUANTIZATION_OVERSAMPLING = 2.0  # quantized candidates per result that are rescored with the full vectors
+METRICS_ENABLED = False  # time each indexing stage and count bytes, tokens, chunks and retries (see metrics.py)
+METRICS_TEXTFILE_PATH = "indexer_metrics.prom"  # written after each run when METRICS_ENABLED (node_exporter textfile format)
+PROFILE_PATH = None  # write a cProfile dump of each indexing run here (debugging only)
 
 # Setup basic logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -35,363 +75,957 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # --- Utility Functions ---
 def _normalize_url(url: str) -> str:
     """Normalize URL by removing fragments and query parameters, adding trailing slash for directories."""
-    # TODO: Implement URL normalization to ensure consistency.
-    #       This helps in avoiding duplicate processing of URLs that point to the same content.
-    #       Useful functions: `from urllib.parse import urlparse, urlunparse` (ensure this import is at the top of the file)
-    #       Also, `import os` might be needed for `os.path.splitext`.
-    # 1. Parse the URL using `parsed_url = urlparse(url)`.
-    #    This breaks the URL into components: scheme, netloc, path, params, query, fragment.
-    # 2. Create a new path ensuring it has a trailing slash if it doesn't point to a specific file (heuristic: no extension).
-    #    `path = parsed_url.path`
-    #    `if path and not os.path.splitext(path)[1] and not path.endswith('/'):`
-    #    `    path += '/'`
-    # 3. Reconstruct the URL without the fragment and query, and with the potentially modified path.
-    #    `normalized_uri_tuple = parsed_url._replace(path=path, query='', fragment='')`
-    # 4. Convert the named tuple back to a URL string: `final_url = urlunparse(normalized_uri_tuple)`.
-    # 5. Return the `final_url`.
-    return "" # Placeholder: Replace with your implementation
-
-def scrape_site(base_url: str, max_pages: int = MAX_PAGES) -> List[Tuple[str, str]]:
-    """Scrape a website and return list of (url, text_content) tuples."""
-    logging.info(f"Starting to scrape {base_url}, up to {max_pages} pages.")
-    
-    # TODO: Implement website scraping
-    # 1. Initialize session, seen URLs set, result list, and queue
-    # 2. Get domain from base URL for filtering
-    # 3. Create extract_text function using BeautifulSoup:
-    #    - Remove unwanted tags (script, style, nav, header, footer, etc.)
-    #    - Extract clean text content
-    #    - Clean up whitespace
-    # 4. Implement main scraping loop:
-    #    - Process URLs from queue while under max_pages limit
-    #    - Skip already visited URLs and external domains
-    #    - Fetch page content with proper error handling
-    #    - Extract text and add to results if not empty
-    #    - Find and enqueue internal links
-    
+    parsed_url = urlparse(url)
+    if parsed_url.scheme not in ("http", "https") or not parsed_url.netloc:
+        return ""
+    path = parsed_url.path
+    if path and not os.path.splitext(path)[1] and not path.endswith('/'):
+        path += '/'
+    normalized_uri_tuple = parsed_url._replace(path=path, query='', fragment='')
+    return urlunparse(normalized_uri_tuple)
+
+class _HostThrottle:
+    """Enforces a minimum delay between requests to the same host across threads."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._next_slot = {}
+
+    def wait(self, host: str):
+        if self.delay <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.delay
+        if slot > now:
+            time.sleep(slot - now)
+
+_fetch_slots = threading.BoundedSemaphore(MAX_CONCURRENT_FETCHES)  # shared by the crawls of all sites
+
+class _Gone:
+    """Type of `_GONE`, the `_fetch_page` result for a page the server says no longer exists."""
+
+_GONE = _Gone()
+
+def _make_session(pool_size: int) -> requests.Session:
+    """Create a session whose per-host connection pool fits `pool_size` parallel requests."""
     session = requests.Session()
-    seen, result = set(), []
-    queue = deque([base_url])
-    domain = urlparse(base_url).netloc
-    pages_processed = 0
-
-    def extract_text(html: str) -> str:
-        """Extract clean text from HTML using BeautifulSoup."""
-        # TODO: Implement text extraction using BeautifulSoup.
-        #       The goal is to get meaningful text content for the RAG model, excluding irrelevant parts.
-        #       Make sure you have `from bs4 import BeautifulSoup` (at the top of the file).
-        #       You might also need `import re` for advanced whitespace cleanup.
-        # 1. Create a BeautifulSoup object to parse the HTML:
-        #    `soup = BeautifulSoup(html, 'html.parser')`
-        # 2. Remove unwanted HTML tags that usually don't contain main content.
-        #    Common tags to remove: <script>, <style>, <nav>, <header>, <footer>, <aside>.
-        #    Example for removing all 'script' and 'style' tags:
-        #    `for RAG_ignore_tag in soup(['script', 'style', 'nav', 'header', 'footer', 'aside']):`
-        #    `    RAG_ignore_tag.decompose()` # .decompose() removes the tag and its content.
-        # 3. Get all text from the modified soup. `soup.get_text()` is useful here.
-        #    - `separator=' '` helps ensure spaces between text from different tags.
-        #    - `strip=True` removes leading/trailing whitespace from individual text pieces.
-        #    `text = soup.get_text(separator=' ', strip=True)`
-        # 4. Optional: Further clean the text by removing excessive newlines or multiple spaces.
-        #    `text = re.sub(r'\s+', ' ', text).strip()` (requires `import re`)
-        # 5. Return the cleaned text string.
-        return "" # Placeholder: Replace with your implementation
-
-    while queue and len(result) < max_pages:
-        url = queue.popleft()
-        # Ensure URL is normalized *before* adding to seen set and processing. This avoids duplicate work.
-        normalized_url = _normalize_url(url)
-        
-        # TODO: Implement URL filtering and page processing logic.
-        # This is the core of the scraper. Follow these steps carefully.
-        # 0. Basic check: if `normalized_url` is empty or invalid, `continue`.
-        #    `if not normalized_url: continue`
-        # 1. Skip if `normalized_url` is already in the `seen` set (we've processed or queued it).
-        #    `if normalized_url in seen: continue`
-        # 2. Add `normalized_url` to the `seen` set to mark it as processed/queued.
-        #    `seen.add(normalized_url)`
-        # 3. Skip if the URL's domain is different from the `base_url`'s domain (to stay on the same site).
-        #    `if urlparse(normalized_url).netloc != domain: continue` (ensure `from urllib.parse import urlparse` is imported)
-        # 4. Fetch page content using the `session` object.
-        #    - Use `session.get(url, timeout=10)` (10-second timeout).
-        #    - Wrap this in a `try-except requests.RequestException` block to handle network errors, timeouts, etc.
-        #    - If an error occurs, log a warning (`logging.warning(...)`) and `continue` to the next URL.
-        #    - After a successful request, check `response.raise_for_status()` to catch HTTP errors (4xx, 5xx). Also in try-except.
-        #    `try:`
-        #    `    response = session.get(url, timeout=10)`
-        #    `    response.raise_for_status() # Raises HTTPError for bad responses (4XX or 5XX)`
-        #    `except requests.RequestException as e:`
-        #    `    logging.warning(f"Failed to fetch {url}: {e}")`
-        #    `    continue`
-        # 5. Ensure the content type is HTML before trying to parse it.
-        #    `content_type = response.headers.get('Content-Type', '')`
-        #    `if 'text/html' not in content_type: continue`
-        # 6. Extract text from `response.text` (the HTML content) using the `extract_text()` function you defined above.
-        #    `text_content = extract_text(response.text)`
-        # 7. If extracted `text_content` is not empty (i.e., `if text_content:`), add the tuple `(normalized_url, text_content)` to the `result` list.
-        # 8. Parse the fetched HTML (`response.text`) with BeautifulSoup again (or use the soup from `extract_text` if structured that way) to find all links.
-        #    `page_soup = BeautifulSoup(response.text, 'html.parser')`
-        # 9. Find all anchor (`<a>`) tags that have an `href` attribute.
-        #    `for link_tag in page_soup.find_all('a', href=True):`
-        #10. For each found link:
-        #    a. Get the raw `href` value: `href = link_tag['href']`
-        #    b. Construct an absolute URL from `base_url` and `href`: `absolute_link = urljoin(base_url, href)`. (ensure `from urllib.parse import urljoin` is imported)
-        #    c. Normalize this `absolute_link` using `_normalize_url()`. Let's call it `normalized_absolute_link`.
-        #    d. Check if this `normalized_absolute_link` should be added to the queue:
-        #       - Its domain must match the original `domain` (`urlparse(normalized_absolute_link).netloc == domain`).
-        #       - It must NOT already be in the `seen` set.
-        #       - If both conditions are true, add `normalized_absolute_link` to the `queue`.
-        #11. Increment `pages_processed` counter (already exists below this comment block in the template).
-        
-        if normalized_url in seen: # Example for step 1
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def _fetch_page(session: requests.Session, url: str, throttle: _HostThrottle,
+                known: Optional[dict] = None, processor: Optional[PageProcessor] = None,
+                content_filter: Optional[ContentFilter] = None
+                ) -> Union[Tuple[Optional[str], List[str], dict, Optional[list]], _Gone, None]:
+    """Fetch one page and return (text_content, links, validators, chunks).
+
+    Returns `_GONE` if the page definitely no longer exists (404/410) or is no
+    longer HTML, and None if it could not be fetched this time (timeouts,
+    connection errors, other error statuses).
+
+    If `known` holds the ETag/Last-Modified from a previous crawl, a conditional GET
+    is sent; on 304 Not Modified `text_content` is None and the stored links are reused.
+    With a `processor` the raw page bytes are parsed and chunked by it (possibly in
+    a worker process); otherwise the page is only parsed and `chunks` is None.
+    With a `content_filter`, known boilerplate blocks are dropped before chunking,
+    the page's blocks are reported to it and its fingerprint is added to the validators.
+    """
+    headers = {}
+    if known:
+        if known.get("etag"):
+            headers["If-None-Match"] = known["etag"]
+        if known.get("last_modified"):
+            headers["If-Modified-Since"] = known["last_modified"]
+
+    throttle.wait(urlparse(url).netloc)
+    try:
+        with _fetch_slots, metrics.span("indexer_fetch"):
+            response = session.get(url, timeout=REQUEST_TIMEOUT, headers=headers)
+        response.raise_for_status() # Raises HTTPError for bad responses (4XX or 5XX)
+    except requests.RequestException as e:
+        logging.warning(f"Failed to fetch {url}: {e}")
+        metrics.inc("indexer_fetch_errors_total")
+        status = e.response.status_code if e.response is not None else None
+        return _GONE if status in (404, 410) else None
+    metrics.inc("indexer_fetched_pages_total", status=response.status_code)
+    metrics.inc("indexer_fetched_bytes_total", len(response.content))
+
+    if response.status_code == 304 and known:
+        return None if known.get("links") is None else (None, known["links"], known, None)
+
+    content_type = response.headers.get('Content-Type', '')
+    if 'text/html' not in content_type:
+        return _GONE
+
+    # Text and links come from a single parse of the page.
+    boilerplate = content_filter.boilerplate if content_filter is not None else frozenset()
+    with metrics.span("indexer_parse"):  # includes chunking with a processor
+        if processor is not None:
+            text_content, raw_links, chunks, block_hashes, dropped, dropped_chars = processor(
+                response.content, response.encoding, response.url, boilerplate)
+        else:
+            blocks, raw_links = extract_blocks(response.text, response.url)
+            text_content, block_hashes, dropped, dropped_chars = strip_boilerplate(blocks, boilerplate)
+            chunks = None
+    links = [link for link in map(_normalize_url, raw_links) if link]
+    validators = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "links": links,
+    }
+    if content_filter is not None:
+        content_filter.observe(block_hashes, dropped, dropped_chars)
+        if text_content:
+            validators["content_hash"], validators["simhash"] = page_fingerprint(text_content)
+    return text_content, links, validators, chunks
+
+def _new_content_filter(known_boilerplate=()) -> ContentFilter:
+    return ContentFilter(NEAR_DUPLICATE_MAX_DISTANCE, BOILERPLATE_MIN_PAGES, BOILERPLATE_MIN_FRACTION,
+                         known_boilerplate)
+
+def _sitemap_urls(session: requests.Session, base_url: str, max_sitemaps: int = 50) -> List[Tuple[str, Optional[float]]]:
+    """Collect (page_url, lastmod) from the sitemaps listed in robots.txt, or /sitemap.xml if there are none."""
+    robots_url = urljoin(base_url, "/robots.txt")
+    sitemaps = []
+    try:
+        response = session.get(robots_url, timeout=REQUEST_TIMEOUT)
+        if response.ok:
+            sitemaps = [line.split(":", 1)[1].strip() for line in response.text.splitlines()
+                        if line.lower().startswith("sitemap:")]
+    except requests.RequestException as e:
+        logging.warning(f"Failed to fetch {robots_url}: {e}")
+    pending = deque(sitemaps or [urljoin(base_url, "/sitemap.xml")])
+    fetched, pages = set(), []
+    while pending and len(fetched) < max_sitemaps:
+        sitemap_url = pending.popleft()
+        if sitemap_url in fetched:
+            continue
+        fetched.add(sitemap_url)
+        try:
+            response = session.get(sitemap_url, timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            logging.info(f"No sitemap at {sitemap_url}: {e}")
             continue
-        # Add the rest of the scraping logic here based on the detailed hints above
-        
-    logging.info(f"Scraping complete. Found {len(result)} pages with text.")
-    return result
-
-def chunk_text(text: str, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[str]:
-    """Split text into overlapping chunks of approximately `size` tokens using tiktoken."""
-    # TODO: Implement token-based text chunking using tiktoken
-    # 1. Import tiktoken: `import tiktoken`
-    # 2. Get the encoding for the model (e.g., cl100k_base for text-embedding-3-small):
-    #    `encoding = tiktoken.get_encoding("cl100k_base")` (or use tiktoken.encoding_for_model(EMBED_MODEL))
-    # 3. Encode the input text into token IDs:
-    #    `tokens = encoding.encode(text)`
-    # 4. If the total number of tokens is less than or equal to `size`, return the original text as a single chunk:
-    #    `if len(tokens) <= size: return [text] if text.strip() else []`
-    # 5. Calculate the step size for chunks, considering the overlap:
-    #    `step = size - overlap`
-    #    `if step <= 0: raise ValueError("Overlap cannot be greater than or equal to chunk size.")`
-    # 6. Create chunks by sliding a window over the token IDs:
-    #    `chunks = []`
-    #    `for i in range(0, len(tokens), step):`
-    #    `    token_chunk = tokens[i:i + size]`
-    #    `    # Ensure the last chunk is not too small or handle as needed, though typically we take what's left.
-    #    `    if not token_chunk: continue`
-    #    `    chunk_text = encoding.decode(token_chunk)`
-    #    `    if chunk_text.strip(): chunks.append(chunk_text.strip())`
-    # 7. Handle potential errors during decoding if any invalid token sequences occur, though `decode` is generally robust.
-    # 8. Return the list of text chunks.
-    
-    # Remove old approximation-based logic
-    # words = text.split()
-    # approx_tokens_per_word = 0.75 
-    
-    # TODO: Implement chunking logic here using tiktoken as per the hints above
-    
-    return []
+        sitemap_pages, children = parse_sitemap(response.content)
+        pages.extend(sitemap_pages)
+        pending.extend(children)
+    logging.info(f"Found {len(pages)} URLs in {len(fetched)} sitemap(s) for {base_url}.")
+    return pages
 
-# --- API Clients Setup ---
-openai_api_key = os.getenv("OPENAI_API_KEY")
-anthropic_api_key = os.getenv("ANTHROPIC_API_KEY")
+def _crawl(base_url: str, max_pages: int = MAX_PAGES, concurrency: int = CRAWL_CONCURRENCY,
+           delay: float = CRAWL_DELAY, page_state: Optional[Dict[str, dict]] = None,
+           unchanged: Optional[List[str]] = None, processor: Optional[PageProcessor] = None,
+           content_filter: Optional[ContentFilter] = None, frontier: Optional[CrawlFrontier] = None
+           ) -> Iterator[Tuple[str, str, Optional[list]]]:
+    """Crawl a website and yield (url, text_content, chunks) tuples as pages arrive.
+
+    `chunks` is only filled in when a `processor` is given (see `_fetch_page`).
+
+    With `concurrency` > 1 up to that many pages are fetched in parallel from a
+    bounded thread pool; `seen`/domain filtering and the `max_pages` cap are
+    applied on the consuming thread, so the output contract is unchanged.
+
+    URLs are queued in a `frontier` (an in-memory one if none is given),
+    seeded with `base_url` and, with USE_SITEMAPS, the site's sitemap URLs.
+    Every finished page is checkpointed there; if the frontier holds an
+    unfinished crawl of `base_url`, its pages are replayed (with `chunks`
+    None) and the crawl continues from the remaining queue. The caller marks
+    the crawl finished once its pages are safely processed.
+
+    When `page_state` is given (url -> validators from a previous crawl) pages are
+    fetched with conditional GETs and `page_state` is updated in place. Pages the
+    server reports as not modified are appended to `unchanged` instead of being
+    yielded, but still count towards `max_pages`. So are previously crawled
+    pages whose fetch fails for any reason but 404/410, so a timeout or a 5xx
+    does not remove a live page from the index; their stored links are followed.
+
+    With a `content_filter`, pages that duplicate an already crawled (or
+    unchanged) page are skipped without counting towards `max_pages`, and
+    site-wide boilerplate is stripped from page text (see `_fetch_page`).
+    """
+    logging.info(f"Starting to scrape {base_url}, up to {max_pages} pages (concurrency={concurrency}).")
+
+    concurrency = max(1, concurrency)
+    session = _make_session(concurrency)
+    throttle = _HostThrottle(delay)
+    frontier = frontier if frontier is not None else CrawlFrontier(":memory:")
+    not_modified = unchanged if unchanged is not None else []
+    domain = urlparse(base_url).netloc
+    pages_processed = pages_with_text = 0
+
+    def same_site(urls) -> List[str]:
+        return [url for url in map(_normalize_url, urls) if url and urlparse(url).netloc == domain]
+
+    if frontier.start(base_url):
+        for url, text_content, validators in frontier.completed_pages():
+            if page_state is not None and validators:
+                page_state[url] = {**page_state.get(url, {}), **validators}
+            if content_filter is not None and validators and validators.get("content_hash"):
+                content_filter.register(url, validators["content_hash"], validators["simhash"])
+            if text_content is None:
+                not_modified.append(url)
+            else:
+                pages_with_text += 1
+                yield url, text_content, None
+        logging.info(f"Resumed crawl of {base_url} from {frontier.path}: {frontier.stats()}.")
+    else:
+        frontier.add((url, 0, None) for url in same_site([base_url]))
+        if USE_SITEMAPS:
+            frontier.add((url, 1, lastmod) for page_url, lastmod in _sitemap_urls(session, base_url)
+                         for url in same_site([page_url]))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        in_flight = {}
+        while True:
+            # Only keep as many fetches in flight as could still be turned into results.
+            while len(in_flight) < concurrency and pages_with_text + len(not_modified) + len(in_flight) < max_pages:
+                item = frontier.pop()
+                if item is None:
+                    break
+                url, depth = item
+                known = page_state.get(url) if page_state is not None else None
+                future = executor.submit(_fetch_page, session, url, throttle, known, processor, content_filter)
+                in_flight[future] = (url, depth)
+            if not in_flight:
+                break
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                url, depth = in_flight.pop(future)
+                page = future.result()
+                pages_processed += 1
+                if page is None and page_state is not None and page_state.get(url, {}).get("links") is not None:
+                    logging.info(f"Keeping the previously indexed version of {url}.")
+                    page = None, page_state[url]["links"], page_state[url], None  # as if not modified
+                if page is None or page is _GONE:
+                    frontier.mark(url, "failed")
+                    continue
+                text_content, links, validators, chunks = page
+                frontier.add((link, depth + 1, None) for link in same_site(links))
+                if pages_with_text + len(not_modified) >= max_pages:
+                    frontier.mark(url, "queued")
+                    continue
+                if text_content is None:
+                    not_modified.append(url)
+                    frontier.complete(url, None, validators)
+                    if content_filter is not None and validators.get("content_hash"):
+                        content_filter.register(url, validators["content_hash"], validators["simhash"])
+                elif text_content:
+                    if content_filter is not None:
+                        duplicate = content_filter.check(url, validators["content_hash"], validators["simhash"])
+                        if duplicate is not None:
+                            logging.info(f"Skipping {url}: {duplicate[0]} duplicate of {duplicate[1]}")
+                            metrics.inc("indexer_duplicate_pages_total", kind=duplicate[0])
+                            frontier.mark(url, "skipped")
+                            continue
+                    pages_with_text += 1
+                    frontier.complete(url, text_content, validators)
+                    if page_state is not None:
+                        page_state[url] = {**page_state.get(url, {}), **validators}
+                    yield url, text_content, chunks
+                else:
+                    frontier.mark(url, "skipped")
+
+    logging.info(f"Scraping complete. Processed {pages_processed} URLs, found {pages_with_text} pages with text"
+                 f" and {len(not_modified)} unchanged pages.")
+    if content_filter is not None:
+        logging.info(f"Content filter: {content_filter.stats()}")
+
+def iter_site(base_url: str, max_pages: int = MAX_PAGES, concurrency: int = CRAWL_CONCURRENCY,
+              delay: float = CRAWL_DELAY, page_state: Optional[Dict[str, dict]] = None,
+              unchanged: Optional[List[str]] = None) -> Iterator[Tuple[str, str]]:
+    """Crawl a website and yield (url, text_content) tuples as pages arrive. See `_crawl`."""
+    content_filter = _new_content_filter() if DEDUPLICATE_PAGES else None
+    for url, text_content, _ in _crawl(base_url, max_pages, concurrency, delay, page_state, unchanged,
+                                       content_filter=content_filter):
+        yield url, text_content
+
+def scrape_site(base_url: str, max_pages: int = MAX_PAGES, concurrency: int = CRAWL_CONCURRENCY,
+                delay: float = CRAWL_DELAY, page_state: Optional[Dict[str, dict]] = None,
+                unchanged: Optional[List[str]] = None) -> List[Tuple[str, str]]:
+    """Scrape a website and return list of (url, text_content) tuples. See `iter_site`."""
+    return list(iter_site(base_url, max_pages, concurrency, delay, page_state, unchanged))
+
+def _chunk_hash(chunk: str) -> str:
+    return hashlib.sha256(chunk.encode("utf-8")).hexdigest()
 
-if not openai_api_key:
-    logging.error("OPENAI_API_KEY environment variable not found. Please set it in your .env file.")
-    exit(1)
+def _point_id(site: str, url: str, chunk_hash: str) -> str:
+    """Deterministic Qdrant point ID for a chunk, derived from its site, URL and content hash."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{site}:{url}#{chunk_hash}"))
+
+def _vector_config() -> dict:
+    """Settings that change the stored vectors; a run with different ones rebuilds the collection."""
+    return {"model": model_key(EMBED_MODEL, EMBED_DIMENSIONS), "quantization": VECTOR_QUANTIZATION}
+
+def _load_index_state(target: "_SiteIndex") -> Tuple[Dict[str, dict], List[str]]:
+    """Load a site's per-page validators and chunk IDs, and its learned boilerplate blocks, from its previous run."""
+    try:
+        with open(target.state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return {}, []
+    except (OSError, json.JSONDecodeError) as e:
+        logging.warning(f"Could not read index state from {target.state_path}, doing a full re-index: {e}")
+        return {}, []
+    if state.get("collection") != target.collection.name:
+        return {}, []
+    if state.get("vectors", {"model": EMBED_MODEL, "quantization": None}) != _vector_config():
+        logging.info(f"Embedding model, dimensions or quantization changed since the last run, doing a full re-index.")
+        return {}, state.get("boilerplate", [])
+    return state.get("pages", {}), state.get("boilerplate", [])
+
+def _save_index_state(target: "_SiteIndex"):
+    """Atomically write a site's per-page index state for the next incremental run."""
+    content_filter = target.content_filter
+    tmp_path = f"{target.state_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"collection": target.collection.name, "site": target.site.url, "vectors": _vector_config(),
+                   "pages": target.page_state,
+                   "boilerplate": sorted(content_filter.boilerplate if content_filter is not None else ())}, f)
+    os.replace(tmp_path, target.state_path)
+
+def _mark_index_version():
+    """Touch the index version file so running chat apps drop their cached answers."""
+    with open(INDEX_VERSION_PATH, "w", encoding="utf-8") as f:
+        f.write(f"{time.time()}\n")
+
+# --- API Clients Setup ---
+# Built by `init_clients` when indexing starts, not at import: the parse worker
+# processes re-import this module (as __mp_main__ when it runs as a script).
+# Clients assigned before that (e.g. by the tests and benchmarks) are kept.
+openai_client = None
+qdrant = None
+embedding_cache = None  # opened on first use by `_get_embedding_cache`, in the working directory of the run
+_clients_lock = threading.Lock()
+_collector_registered = False
 
-openai_client = OpenAI(api_key=openai_api_key)
-qdrant = qdrant_client.QdrantClient(url=QDRANT_URL)
+def init_clients():
+    """Build the OpenAI and Qdrant clients that are not set yet and start exporting the embedding counters."""
+    global openai_client, qdrant, _collector_registered
+    with _clients_lock:
+        if openai_client is None:
+            from openai import OpenAI
+            openai_client = OpenAI()  # API key is read from the OPENAI_API_KEY environment variable
+        if VECTOR_STORE_BACKEND == "qdrant" and qdrant is None:
+            import qdrant_client
+            qdrant = qdrant_client.QdrantClient(url=QDRANT_URL)
+        if not _collector_registered:
+            metrics.register_collector(_collect_metrics)
+            _collector_registered = True
 
 # --- Core Indexing Logic ---
-def _ensure_collection(vector_size: int = 1536):
-    """Ensure Qdrant collection exists with proper configuration."""
-    logging.info(f"Ensuring Qdrant collection '{COLLECTION_NAME}' exists with vector size {vector_size}.")
-    
-    # TODO: Implement Qdrant collection creation/recreation.
-    #       This function ensures that the Qdrant collection is ready for new data.
-    #       For a workshop, recreating the collection ensures a clean state each time the script runs.
-    #       Required imports: `from qdrant_client.http import models as rest` (or use `qdrant_client.models` directly if preferred)
-    #       Reference the `qdrant` client initialized earlier.
-    #       The `VECTOR_SIZE` needs to match your embedding model. For OpenAI's "text-embedding-3-small" (EMBED_MODEL), this is 1536.
-    # 1. Attempt to recreate the collection. This is often simpler than checking existence and then creating/updating.
-    #    `qdrant.recreate_collection(`
-    #    `    collection_name=COLLECTION_NAME,`
-    #    `    vectors_config=qdrant_client.models.VectorParams(size=vector_size, distance=qdrant_client.models.Distance.COSINE)`
-    #    `)`
-    #    - `collection_name`: Use the `COLLECTION_NAME` constant.
-    #    - `vectors_config`: Defines the properties of the vectors to be stored.
-    #        - `size`: Must match the dimensionality of the embeddings (e.g., 1536 for `text-embedding-3-small`). Pass the `vector_size` argument.
-    #        - `distance`: The metric to measure similarity. `qdrant_client.models.Distance.COSINE` is common for text embeddings.
-    # 2. Log a success message after creation.
-    #    `logging.info(f"Collection '{COLLECTION_NAME}' created/recreated successfully.")`
-    # 3. Add a short delay (`time.sleep(2)`) to allow Qdrant to stabilize after collection operations, as suggested in the original hints.
-    #    (ensure `import time` is at the top of the file)
-    # 4. Wrap the Qdrant call in a `try-except` block to catch potential errors.
-    #    `try:`
-    #    `    ... qdrant.recreate_collection(...) ...`
-    #    `except Exception as e:`
-    #    `    logging.error(f"Critical error during collection recreation for '{COLLECTION_NAME}': {e}")`
-    #    `    # Propagate the error to stop the script if the collection can't be set up.`
-    #    `    raise`
-    
+def _ensure_collection(store, vector_size: int = 1536, recreate: bool = True):
+    """Ensure the vector store collection exists with proper configuration.
+
+    With `recreate=False` an existing collection is kept as-is, so incremental
+    runs never leave the chat app looking at an empty collection.
+    """
+    logging.info(f"Ensuring {VECTOR_STORE_BACKEND} collection '{store.collection_name}' exists with vector size {vector_size}.")
+
     try:
-        # Example: (Replace VECTOR_SIZE with the actual variable if you define it, or use the vector_size parameter)
-        logging.info(f"Recreating Qdrant collection: '{COLLECTION_NAME}' with vector size {vector_size} and COSINE distance.")
-        qdrant.recreate_collection(
-            collection_name=COLLECTION_NAME,
-            vectors_config=qdrant_client.models.VectorParams(size=vector_size, distance=qdrant_client.models.Distance.COSINE)
-        )
-        logging.info(f"Collection '{COLLECTION_NAME}' created successfully.")
-        
-        time.sleep(2) # Delay for stability
+        store.ensure_collection(vector_size, recreate=recreate)
     except Exception as e:
-        logging.error(f"Critical error during collection recreation for '{COLLECTION_NAME}': {e}")
-        # TODO: Add additional error handling and info gathering if needed. For now, re-raising is good.
+        logging.error(f"Critical error during collection recreation for '{store.collection_name}': {e}")
         raise
 
-def index_website(base_url: str):
-    """Main indexing function that orchestrates the entire process."""
-    logging.info(f"Starting indexing process for {base_url}...")
-    
-    # TODO: Implement the complete indexing workflow step-by-step.
-    # This function combines scraping, chunking, embedding, and uploading.
-
-    # 1. Scrape the website to get pages.
-    #    - Call `pages = scrape_site(base_url, max_pages=MAX_PAGES)` (as already implemented below).
-    #    - Check if `pages` is empty. If so, log a warning and return early (already implemented).
-
-    # 2. Initialize lists to store data for Qdrant: `all_texts_to_embed = []`, `point_ids = []`, `payloads = []`.
-    #    (The original template uses `texts, ids, payloads` which is fine too.)
-
-    # 3. Process each scraped page to create chunks.
-    #    `logging.info(f"Processing {len(pages)} scraped pages into chunks...")`
-    #    `for page_url, page_content in pages:`
-    #    `    # Chunk the text content of the page using the `chunk_text` function.`
-    #    `    text_chunks = chunk_text(page_content, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP)`
-    #    `    for chunk in text_chunks:`
-    #    `        if not chunk.strip(): continue # Skip empty chunks`
-    #    `        all_texts_to_embed.append(chunk)`
-    #    `        # Create a unique ID for each chunk. `uuid.uuid4()` is good for this.`
-    #    `        # Ensure `import uuid` is at the top of the file.
-    #    `        point_ids.append(str(uuid.uuid4()))`
-    #    `        # Create the payload for Qdrant. This stores metadata associated with the vector.`
-    #    `        # It should include the source URL and the chunk text itself for context retrieval.
-    #    `        payloads.append({"url": page_url, "text": chunk, "original_url": page_url}) # or any other metadata`
-    #    (The original template initializes `texts, ids, payloads` and has a TODO for processing pages - these hints replace that.)
-
-    # 4. Check if any text chunks were generated.
-    #    - If `all_texts_to_embed` is empty, log a warning and return (already implemented with `texts`).
-
-    # 5. Generate embeddings for all text chunks in batches.
-    #    `logging.info(f"Generating embeddings for {len(all_texts_to_embed)} text chunks...")`
-    #    `vectors = []`
-    #    `BATCH_SIZE_EMBEDDING = 100 # Define how many texts to embed in one API call.`
-    #    `for i in range(0, len(all_texts_to_embed), BATCH_SIZE_EMBEDDING):`
-    #    `    batch_texts = all_texts_to_embed[i:i + BATCH_SIZE_EMBEDDING]`
-    #    `    try:`
-    #    `        # Use the openai_client to create embeddings.`
-    #    `        response = openai_client.embeddings.create(model=EMBED_MODEL, input=batch_texts)`
-    #    `        # Extract the embedding vectors from the response.`
-    #    `        batch_vectors = [item.embedding for item in response.data]`
-    #    `        vectors.extend(batch_vectors)`
-    #    `        logging.info(f"Embedded batch {i // BATCH_SIZE_EMBEDDING + 1}/{(len(all_texts_to_embed) -1) // BATCH_SIZE_EMBEDDING + 1}")`
-    #    `    except Exception as e:`
-    #    `        logging.error(f"Error embedding batch starting at index {i}: {e}")`
-    #    `        # Decide on error strategy: skip batch, stop all, etc. For now, log and continue might mean partial indexing.`
-    #    `        # To be robust, you might add retries or save failed batches for later processing.`
-    #    (The original template has a TODO for batch embedding generation - these hints replace that.)
-
-    # 6. Verify that embeddings were generated correctly.
-    #    - If `vectors` is empty or `len(vectors) != len(all_texts_to_embed)`, log an error and return (already implemented).
-
-    # 7. Ensure the Qdrant collection exists.
-    #    - Determine the vector size from your embeddings (e.g., `vector_dim = len(vectors[0]) if vectors else 1536`).
-    #    - Call `_ensure_collection(vector_size=vector_dim)`. This will create/recreate the collection.
-
-    # 8. Upload all data (points with vectors and payloads) to Qdrant in batches.
-    #    `logging.info(f"Uploading {len(vectors)} points to Qdrant collection '{COLLECTION_NAME}'...")`
-    #    `BATCH_SIZE_QDRANT = 100 # Define how many points to upload in one Qdrant API call.`
-    #    `for i in range(0, len(vectors), BATCH_SIZE_QDRANT):`
-    #    `    batch_ids = point_ids[i:i + BATCH_SIZE_QDRANT]`
-    #    `    batch_vectors = vectors[i:i + BATCH_SIZE_QDRANT]`
-    #    `    batch_payloads = payloads[i:i + BATCH_SIZE_QDRANT]`
-    #    `    # Create Qdrant PointStructs.`
-    #    `    # Ensure `from qdrant_client.http.models import PointStruct` (or `from qdrant_client import models`)
-    #    `    points_to_upload = [`
-    #    `        qdrant_client.models.PointStruct(id=pid, vector=vec, payload=pl)`
-    #    `        for pid, vec, pl in zip(batch_ids, batch_vectors, batch_payloads)`
-    #    `    ]`
-    #    `    try:`
-    #    `        # Upsert the points to Qdrant.`
-    #    `        qdrant.upsert(collection_name=COLLECTION_NAME, points=points_to_upload, wait=True)`
-    #    `        logging.info(f"Uploaded batch {i // BATCH_SIZE_QDRANT + 1}/{(len(vectors)-1) // BATCH_SIZE_QDRANT + 1} to Qdrant.")`
-    #    `    except Exception as e:`
-    #    `        logging.error(f"Error uploading batch to Qdrant starting at index {i}: {e}")`
-    #    (The original template has a TODO for setting up collection and uploading data - these hints replace that.)
-    
-    pages = scrape_site(base_url, max_pages=MAX_PAGES)
-    if not pages:
-        logging.warning(f"No pages scraped from {base_url}. Nothing to index.")
-        return
+class _Collection:
+    """A vector store collection and its BM25 index, written by one site or, shared, by several.
+
+    The chat app reads `store` (a Qdrant alias). A rebuild writes into a
+    staging collection instead, which `publish` swaps in once every site
+    writing to it has finished, so searches never see a half-built index.
+    A rebuild of only some of a shared collection's sites first copies the
+    points of all the other sites into the staging collection.
+    """
+
+    def __init__(self, name: str, bm25_path: Optional[str]):
+        self.name = name
+        self.store = open_store(VECTOR_STORE_BACKEND, name, qdrant=qdrant, local_dir=LOCAL_INDEX_DIR,
+                                quantization=VECTOR_QUANTIZATION, oversampling=QUANTIZATION_OVERSAMPLING,
+                                payload_indexes=("site",))
+        self.bm25 = BM25Index(bm25_path) if bm25_path else None
+        self.writer = self.store  # where upserts and deletes go during a run
+        self.rebuild = False
+        self.rebuilt_sites: Optional[Set[str]] = None  # None: a rebuild replaces every site
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def begin(self, rebuild: bool, sites: Optional[Set[str]] = None):
+        """Start a run; a rebuild goes into a new staging collection and an empty BM25 index.
+
+        With `sites`, the rebuild only replaces those sites: the others are
+        copied over when the staging collection is created.
+        """
+        self.rebuild = rebuild
+        self.rebuilt_sites = sites if rebuild else None
+        self.writer = self.store.staging() if rebuild else self.store
+        self._ready = False
+        if rebuild and self.bm25 is not None:
+            self.bm25.reset()
+
+    def ensure(self, vector_size: int):
+        """Create (or check) the collection before the first upsert of any of its sites."""
+        with self._lock:
+            if not self._ready:
+                _ensure_collection(self.writer, vector_size=vector_size, recreate=self.rebuild)
+                if self.rebuilt_sites is not None:
+                    self._copy_other_sites(vector_size)
+                self._ready = True
+
+    def _copy_other_sites(self, vector_size: int):
+        copied = 0
+        with metrics.span("indexer_copy"):
+            for ids, vectors, payloads in self.store.points():
+                keep = [i for i, payload in enumerate(payloads) if payload.get("site") not in self.rebuilt_sites]
+                if not keep:
+                    continue
+                if len(vectors[keep[0]]) != vector_size:
+                    raise ValueError(f"Cannot rebuild only {', '.join(sorted(self.rebuilt_sites))} in '{self.name}': "
+                                     f"the other sites' vectors have size {len(vectors[keep[0]])}, not "
+                                     f"{vector_size}. Re-index every site of the collection together.")
+                ids, vectors, payloads = ([items[i] for i in keep] for items in (ids, vectors, payloads))
+                self.writer.upsert(ids, vectors, payloads)
+                if self.bm25 is not None:
+                    self.bm25.add(ids, [payload["text"] for payload in payloads], payloads)
+                copied += len(ids)
+        logging.info(f"Copied {copied} points of other sites into the rebuilt collection '{self.name}'.")
+
+    def discard_site_writes(self, site: str, keep: Set[str]) -> int:
+        """Delete the points `site` wrote in this run, all but `keep`; returns how many were deleted.
+
+        Used for a site that failed in a collection published (or already
+        written) anyway: its index state is not saved, so no later run would
+        know to prune them.
+        """
+        with self._lock:
+            if not self._ready:
+                return 0  # nothing was written
+        written = sorted(set(self.writer.point_ids({"site": site})) - keep)
+        if written:
+            self.writer.delete(written)
+            if self.bm25 is not None:
+                self.bm25.remove(written)
+            logging.info(f"Deleted {len(written)} points written to '{self.name}' by the failed site {site}.")
+        return len(written)
+
+    def publish(self):
+        with metrics.span("indexer_publish"):
+            self.store.publish(self.writer)
+            if self.bm25 is not None:
+                self.bm25.save()
+        self.writer = self.store
+
+    def discard(self):
+        """Throw away an unpublished rebuild; the chat app keeps using the previous collection."""
+        self.store.discard(self.writer)
+        if self.bm25 is not None:
+            self.bm25.discard()
+        self.writer = self.store
+
+class _SiteIndex:
+    """One site's part of an indexing run: its collection, state and crawl frontier, and what the run found."""
 
+    def __init__(self, site: Site, collection: _Collection):
+        self.site = site
+        self.collection = collection
+        self.state_path = site_path(INDEX_STATE_PATH, site.name)
+        self.frontier_path = site_path(CRAWL_FRONTIER_PATH, site.name)
+        self.page_state: Dict[str, dict] = {}
+        self.boilerplate: List[str] = []
+        self.previous_ids = set()  # chunk IDs already in the collection for this site
+        self.recreate = True  # no usable previous state: every page is fetched and chunked afresh
+        self.content_filter: Optional[ContentFilter] = None
+        self.frontier: Optional[CrawlFrontier] = None
+        self.unchanged: List[str] = []
+        self.indexed_urls: Optional[set] = None  # set by a successful run
+
+def _get_embedding_executor() -> EmbeddingExecutor:
+    """Return the shared embedding executor (created on first use), which bounds concurrency across all sites."""
+    global _embedding_executor
+    if openai_client is None:
+        init_clients()
+    with _embedding_executor_lock:
+        if _embedding_executor is None:
+            _embedding_executor = EmbeddingExecutor(openai_client, EMBED_MODEL, get_encoding(),
+                                                    concurrency=EMBED_CONCURRENCY, dimensions=EMBED_DIMENSIONS)
+    return _embedding_executor
+
+_embedding_executor = None
+_embedding_executor_lock = threading.Lock()
+
+def _collect_metrics():
+    """Counters kept by the embedding executor and cache, exported next to the stage timings."""
+    if _embedding_executor is not None:
+        yield "indexer_embedding_requests_total", "counter", _embedding_executor.requests_sent
+        yield "indexer_embedding_rate_limited_total", "counter", _embedding_executor.rate_limited
+        for reason, count in _embedding_executor.retry_counts().items():
+            yield "indexer_embedding_retries_total", "counter", count, {"reason": reason}
+        yield "indexer_embedded_tokens_total", "counter", _embedding_executor.tokens_embedded
+    if embedding_cache is not None:
+        yield "indexer_embedding_cache_hits_total", "counter", embedding_cache.hits
+        yield "indexer_embedding_cache_misses_total", "counter", embedding_cache.misses
+
+def _embed_batches(texts: List[str]) -> List[List[float]]:
+    """Embed `texts` with token-packed, concurrent requests, preserving order."""
+    executor = _get_embedding_executor()
+    with metrics.span("indexer_embed"):
+        vectors = executor.embed(texts)
+    metrics.inc("indexer_embedded_chunks_total", len(vectors))
+    logging.info(f"Embedding requests sent: {executor.requests_sent}, rate limited: {executor.rate_limited}")
+    return vectors
+
+def _get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Return the shared embedding cache, opening it on first use (None if USE_EMBEDDING_CACHE is off or it is unavailable)."""
+    global embedding_cache
+    with _embedding_executor_lock:
+        if embedding_cache is None and USE_EMBEDDING_CACHE:
+            embedding_cache = open_cache()
+    return embedding_cache
+
+def _embed_texts(texts: List[str]) -> List[List[float]]:
+    """Embed `texts`, serving previously embedded chunks from the shared embedding cache."""
+    cache = _get_embedding_cache() if texts else None
+    if cache is None:
+        return _embed_batches(texts)
+    vectors = cache.embed(model_key(EMBED_MODEL, EMBED_DIMENSIONS), texts, _embed_batches)
+    logging.info(f"Embedding cache: {cache.stats()}")
+    return vectors
+
+def _upsert_points(collection: _Collection, ids: List[str], vectors: List[List[float]], payloads: List[dict]):
+    """Upload points to the collection in batches of BATCH_SIZE_QDRANT and add them to its BM25 index."""
+    if collection.bm25 is not None:
+        with metrics.span("indexer_bm25_add"):
+            collection.bm25.add(ids, [payload["text"] for payload in payloads], payloads)
+    for i in range(0, len(vectors), BATCH_SIZE_QDRANT):
+        with metrics.span("indexer_upsert"):
+            collection.writer.upsert(ids[i:i + BATCH_SIZE_QDRANT], vectors[i:i + BATCH_SIZE_QDRANT],
+                                     payloads[i:i + BATCH_SIZE_QDRANT])
+        metrics.inc("indexer_upserted_points_total", len(ids[i:i + BATCH_SIZE_QDRANT]))
+        logging.info(f"Uploaded batch {i // BATCH_SIZE_QDRANT + 1}/{(len(vectors) - 1) // BATCH_SIZE_QDRANT + 1} to '{collection.name}'.")
+
+def _new_chunks(site: str, page_url: str, page_content: str, chunks: Optional[List[Tuple[str, int, int]]],
+                page_state: Dict[str, dict], previous_ids: set) -> List[Tuple[str, str, dict]]:
+    """Chunk one page (unless already chunked), record its chunk IDs in `page_state` and
+    return (id, text, payload) for chunks not yet indexed."""
+    if chunks is None:
+        with metrics.span("indexer_chunk"):
+            chunks = chunk_with_offsets(page_content, CHUNK_SIZE, CHUNK_OVERLAP, CHUNK_SNAP_TO_SENTENCES)
+    chunk_ids, new_chunks = [], []
+    for chunk, start, end in chunks:
+        chunk_hash = _chunk_hash(chunk)
+        pid = _point_id(site, page_url, chunk_hash)
+        if pid in chunk_ids:
+            continue
+        chunk_ids.append(pid)
+        if pid in previous_ids:
+            continue
+        new_chunks.append((pid, chunk, {"site": site, "url": page_url, "text": chunk, "chunk_hash": chunk_hash,
+                                        "char_start": start, "char_end": end}))
+    page_state[page_url]["chunk_ids"] = chunk_ids
+    metrics.inc("indexer_chunks_total", len(chunk_ids))
+    metrics.inc("indexer_new_chunks_total", len(new_chunks))
+    return new_chunks
+
+def _index_phased(target: _SiteIndex, pages: Iterator[Tuple[str, str, Optional[list]]]) -> Optional[set]:
+    """Scrape everything, then chunk, embed and upload. Returns the URLs indexed, or None on failure."""
+    pages = list(pages)
     texts, ids, payloads = [], [], []
-    
-    # TODO: Process pages and create chunks
-    # Based on the detailed hints above, this involves iterating through `pages`,
-    # calling `chunk_text`, and populating `texts` (or `all_texts_to_embed`), `ids`, and `payloads`.
-    
-    if not texts:
-        logging.warning("No text chunks available for embedding after processing all pages.")
-        return
+    for page_url, page_content, chunks in pages:
+        for pid, chunk, payload in _new_chunks(target.site.name, page_url, page_content, chunks, target.page_state,
+                                               target.previous_ids):
+            texts.append(chunk)
+            ids.append(pid)
+            payloads.append(payload)
 
-    logging.info(f"Generated {len(texts)} text chunks for embedding.")
-
-    # TODO: Generate embeddings in batches
-    # Based on the detailed hints (Step 5), this involves iterating through `texts` (or `all_texts_to_embed`)
-    # in batches, calling `openai_client.embeddings.create`, and populating `vectors`.
-    
-    vectors = []
-    BATCH_SIZE_EMBEDDING = 100
-    
-    # TODO: Implement batch embedding generation
-    
-    if not vectors or len(vectors) != len(texts):
+    if target.recreate and not texts and not target.previous_ids:
+        logging.warning(f"No text chunks available for embedding after processing all pages of {target.site.url}.")
+        return None
+
+    logging.info(f"{len(texts)} new or changed text chunks to embed.")
+
+    vectors = _embed_texts(texts)
+    if len(vectors) != len(texts):
         logging.error(f"Embedding failed or produced incomplete results. Expected {len(texts)} vectors, got {len(vectors)}. Aborting upload.")
-        return
+        return None
 
     logging.info(f"Successfully embedded {len(vectors)} chunks.")
-    
-    # TODO: Setup collection and upload data
-    # Based on the detailed hints (Step 7 & 8):
-    # 1. Determine vector dimension: `vector_dim = len(vectors[0]) if vectors else 1536`
-    # 2. Call `_ensure_collection(vector_size=vector_dim)`
-    # 3. Prepare `PointStructs` and upload to Qdrant in batches using `qdrant.upsert`.
-    
+
+    vector_dim = len(vectors[0]) if vectors else 1536
+    target.collection.ensure(vector_dim)
+    if vectors:
+        logging.info(f"Uploading {len(vectors)} points to collection '{target.collection.name}'...")
+        _upsert_points(target.collection, ids, vectors, payloads)
+    return {page_url for page_url, _, _ in pages}
+
+_DONE = object()  # end-of-stream marker for the pipeline queues
+
+def _put(q: Queue, item, stop: threading.Event) -> bool:
+    """Blocking put that gives up once `stop` is set, so a failed stage cannot deadlock the others."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except Full:
+            continue
+    return False
+
+def _get(q: Queue, stop: threading.Event):
+    """Blocking get that returns `_DONE` once `stop` is set, for the same reason."""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.5)
+        except Empty:
+            continue
+    return _DONE
+
+def _index_streaming(target: _SiteIndex, pages: Iterator[Tuple[str, str, Optional[list]]]) -> Optional[set]:
+    """Overlap crawl+chunk, embedding and upserts through bounded queues.
+
+    A producer thread crawls and chunks pages, the calling thread embeds
+    chunks as soon as BATCH_SIZE_EMBEDDING of them are queued, and
+    UPSERT_WORKERS threads upload finished batches. The bounded queues apply
+    backpressure, so memory stays flat regardless of MAX_PAGES. Returns the
+    URLs indexed, or None on failure. If any stage fails (or raises in the
+    calling thread) the others are stopped and every thread is joined
+    before returning.
+    """
+    chunk_queue = Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    upsert_queue = Queue(maxsize=UPSERT_WORKERS * 2)
+    stop = threading.Event()
+    errors = []
+    live_urls = set()
+
+    def produce():
+        try:
+            for page_url, page_content, chunks in pages:
+                if stop.is_set():
+                    return
+                live_urls.add(page_url)
+                for item in _new_chunks(target.site.name, page_url, page_content, chunks, target.page_state,
+                                        target.previous_ids):
+                    if not _put(chunk_queue, item, stop):
+                        return
+        except Exception as e:
+            logging.error(f"Crawling/chunking stage failed: {e}")
+            errors.append(e)
+            stop.set()
+        finally:
+            pages.close()
+            _put(chunk_queue, _DONE, stop)
+
+    def upload():
+        while True:
+            item = _get(upsert_queue, stop)
+            if item is _DONE or stop.is_set():
+                return
+            try:
+                _upsert_points(target.collection, *item)
+            except Exception as e:
+                logging.error(f"Qdrant upsert stage failed: {e}")
+                errors.append(e)
+                stop.set()
+
+    producer = threading.Thread(target=produce, name="index-crawl", daemon=True)
+    uploaders = [threading.Thread(target=upload, name=f"index-upsert-{i}", daemon=True) for i in range(UPSERT_WORKERS)]
+    producer.start()
+    for t in uploaders:
+        t.start()
+
+    collection_ready = False
+    embedded = 0
+    batch = []
+    finished = False
+    try:
+        while not finished and not stop.is_set():
+            item = _get(chunk_queue, stop)
+            finished = item is _DONE and not stop.is_set()
+            if item is not _DONE:
+                batch.append(item)
+            if batch and (finished or len(batch) >= BATCH_SIZE_EMBEDDING):
+                ids, texts, payloads = (list(column) for column in zip(*batch))
+                batch = []
+                vectors = _embed_texts(texts)
+                if len(vectors) != len(texts):
+                    logging.error(f"Embedding failed or produced incomplete results. Expected {len(texts)} vectors, got {len(vectors)}. Aborting.")
+                    errors.append(RuntimeError("embedding failed"))
+                    stop.set()
+                    break
+                if not collection_ready:
+                    target.collection.ensure(len(vectors[0]))
+                    collection_ready = True
+                embedded += len(vectors)
+                _put(upsert_queue, (ids, vectors, payloads), stop)
+    except BaseException:
+        stop.set()  # the producer stops crawling and the uploaders drop what is left
+        raise
+    finally:
+        for _ in uploaders:
+            _put(upsert_queue, _DONE, stop)  # after a failure the uploaders notice `stop` instead
+        producer.join()
+        for t in uploaders:
+            t.join()
+
+    if errors:
+        return None
+    if target.recreate and not collection_ready and not target.previous_ids:
+        logging.warning(f"No text chunks available for embedding after processing all pages of {target.site.url}.")
+        return None
+    logging.info(f"Streamed {embedded} new or changed chunks of {target.site.name} into collection '{target.collection.name}'.")
+    return live_urls
+
+def _prune_site(target: _SiteIndex) -> Optional[bool]:
+    """Delete a site's stale points after its run; returns whether the collection changed, or None if nothing was scraped."""
+    if not target.indexed_urls and not target.unchanged:
+        logging.warning(f"No pages scraped from {target.site.url}. Nothing to index.")
+        return None
+
+    # Pages not reached by this crawl, or answered with 404/410, are treated as gone (see `_crawl`).
+    live_urls = set(target.unchanged) | target.indexed_urls
+    for page_url in list(target.page_state):
+        if page_url not in live_urls:
+            del target.page_state[page_url]
+    live_ids = {pid for entry in target.page_state.values() for pid in entry.get("chunk_ids", [])}
+    stale_ids = sorted(target.previous_ids - live_ids)
+    logging.info(f"{target.site.name}: {len(target.indexed_urls)} pages indexed, {len(target.unchanged)} pages unchanged, "
+                 f"{len(stale_ids)} stale chunks to delete.")
+
+    if stale_ids:
+        collection = target.collection
+        with metrics.span("indexer_publish"):
+            collection.writer.delete(stale_ids)
+            if collection.bm25 is not None:
+                collection.bm25.remove(stale_ids)
+        logging.info(f"Deleted {len(stale_ids)} stale points from '{collection.name}'.")
+    metrics.inc("indexer_deleted_points_total", len(stale_ids))
+    return bool(target.indexed_urls or stale_ids)
+
+def _plan_collection(collection: _Collection, targets: List[_SiteIndex], incremental: bool):
+    """Load the previous state of every site in `collection` and decide whether to rebuild it.
+
+    The collection is rebuilt (in staging, see `_Collection`) only when none
+    of its sites has a usable previous state. If it also holds other sites
+    (a shared collection indexed for some of its sites), an incremental run
+    updates it in place instead, and a full run only replaces the sites being
+    indexed. A site without state in a kept collection takes its previous
+    chunk IDs from the collection itself, so unchanged chunks are not
+    re-embedded and stale ones are deleted.
+    """
+    stored = exists = collection.store.collection_exists()
+    if not exists:
+        logging.info(f"Collection '{collection.name}' is missing, ignoring previous index state.")
+    elif collection.bm25 is not None and not collection.bm25.exists():
+        logging.info(f"BM25 index '{collection.bm25.path}' is missing, ignoring previous index state.")
+        exists = False
+    for target in targets:
+        target.page_state, target.boilerplate = _load_index_state(target) if incremental else ({}, [])
+        if not exists:
+            target.page_state = {}
+        target.recreate = not target.page_state
+    names = {target.site.name for target in targets}
+    other_points = (collection.store.count() - sum(collection.store.count({"site": name}) for name in names)
+                    if stored else 0)
+    rebuild = all(target.recreate for target in targets) and not (other_points and incremental and exists)
+    collection.begin(rebuild, names if rebuild and other_points else None)
+    for target in targets:
+        if not target.recreate:
+            target.previous_ids = {pid for entry in target.page_state.values() for pid in entry.get("chunk_ids", [])}
+        elif not rebuild:
+            target.previous_ids = set(collection.store.point_ids({"site": target.site.name}))
+            logging.info(f"{target.site.name}: no previous state, {len(target.previous_ids)} chunks already in "
+                         f"'{collection.name}'.")
+    kept = f" (keeping the {other_points} points of other sites)" if other_points else ""
+    logging.info(f"Collection '{collection.name}': {'rebuilding' if rebuild else 'updating'} "
+                 f"{', '.join(target.site.name for target in targets)}{kept}.")
+
+def _run_site(target: _SiteIndex, streaming: bool, processor: PageProcessor) -> bool:
+    """Crawl one site and write its new chunks into its collection; True if the run succeeded."""
+    site = target.site
+    logging.info(f"Starting indexing process for {site.url} (site '{site.name}', collection '{target.collection.name}', "
+                 f"recreate={target.recreate}, streaming={streaming})...")
+    with metrics.span("indexer_run", site=site.name):
+        try:
+            target.content_filter = _new_content_filter(target.boilerplate) if DEDUPLICATE_PAGES else None
+            target.frontier = open_frontier(target.frontier_path)
+            pages = _crawl(site.url, max_pages=site.max_pages or MAX_PAGES, page_state=target.page_state,
+                           unchanged=target.unchanged, processor=processor, content_filter=target.content_filter,
+                           frontier=target.frontier)
+            run_stages = _index_streaming if streaming else _index_phased
+            target.indexed_urls = run_stages(target, pages)
+        except Exception as e:
+            logging.error(f"Indexing {site.url} failed: {e}", exc_info=True)
+            target.indexed_urls = None
+    return target.indexed_urls is not None
+
+def _finish_collection(collection: _Collection, targets: List[_SiteIndex]) -> bool:
+    """Delete stale points, publish the collection and save the state of its sites; returns whether it was published.
+
+    A rebuild is only published if every site succeeded, otherwise the
+    previous collection stays in place. Sites that failed keep their old state
+    and, in a collection that is updated in place, their points: the ones they
+    added in this run are deleted again.
+    """
+    succeeded = [target for target in targets if target.indexed_urls is not None]
+    if collection.rebuild and len(succeeded) < len(targets):
+        logging.error(f"Not publishing the rebuilt collection '{collection.name}': "
+                      f"{', '.join(t.site.name for t in targets if t.indexed_urls is None)} failed.")
+        collection.discard()
+        return False
+    for target in targets:
+        if target.indexed_urls is None:
+            collection.discard_site_writes(target.site.name, target.previous_ids)
+    if not succeeded:
+        return False
+    changed = {target.site.name: _prune_site(target) for target in succeeded}
+    if collection.rebuild and not any(changed.values()):
+        collection.discard()
+        return False
+    collection.publish()
+    for target in succeeded:
+        if changed[target.site.name] is not None:
+            _save_index_state(target)
+            target.frontier.finish()
+    if any(changed.values()):
+        _mark_index_version()
+    return True
+
+def index_sites(sites: List[Site], incremental: bool = INCREMENTAL_INDEXING, streaming: bool = STREAMING_INDEXING,
+                parse_workers: int = PARSE_WORKERS) -> List[str]:
+    """Main indexing function that orchestrates the entire process; returns the names of the sites that failed.
+
+    Up to PARALLEL_SITES sites are crawled and indexed at once. They share
+    one budget of MAX_CONCURRENT_FETCHES page fetches, EMBED_CONCURRENCY
+    embedding requests and `parse_workers` parse processes. With
+    SITE_COLLECTIONS "per_site" every site has its own collection and BM25
+    index; with "shared" all sites go into COLLECTION_NAME and the chat app
+    filters on the indexed "site" payload field. Each site keeps its own
+    index state and crawl frontier files (see `sites.site_path`).
+
+    In incremental mode pages are fetched with conditional GETs against the
+    validators saved by the previous run, only chunks whose (site, url,
+    content hash) point ID is new are embedded and upserted, and points
+    belonging to pages or chunks that disappeared are deleted. A collection is
+    only rebuilt for a full run or when none of its sites has a usable
+    previous state; the rebuild goes into a staging collection that replaces
+    the live one atomically once all its sites have finished. Indexing some of
+    the sites of a shared collection never drops the others: their points are
+    kept, or copied into the staging collection.
+
+    With `streaming` the scrape, chunk, embed and upsert stages run as a
+    pipeline (see `_index_streaming`) instead of one after the other.
+
+    Pages are parsed and chunked as they are fetched; `parse_workers` > 0 moves
+    that CPU-bound work into a process pool so it scales across cores.
+
+    Upserted chunks are also added to the collection's BM25 keyword index,
+    which is saved when the collection is published.
+
+    With DEDUPLICATE_PAGES, duplicate pages are skipped and site-wide
+    boilerplate is stripped while crawling; the learned boilerplate is saved
+    with the index state and reused by the next incremental run.
+
+    Crawl progress is checkpointed per site: a run that is interrupted or
+    fails resumes the same crawl without refetching finished pages, and the
+    crawl only counts as finished once it has been published.
+
+    With METRICS_ENABLED every stage is timed and counted (see metrics.py);
+    run as a script, the totals are written to METRICS_TEXTFILE_PATH.
+    PROFILE_PATH dumps a cProfile of the whole run.
+    """
+    per_site = SITE_COLLECTIONS == "per_site"
+    if SITE_COLLECTIONS not in ("shared", "per_site"):
+        raise ValueError(f"Unknown SITE_COLLECTIONS layout: {SITE_COLLECTIONS!r}")
+    init_clients()
+    collections: Dict[str, _Collection] = {}
+    targets: List[_SiteIndex] = []
+    for site in sites:
+        name = site_collection(COLLECTION_NAME, site.name, per_site)
+        if name not in collections:
+            bm25_path = site_path(BM25_INDEX_PATH, site.name) if per_site else BM25_INDEX_PATH
+            collections[name] = _Collection(name, bm25_path)
+        targets.append(_SiteIndex(site, collections[name]))
+    members = {name: [target for target in targets if target.collection is collection]
+               for name, collection in collections.items()}
+    for name, collection in collections.items():
+        _plan_collection(collection, members[name], incremental)
+
+    failed = []
+    remaining = {name: len(group) for name, group in members.items()}
+    processor = PageProcessor(parse_workers, CHUNK_SIZE, CHUNK_OVERLAP, CHUNK_SNAP_TO_SENTENCES)
+    with metrics.profiled(PROFILE_PATH), ThreadPoolExecutor(max_workers=max(1, PARALLEL_SITES),
+                                                            thread_name_prefix="site") as pool:
+        try:
+            futures = {pool.submit(_run_site, target, streaming, processor): target for target in targets}
+            for future in as_completed(futures):
+                target = futures[future]
+                if not future.result():
+                    failed.append(target.site.name)
+                name = target.collection.name
+                remaining[name] -= 1
+                if not remaining[name]:  # publish as soon as every site writing to the collection is done
+                    try:
+                        _finish_collection(collections[name], members[name])
+                    except Exception as e:
+                        logging.error(f"Publishing collection '{name}' failed: {e}", exc_info=True)
+                        failed.extend(t.site.name for t in members[name] if t.site.name not in failed)
+        finally:
+            processor.close()
+            for target in targets:
+                if target.frontier is not None:
+                    target.frontier.close()
+    return failed
+
+def index_website(base_url: str, incremental: bool = INCREMENTAL_INDEXING, streaming: bool = STREAMING_INDEXING,
+                  parse_workers: int = PARSE_WORKERS):
+    """Index the single site at `base_url` (see `index_sites`)."""
+    return index_sites([Site(site_name(base_url), base_url)], incremental, streaming, parse_workers)
+
+def _write_metrics(succeeded: bool):
+    """Write this run's metrics to METRICS_TEXTFILE_PATH for node_exporter's textfile collector."""
+    if not METRICS_ENABLED or not METRICS_TEXTFILE_PATH:
+        return
+    metrics.set_gauge("indexer_last_run_timestamp_seconds", time.time())
+    metrics.set_gauge("indexer_last_run_success", 1 if succeeded else 0)
+    try:
+        metrics.write_textfile(METRICS_TEXTFILE_PATH)
+    except OSError as e:
+        logging.warning(f"Could not write metrics to {METRICS_TEXTFILE_PATH}: {e}")
+
 
 if __name__ == "__main__":
     logging.info(f"--- Starting Website Indexing Script ---")
-    
-    # TODO: Implement startup checks and main execution flow.
-    # 1. Check Qdrant connection health before starting the indexing process.
-    #    - A simple way is to try to get cluster info: `qdrant.get_collections()` or `qdrant.cluster_info()`.
-    #    - Wrap this in a `try-except` block. If it fails, log an error and exit (`exit(1)`).
-    #    (The existing try-except block below can be adapted for this.)
-    # 2. Define the `site_to_index` (using the `SITE_TO_INDEX` constant is good).
-    # 3. Call the main `index_website(site_to_index)` function.
-    # 4. Wrap the `index_website` call in a `try-except` block to catch any errors during the main process.
-    #    Log a generic error message if something goes wrong.
-    
+    # Load environment variables from .env file
+    load_dotenv()
+    if not os.getenv("OPENAI_API_KEY"):
+        logging.error("OPENAI_API_KEY environment variable not found. Please set it in your .env file.")
+        exit(1)
+    if METRICS_ENABLED:
+        metrics.enable()
+    init_clients()
+
+    if qdrant is not None:
+        try:
+            collections_response = qdrant.get_collections()
+            logging.info(f"Successfully connected to Qdrant. Collections: {[c.name for c in collections_response.collections]}")
+        except Exception as e:
+            logging.error(f"Could not connect to Qdrant at {QDRANT_URL}. Please ensure Qdrant is running. Error: {e}")
+            exit(1)
+
     try:
-        # TODO: Check Qdrant connection using a client method like `qdrant.get_collections()`
-        # Example:
-        # collections_response = qdrant.get_collections()
-        # logging.info(f"Qdrant collections: {collections_response.collections}")
-        # This confirms the client can communicate with the server.
-        # If an exception occurs, it will be caught by the except block below.
-        
-        logging.info("Successfully connected to Qdrant (or client initialized - actual check recommended).")
+        sites = load_sites(SITES_CONFIG_PATH, SITE_TO_INDEX)
+        failed = index_sites(sites)
     except Exception as e:
-        logging.error(f"Could not connect to Qdrant at {QDRANT_URL}. Please ensure Qdrant is running. Error: {e}")
+        logging.error(f"An error occurred during the indexing process: {e}")
+        _write_metrics(succeeded=False)
+        exit(1)
+    if failed:
+        logging.error(f"Indexing failed for: {', '.join(failed)}")
+        _write_metrics(succeeded=False)
         exit(1)
-        
-    # TODO: Run indexing for the SITE_TO_INDEX
-    # Example:
-    # try:
-    #     index_website(SITE_TO_INDEX)
-    #     logging.info(f"Indexing process for {SITE_TO_INDEX} completed.")
-    # except Exception as e:
-    #     logging.error(f"An error occurred during the indexing process for {SITE_TO_INDEX}: {e}")
-    #     # Optionally, re-raise or exit with an error code if it's a critical failure for an automated script
-    
-    logging.info(f"--- Indexing Script Finished ---")
\ No newline at end of file
+    logging.info(f"Indexing process for {', '.join(site.name for site in sites)} completed.")
+    _write_metrics(succeeded=True)
+
+    logging.info(f"--- Indexing Script Finished ---")
@@ -0,0 +1,28 @@
+import hashlib
+import re
+
+import numpy as np
+
+_WORD = re.compile(r"\w+")
+SHINGLE_SIZE = 3  # words per shingle
+
+
+def simhash(text: str, shingle_size: int = SHINGLE_SIZE) -> int:
+    """64-bit SimHash of `text` over lowercase word shingles.
+
+    Texts that share most of their shingles get fingerprints a small Hamming
+    distance apart. Shingles are hashed with BLAKE2b, so fingerprints are
+    stable across processes and can be persisted.
+    """
+    words = _WORD.findall(text.lower())
+    if not words:
+        return 0
+    shingles = {" ".join(words[i:i + shingle_size]) for i in range(max(1, len(words) - shingle_size + 1))}
+    digests = b"".join(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest() for s in shingles)
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8).reshape(len(shingles), 8), axis=1)
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 > len(shingles)
+    return int.from_bytes(np.packbits(votes).tobytes(), "big")
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
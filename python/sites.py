@@ -0,0 +1,60 @@
+import json
+import logging
+import os
+import re
+from typing import List, NamedTuple, Optional
+from urllib.parse import urlparse
+
+# --- Configuration ---
+SITES_CONFIG_PATH = "sites.json"  # shared by scrape_website.py and chat_app.py; see load_sites
+
+_NAME = re.compile(r"^[A-Za-z0-9_-]+$")  # safe in file names, collection names and payload filters
+
+
+class Site(NamedTuple):
+    name: str  # stored in every chunk payload as "site"
+    url: str
+    max_pages: Optional[int] = None  # None = the indexer's MAX_PAGES
+
+
+def site_name(url: str) -> str:
+    """Default name of the site at `url`: its host with dots and other separators as underscores."""
+    return re.sub(r"[^A-Za-z0-9_-]+", "_", urlparse(url).netloc or url).strip("_")
+
+
+def load_sites(path: Optional[str] = SITES_CONFIG_PATH, default_url: Optional[str] = None) -> List[Site]:
+    """Read the sites to index from the JSON file at `path`.
+
+    The file holds a list of {"url": ..., "name": ..., "max_pages": ...}
+    objects (only "url" is required) or plain URL strings. Without a file the
+    single `default_url` is used, if given.
+    """
+    if not path or not os.path.exists(path):
+        return [Site(site_name(default_url), default_url)] if default_url else []
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    sites = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {"url": entry}
+        site = Site(entry.get("name") or site_name(entry["url"]), entry["url"], entry.get("max_pages"))
+        if not _NAME.match(site.name):
+            raise ValueError(f"Invalid site name {site.name!r} in {path}: use letters, digits, '_' and '-' only")
+        if any(site.name == other.name for other in sites):
+            raise ValueError(f"Duplicate site name {site.name!r} in {path}")
+        sites.append(site)
+    logging.info(f"Loaded {len(sites)} site(s) from {path}: {', '.join(site.name for site in sites)}")
+    return sites
+
+
+def site_path(path: Optional[str], name: str) -> Optional[str]:
+    """Per-site variant of a state file path: "index_state.json" -> "index_state.<name>.json"."""
+    if not path:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{name}{ext}"
+
+
+def site_collection(collection_name: str, name: str, per_site: bool) -> str:
+    """Name (a Qdrant alias) of the collection holding site `name`'s chunks."""
+    return f"{collection_name}_{name}" if per_site else collection_name
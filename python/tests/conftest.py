@@ -0,0 +1,111 @@
+import hashlib
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import tiktoken
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "test")  # the indexer builds its OpenAI client when a run starts
+os.environ.setdefault("ANTHROPIC_API_KEY", "test")
+
+
+def serve(handler) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class FixtureSite:
+    """A website served from memory by a local HTTP server.
+
+    `pages` maps paths to HTML, `status` overrides the response code of a
+    path (e.g. 503), and every GET is recorded in `requests`. Pages carry an
+    ETag, so conditional GETs get 304 Not Modified while a page is unchanged.
+    """
+
+    def __init__(self):
+        self.pages = {}
+        self.status = {}
+        self.requests = []
+        self._lock = threading.Lock()
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with site._lock:
+                    site.requests.append(self.path)
+                path = self.path.split("?", 1)[0]
+                status = site.status.get(path)
+                html = site.pages.get(path)
+                if status is None and html is None:
+                    status = 404
+                if status is not None:
+                    self.send_error(status)
+                    return
+                body = html.encode("utf-8")
+                etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = serve(Handler)
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}/"
+
+    def page_requests(self, path: str) -> int:
+        with self._lock:
+            return sum(1 for requested in self.requests if requested.split("?", 1)[0] == path)
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def page_html(title: str, links=(), text: str = "") -> str:
+    anchors = "".join(f'<li><a href="{link}">{link}</a></li>' for link in links)
+    body = text or f"This is the page about {title}. It has some words of its own, unlike the others."
+    return f"<html><head><title>{title}</title></head><body><ul>{anchors}</ul><main><h1>{title}</h1><p>{body}</p></main></body></html>"
+
+
+@pytest.fixture
+def fixture_site():
+    site = FixtureSite()
+    yield site
+    site.close()
+
+
+@pytest.fixture
+def byte_encoding(monkeypatch):
+    """A byte-level tiktoken encoding in place of cl100k_base, which cannot be downloaded in offline test runs."""
+    import chunking
+
+    encoding = make_byte_encoding()
+    monkeypatch.setattr(chunking, "_encoding", encoding)
+    return encoding
+
+
+def make_byte_encoding() -> tiktoken.Encoding:
+    return tiktoken.Encoding(name="test_bytes", pat_str=r"\S+|\s+",
+                             mergeable_ranks={bytes([i]): i for i in range(256)},
+                             special_tokens={"<|endoftext|>": 256})
+
+
+def install_byte_encoding():
+    """Worker process initializer: the `byte_encoding` fixture does not reach processes started by the test."""
+    import chunking
+
+    chunking._encoding = make_byte_encoding()
@@ -0,0 +1,70 @@
+from bm25_index import BM25Index, reciprocal_rank_fusion
+from vector_store import SearchHit
+
+DOCS = {
+    "1": ("Bus 31 runs every ten minutes from Tonsenhagen", "a"),
+    "2": ("The metro line 5 goes around the ring", "a"),
+    "3": ("Night bus N31 runs on weekends", "b"),
+    "4": ("Tickets for the ferry are sold on board", "b"),
+}
+
+
+def build(path) -> BM25Index:
+    index = BM25Index(str(path))
+    index.add(list(DOCS), [text for text, _ in DOCS.values()], [{"site": site} for _, site in DOCS.values()])
+    index.save()
+    return index
+
+
+def test_search_ranks_by_bm25_and_ignores_unknown_terms(tmp_path):
+    index = build(tmp_path / "bm25.npz")
+
+    hits = index.search("bus runs", 10)
+
+    assert [hit.id for hit in hits] == ["3", "1"]  # same terms, but the shorter chunk scores higher
+    assert hits[0].score >= hits[1].score > 0
+    assert [hit.id for hit in index.search("31 Tonsenhagen", 10)][0] == "1"
+    assert index.search("submarine", 10) == []
+
+
+def test_saved_index_is_loaded_by_another_reader(tmp_path):
+    path = tmp_path / "bm25.npz"
+    build(path)
+
+    reader = BM25Index(str(path))
+
+    assert len(reader) == len(DOCS)
+    assert [hit.id for hit in reader.search("ferry tickets", 1)] == ["4"]
+    assert reader.search("ferry tickets", 1)[0].payload == {"site": "b"}
+
+
+def test_changes_are_applied_on_save(tmp_path):
+    index = build(tmp_path / "bm25.npz")
+    index.remove(["4"])
+    index.add(["2"], ["Ferry to the islands"], [{"site": "a"}])
+    assert [hit.id for hit in BM25Index(index.path).search("ferry", 10)] == ["4"]  # not saved yet
+
+    index.save()
+
+    assert [hit.id for hit in BM25Index(index.path).search("ferry", 10)] == ["2"]
+    assert index.search("metro", 10) == []
+    assert len(index) == len(DOCS) - 1
+
+
+def test_where_restricts_hits_to_matching_payloads(tmp_path):
+    index = build(tmp_path / "bm25.npz")
+
+    assert [hit.id for hit in index.search("bus", 10, where={"site": "b"})] == ["3"]
+    assert [hit.id for hit in index.search("bus", 10, where={"site": "a"})] == ["1"]
+    assert index.search("bus", 10, where={"site": "c"}) == []
+
+
+def test_reciprocal_rank_fusion_favours_chunks_ranked_high_in_both_lists():
+    dense = [SearchHit("a", 0.9, {"n": 1}), SearchHit("b", 0.8, {"n": 2}), SearchHit("c", 0.7, {"n": 3})]
+    keyword = [SearchHit("b", 12.0, {"n": 2}), SearchHit("d", 9.0, {"n": 4})]
+
+    fused = reciprocal_rank_fusion([dense, keyword], top_k=3, k=60)
+
+    assert [hit.id for hit in fused] == ["b", "a", "d"]
+    assert fused[0].score == 1 / 62 + 1 / 61
+    assert fused[0].payload == {"n": 2}
@@ -0,0 +1,73 @@
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_BUDGET = 0.5  # seconds for `import chat_app` after chainlit; typically well under half of that
+
+
+def run_child(script: str, workdir) -> dict:
+    """Run `script` against a fresh `chat_app` in `workdir` (chainlit writes its config there); returns its JSON output."""
+    env = dict(os.environ, PYTHONPATH=APP_DIR, OPENAI_API_KEY="test", ANTHROPIC_API_KEY="test")
+    result = subprocess.run([sys.executable, "-c", textwrap.dedent(script)], cwd=workdir, env=env,
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_importing_the_app_leaves_the_client_libraries_unloaded(tmp_path):
+    result = run_child("""
+        import json, sys, time
+        import chainlit  # loaded by `chainlit run` before the app
+        started = time.perf_counter()
+        import chat_app
+        imported = time.perf_counter() - started
+        print(json.dumps({"seconds": imported,
+                          "loaded": [name for name in ("openai", "anthropic", "qdrant_client") if name in sys.modules]}))
+    """, tmp_path)
+
+    assert result["loaded"] == []
+    assert result["seconds"] < IMPORT_BUDGET
+
+
+def test_warm_up_sends_one_request_per_async_client(tmp_path):
+    result = run_child("""
+        import asyncio, json, types
+        import chat_app
+
+        calls = []
+
+        async def request(name, *args, **kwargs):
+            calls.append(name)
+
+        async def fail(*args, **kwargs):
+            calls.append("anthropic")
+            raise ConnectionError("unreachable")
+
+        class Store:
+            collection_name = "docs"
+
+            async def count_async(self, where=None):
+                calls.append("vector store")
+                return 3
+
+        chat_app.async_openai_client = types.SimpleNamespace(
+            models=types.SimpleNamespace(list=lambda: request("openai")))
+        chat_app.async_anthropic_client = types.SimpleNamespace(get=fail)
+        chat_app.vector_store, chat_app.bm25_index, chat_app._clients_ready = Store(), None, True
+        chat_app.STATUS_REFRESH_INTERVAL = 3600
+
+        async def main():
+            task = asyncio.create_task(chat_app._refresh_status_forever())
+            while chat_app._status_cache.get(None) is None:
+                await asyncio.sleep(0.01)
+            task.cancel()
+
+        asyncio.run(main())
+        print(json.dumps({"calls": sorted(calls), "status": chat_app._status_cache[None][1]}))
+    """, tmp_path)
+
+    assert result["calls"] == ["anthropic", "openai", "vector store"]  # a failed warm-up request is only logged
+    assert result["status"] == [True, "Collection 'docs' is ready with 3 indexed chunks."]
@@ -0,0 +1,24 @@
+import pytest
+
+import chunking
+
+TEXT = ("Kjøp billett før avgang. Sone 1 – Jernbanetorget → Oslo S. 😀 Reisende må vise billett.\n" * 30
+        + "A page can quote <|endoftext|> like any other text. ")
+
+
+def test_offsets_match_decode_with_offsets(byte_encoding):
+    tokens = byte_encoding.encode(TEXT, disallowed_special=())
+
+    assert chunking._token_offsets(byte_encoding, tokens, TEXT).tolist() == byte_encoding.decode_with_offsets(tokens)[1]
+
+
+@pytest.mark.parametrize("snap", [False, True])
+def test_chunks_are_trimmed_slices_covering_the_text(byte_encoding, snap):
+    spans = chunking.chunk_spans(TEXT, size=200, overlap=20, snap=snap)
+
+    assert len(spans) > 10
+    assert all(type(start) is int and type(end) is int for start, end in spans)
+    assert spans[0][0] == 0 and spans[-1][1] == len(TEXT.rstrip())
+    assert all(start < next_start <= end for (start, end), (next_start, _) in zip(spans, spans[1:]))
+    assert all(not TEXT[start].isspace() and not TEXT[end - 1].isspace() for start, end in spans)
+    assert any("<|endoftext|>" in TEXT[start:end] for start, end in spans)
@@ -0,0 +1,62 @@
+from content_filter import ContentFilter, block_hash, page_fingerprint, strip_boilerplate
+
+TEXT = " ".join(f"Departure {i} leaves platform {i % 7} at {8 + i % 12}:{i % 60:02d} towards the city centre."
+                for i in range(60))
+
+
+def test_exact_duplicates_are_reported_with_the_original_url():
+    content_filter = ContentFilter()
+    assert content_filter.check("https://example.com/a", *page_fingerprint(TEXT)) is None
+
+    assert content_filter.check("https://example.com/a?print=1", *page_fingerprint(TEXT)) == \
+        ("exact", "https://example.com/a")
+    assert content_filter.check("https://example.com/a", *page_fingerprint(TEXT)) is None  # the page itself
+    assert content_filter.exact_duplicates == 1
+
+
+def test_near_duplicates_are_detected_and_different_pages_are_kept():
+    content_filter = ContentFilter(max_distance=6)
+    content_filter.check("https://example.com/a", *page_fingerprint(TEXT))
+
+    edited = TEXT.replace("Departure 3 ", "Departure three ")
+    assert content_filter.check("https://example.com/b", *page_fingerprint(edited)) == \
+        ("near", "https://example.com/a")
+
+    other = " ".join(f"Ticket type {i} costs {i * 10} kroner for zone {i % 4}." for i in range(60))
+    assert content_filter.check("https://example.com/c", *page_fingerprint(other)) is None
+    assert (content_filter.exact_duplicates, content_filter.near_duplicates) == (0, 1)
+
+
+def test_registered_pages_count_as_originals():
+    content_filter = ContentFilter()
+    content_filter.register("https://example.com/a", *page_fingerprint(TEXT))
+
+    assert content_filter.check("https://example.com/b", *page_fingerprint(TEXT)) == ("exact", "https://example.com/a")
+
+
+def test_blocks_on_enough_pages_are_learned_as_boilerplate():
+    menu = "Home | Travel planner | Tickets | Contact us"
+    content_filter = ContentFilter(min_pages=3, min_fraction=0.5)
+    for i in range(3):
+        assert block_hash(menu) not in content_filter.boilerplate
+        _, hashes, _, _ = strip_boilerplate([menu, f"Page {i} has its own long enough text."],
+                                            content_filter.boilerplate)
+        content_filter.observe(hashes, 0, 0)
+
+    assert content_filter.boilerplate == {block_hash(menu)}
+    text, _, dropped, dropped_chars = strip_boilerplate([menu, "The fourth page keeps its own text."],
+                                                        content_filter.boilerplate)
+    assert text == "The fourth page keeps its own text."
+    assert (dropped, dropped_chars) == (1, len(menu))
+
+
+def test_blocks_on_too_small_a_share_of_pages_are_not_boilerplate():
+    content_filter = ContentFilter(min_pages=2, min_fraction=0.5, known_boilerplate=["known"])
+    footer = block_hash("A footer that only a few of the pages have.")
+    content_filter.observe([footer], 0, 0)
+    for i in range(4):
+        content_filter.observe([block_hash(f"Unique text of page number {i}.")], 0, 0)
+    content_filter.observe([footer], 0, 0)
+
+    assert content_filter.boilerplate == {"known"}  # 2 of 6 pages is below the 50% share
+    assert block_hash("Ja") is None
@@ -0,0 +1,71 @@
+from context_packing import CONTEXT_SEPARATOR, assemble_context
+from vector_store import SearchHit
+
+PAGE = ("Buses leave the central station every ten minutes during the day. "
+        "At night the N-lines run twice an hour towards the suburbs. "
+        "Tickets bought in the app are valid on buses, trams, the metro and the ferries. "
+        "Children under six travel for free with an adult.")
+
+
+def chunk_hit(pid, url, text, start, score=1.0):
+    return SearchHit(pid, score, {"url": url, "text": text[start[0]:start[1]],
+                                  "char_start": start[0], "char_end": start[1]})
+
+
+def spans(text, n):
+    size = len(text) // n
+    return [(i * size, len(text) if i == n - 1 else (i + 1) * size + 10) for i in range(n)]
+
+
+def test_overlapping_chunks_of_a_page_are_merged_into_one_block(byte_encoding):
+    a, b, c = spans(PAGE, 3)
+    hits = [chunk_hit("2", "https://example.com/a", PAGE, b), chunk_hit("1", "https://example.com/a", PAGE, a),
+            chunk_hit("3", "https://example.com/a", PAGE, c)]
+
+    context, sources, stats = assemble_context(hits, token_budget=10_000)
+
+    assert context == PAGE
+    assert sources == ["https://example.com/a"]
+    assert (stats.hits, stats.blocks, stats.merged, stats.duplicates) == (3, 1, 2, 0)
+
+
+def test_a_chunk_repeated_inside_a_merged_block_of_another_page_is_dropped(byte_encoding):
+    a, b, c = spans(PAGE, 3)
+    other_page = PAGE[b[0]:b[1]]  # e.g. the same paragraph copied to a news article
+    hits = [chunk_hit("1", "https://example.com/a", PAGE, a), chunk_hit("2", "https://example.com/a", PAGE, b),
+            chunk_hit("3", "https://example.com/a", PAGE, c),
+            SearchHit("4", 0.5, {"url": "https://example.com/news", "text": other_page})]
+
+    context, sources, stats = assemble_context(hits, token_budget=10_000)
+
+    assert context == PAGE
+    assert sources == ["https://example.com/a"]
+    assert stats.duplicates == 1
+
+
+def test_near_duplicate_blocks_keep_the_better_ranked_one(byte_encoding):
+    text = "Opening hours of the service centre: weekdays eight to four, Saturdays ten to two, closed on Sundays."
+    hits = [SearchHit("1", 0.9, {"url": "https://example.com/a", "text": text}),
+            SearchHit("2", 0.8, {"url": "https://example.com/b", "text": text.replace("Sundays", "Sundays.")}),
+            SearchHit("3", 0.7, {"url": "https://example.com/c", "text": "Lost property is kept for three months."})]
+
+    context, sources, stats = assemble_context(hits, token_budget=10_000, max_distance=3)
+
+    assert context == text + CONTEXT_SEPARATOR + "Lost property is kept for three months."
+    assert sources == ["https://example.com/a", "https://example.com/c"]
+    assert stats.duplicates == 1
+
+
+def test_blocks_that_do_not_fit_are_skipped_for_smaller_ones(byte_encoding):
+    hits = [SearchHit("1", 0.9, {"url": "https://example.com/a", "text": "x" * 50}),
+            SearchHit("2", 0.8, {"url": "https://example.com/b", "text": "y" * 100}),
+            SearchHit("3", 0.7, {"url": "https://example.com/c", "text": "z" * 20})]
+    budget = 50 + len(CONTEXT_SEPARATOR.encode()) + 20  # one byte per token
+
+    context, sources, stats = assemble_context(hits, token_budget=budget)
+
+    assert sources == ["https://example.com/a", "https://example.com/c"]
+    assert stats.dropped == 1 and stats.tokens_after <= budget
+
+    context, _, _ = assemble_context(hits[1:2], token_budget=30)
+    assert context == "y" * 30  # a first block over the budget is truncated
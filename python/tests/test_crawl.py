@@ -0,0 +1,115 @@
+import pytest
+
+import scrape_website
+from conftest import page_html
+
+
+@pytest.fixture(autouse=True)
+def _no_sitemaps(monkeypatch):
+    monkeypatch.setattr(scrape_website, "USE_SITEMAPS", False)
+
+
+def crawl(site, **kwargs):
+    kwargs.setdefault("delay", 0)
+    kwargs.setdefault("concurrency", 8)
+    return [url for url, _, _ in scrape_website._crawl(site.url, **kwargs)]
+
+
+def linked_site(site, n_pages: int):
+    """Pages 0..n-1 that all link to each other, also through fragment and query string variants."""
+    paths = ["/"] + [f"/page{i}.html" for i in range(1, n_pages)]
+    for i, path in enumerate(paths):
+        links = paths + [f"{p}#top" for p in paths] + [f"{p}?ref={i}" for p in paths]
+        site.pages[path] = page_html(f"Page {i}", links)
+    return paths
+
+
+def test_every_page_is_fetched_and_yielded_once(fixture_site):
+    paths = linked_site(fixture_site, 30)
+
+    urls = crawl(fixture_site, max_pages=100)
+
+    assert len(urls) == len(set(urls)) == len(paths)
+    assert set(urls) == {fixture_site.url + path.lstrip("/") for path in paths}
+    assert all(fixture_site.page_requests(path) == 1 for path in paths)
+
+
+def test_off_domain_links_are_not_followed(fixture_site):
+    host_alias = fixture_site.url.replace("127.0.0.1", "localhost")  # same server, different host name
+    fixture_site.pages["/"] = page_html("Home", ["/inside.html", "http://example.invalid/away.html",
+                                                 host_alias + "alias.html", "mailto:someone@example.invalid",
+                                                 "javascript:void(0)"])
+    fixture_site.pages["/inside.html"] = page_html("Inside")
+    fixture_site.pages["/alias.html"] = page_html("Alias")
+
+    urls = crawl(fixture_site, max_pages=100)
+
+    assert sorted(urls) == [fixture_site.url, fixture_site.url + "inside.html"]
+    assert fixture_site.page_requests("/alias.html") == 0
+
+
+@pytest.mark.parametrize("max_pages", [1, 7, 10])
+def test_max_pages_is_exact_with_concurrent_fetches(fixture_site, max_pages):
+    linked_site(fixture_site, 40)
+
+    urls = crawl(fixture_site, max_pages=max_pages, concurrency=8)
+
+    assert len(urls) == len(set(urls)) == max_pages
+    assert len(fixture_site.requests) == max_pages
+
+
+def test_failed_fetches_are_skipped_and_do_not_count(fixture_site):
+    paths = linked_site(fixture_site, 10)
+    fixture_site.status["/page3.html"] = 500
+    del fixture_site.pages["/page4.html"]  # 404
+
+    urls = crawl(fixture_site, max_pages=8)
+
+    expected = {fixture_site.url + path.lstrip("/") for path in paths if path not in ("/page3.html", "/page4.html")}
+    assert set(urls) == expected
+    assert len(urls) == 8
+
+
+def test_not_modified_pages_are_reported_as_unchanged(fixture_site):
+    paths = linked_site(fixture_site, 12)
+    page_state = {}
+    first = crawl(fixture_site, max_pages=100, page_state=page_state)
+    assert len(first) == len(paths)
+    fixture_site.pages["/page5.html"] = page_html("Page 5", paths, text="Changed since the last crawl.")
+
+    unchanged = []
+    second = crawl(fixture_site, max_pages=100, page_state=page_state, unchanged=unchanged)
+
+    assert second == [fixture_site.url + "page5.html"]
+    assert sorted(unchanged + second) == sorted(first)  # links of 304 pages come from page_state
+    assert all(fixture_site.page_requests(path) == 2 for path in paths)
+
+
+def test_not_modified_pages_count_towards_max_pages(fixture_site):
+    linked_site(fixture_site, 20)
+    page_state = {}
+    crawl(fixture_site, max_pages=100, page_state=page_state)
+
+    unchanged = []
+    urls = crawl(fixture_site, max_pages=6, page_state=page_state, unchanged=unchanged)
+
+    assert urls == []
+    assert len(unchanged) == 6
+
+
+def test_temporary_failures_keep_previously_crawled_pages(fixture_site):
+    paths = linked_site(fixture_site, 8)
+    fixture_site.pages["/only-linked-from-3.html"] = page_html("Leaf")
+    fixture_site.pages["/page3.html"] = page_html("Page 3", paths + ["/only-linked-from-3.html"])
+    page_state = {}
+    crawl(fixture_site, max_pages=100, page_state=page_state)
+
+    fixture_site.status["/page3.html"] = 503
+    del fixture_site.pages["/page5.html"]  # 404: really gone
+    unchanged = []
+    urls = crawl(fixture_site, max_pages=100, page_state=page_state, unchanged=unchanged)
+
+    assert urls == []
+    assert fixture_site.url + "page3.html" in unchanged
+    assert fixture_site.url + "only-linked-from-3.html" in unchanged  # reached through page 3's stored links
+    assert fixture_site.url + "page5.html" not in unchanged
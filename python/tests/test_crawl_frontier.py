@@ -0,0 +1,95 @@
+import gzip
+import itertools
+
+import scrape_website
+from conftest import page_html
+from crawl_frontier import CrawlFrontier, parse_sitemap
+
+SITEMAP = b"""<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <url><loc>https://example.com/old.html</loc><lastmod>2023-01-05</lastmod></url>
+  <url><loc> https://example.com/new.html </loc><lastmod>2024-03-01T10:00:00Z</lastmod></url>
+  <url><loc>https://example.com/undated.html</loc></url>
+  <url><lastmod>2024-01-01</lastmod></url>
+</urlset>"""
+
+SITEMAP_INDEX = b"""<?xml version="1.0" encoding="UTF-8"?>
+<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <sitemap><loc>https://example.com/sitemap-1.xml.gz</loc></sitemap>
+  <sitemap><loc>https://example.com/sitemap-2.xml</loc></sitemap>
+</sitemapindex>"""
+
+
+def test_parse_sitemap_reads_urls_and_lastmod():
+    pages, children = parse_sitemap(SITEMAP)
+
+    assert [url for url, _ in pages] == ["https://example.com/old.html", "https://example.com/new.html",
+                                         "https://example.com/undated.html"]
+    assert pages[0][1] < pages[1][1]
+    assert pages[2][1] is None
+    assert children == []
+
+
+def test_parse_sitemap_reads_gzipped_sitemap_indexes():
+    assert parse_sitemap(gzip.compress(SITEMAP_INDEX)) == (
+        [], ["https://example.com/sitemap-1.xml.gz", "https://example.com/sitemap-2.xml"])
+    assert parse_sitemap(b"<urlset><url>") == ([], [])
+
+
+def test_urls_are_handed_out_by_depth_then_newest_lastmod():
+    frontier = CrawlFrontier(":memory:")
+    frontier.start("https://example.com/")
+    assert frontier.add([("https://example.com/deep", 2, None), ("https://example.com/old", 1, 100.0),
+                         ("https://example.com/undated", 1, None), ("https://example.com/new", 1, 200.0)]) == 4
+    assert frontier.add([("https://example.com/new", 0, None)]) == 0  # already seen
+
+    order = [url for url, _ in iter(frontier.pop, None)]
+
+    assert order == ["https://example.com/new", "https://example.com/old", "https://example.com/undated",
+                     "https://example.com/deep"]
+
+
+def test_an_unfinished_crawl_is_resumed_and_a_finished_one_restarted(tmp_path):
+    path = str(tmp_path / "frontier.sqlite")
+    frontier = CrawlFrontier(path)
+    assert not frontier.start("https://example.com/")
+    frontier.add([("https://example.com/a", 0, None), ("https://example.com/b", 1, None),
+                  ("https://example.com/c", 1, None)])
+    frontier.pop(), frontier.pop()
+    frontier.complete("https://example.com/a", "text of a", {"etag": '"1"'})
+    frontier.close()  # interrupted with /b in flight
+
+    frontier = CrawlFrontier(path)
+    assert frontier.start("https://example.com/")
+    assert list(frontier.completed_pages()) == [("https://example.com/a", "text of a", {"etag": '"1"'})]
+    assert [url for url, _ in iter(frontier.pop, None)] == ["https://example.com/b", "https://example.com/c"]
+
+    frontier.finish()
+    assert not frontier.start("https://example.com/")
+    assert list(frontier.completed_pages()) == []
+    assert frontier.pop() is None
+    frontier.close()
+
+
+def test_a_resumed_crawl_only_fetches_the_pages_not_completed(fixture_site, tmp_path, monkeypatch):
+    monkeypatch.setattr(scrape_website, "USE_SITEMAPS", False)
+    paths = ["/"] + [f"/page{i}.html" for i in range(1, 12)]
+    for i, path in enumerate(paths):
+        fixture_site.pages[path] = page_html(f"Page {i}", paths)
+    path = str(tmp_path / "frontier.sqlite")
+
+    frontier = CrawlFrontier(path)
+    crawl = scrape_website._crawl(fixture_site.url, max_pages=100, concurrency=1, delay=0, frontier=frontier)
+    first = [url for url, _, _ in itertools.islice(crawl, 5)]
+    crawl.close()  # interrupted
+    frontier.close()
+    fetched_first = list(fixture_site.requests)
+
+    frontier = CrawlFrontier(path)
+    urls = [url for url, _, _ in scrape_website._crawl(fixture_site.url, max_pages=100, concurrency=1, delay=0,
+                                                        frontier=frontier)]
+    frontier.close()
+
+    assert sorted(urls) == sorted(fixture_site.url + p.lstrip("/") for p in paths)
+    assert all(fixture_site.page_requests(p) == 1 for p in paths if fixture_site.url + p.lstrip("/") in first)
+    assert len(fixture_site.requests) - len(fetched_first) <= len(paths) - len(first)
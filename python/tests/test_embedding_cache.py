@@ -0,0 +1,38 @@
+from embedding_cache import EmbeddingCache
+
+MODEL = "test-model"
+
+
+def vec(i):
+    return [float(i), 0.0, 1.0]
+
+
+def test_put_many_evicts_the_least_recently_used(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"), max_entries=3)
+    cache.put_many(MODEL, ["a", "b", "c"], [vec(1), vec(2), vec(3)])
+    assert cache.get_many(MODEL, ["a"]) == [vec(1)]  # "b" is now the least recently used
+
+    cache.put_many(MODEL, ["d"], [vec(4)])
+
+    assert cache.get_many(MODEL, ["a", "b", "c", "d"]) == [vec(1), None, vec(3), vec(4)]
+    cache.close()
+
+
+def test_put_many_counts_rows_only_when_over_the_limit(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = EmbeddingCache(path, max_entries=4)
+    statements = []
+    cache._conn.set_trace_callback(statements.append)
+
+    cache.put_many(MODEL, ["a", "b"], [vec(1), vec(2)])
+    cache.put_many(MODEL, ["a", "c"], [vec(10), vec(3)])  # "a" is refreshed, not counted twice
+    assert not [s for s in statements if "COUNT" in s]
+    assert cache.get_many(MODEL, ["a"]) == [vec(10)]
+
+    cache.put_many(MODEL, ["d", "e"], [vec(4), vec(5)])
+    assert len([s for s in statements if "COUNT" in s]) == 1
+    cache.close()
+
+    reopened = EmbeddingCache(path, max_entries=4)
+    assert reopened.get_many(MODEL, ["a", "b", "c", "d", "e"]).count(None) == 1
+    reopened.close()
@@ -0,0 +1,184 @@
+import base64
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+
+import numpy as np
+import openai
+import pytest
+
+from conftest import serve
+from embedding_executor import EmbeddingExecutor
+
+
+class StubEmbeddings:
+    """A local /v1/embeddings endpoint: the vector of text "<n>" is [n, 1.0].
+
+    `rate_limit(texts)` decides whether a request gets a 429 and
+    `server_error(texts)` whether it gets a 503, both with a retry-after-ms
+    header. Responses arrive after a random short delay and list their items
+    in reverse order, so the client has to put them back.
+    """
+
+    def __init__(self):
+        self.rate_limit = lambda texts: False
+        self.server_error = lambda texts: False
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.executor = None
+        self.limits = []  # executor concurrency limit seen by each request
+        lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: dict, headers=()):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                texts = request["input"]
+                with lock:
+                    stub.requests += 1
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                    if stub.executor is not None:
+                        stub.limits.append(stub.executor._limit.limit)
+                try:
+                    time.sleep(random.uniform(0.001, 0.01))
+                    if stub.rate_limit(texts):
+                        self._send(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                                   [("retry-after-ms", "20")])
+                        return
+                    if stub.server_error(texts):
+                        self._send(503, {"error": {"message": "Overloaded", "type": "server_error"}},
+                                   [("retry-after-ms", "20")])
+                        return
+                    data = []
+                    for i, text in enumerate(texts):
+                        vector = np.array([float(text), 1.0], dtype=np.float32)
+                        embedding = (base64.b64encode(vector.tobytes()).decode("ascii")
+                                     if request.get("encoding_format") == "base64" else vector.tolist())
+                        data.append({"object": "embedding", "index": i, "embedding": embedding})
+                    self._send(200, {"object": "list", "data": data[::-1], "model": request["model"],
+                                     "usage": {"prompt_tokens": len(texts), "total_tokens": len(texts)}})
+                finally:
+                    with lock:
+                        stub.in_flight -= 1
+
+        self._server = serve(Handler)
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def stub():
+    stub = StubEmbeddings()
+    yield stub
+    stub.close()
+
+
+def make_executor(stub, encoding, **kwargs) -> EmbeddingExecutor:
+    client = openai.OpenAI(api_key="test", base_url=stub.url)
+    executor = EmbeddingExecutor(client, "text-embedding-3-small", encoding, **kwargs)
+    stub.executor = executor
+    return executor
+
+
+TEXTS = [str(n) for n in range(300)]
+
+
+def test_order_is_preserved_across_packed_batches(stub, byte_encoding):
+    executor = make_executor(stub, byte_encoding, concurrency=4, max_tokens=20)
+
+    vectors = executor.embed(TEXTS)
+
+    batches = executor.pack_batches(TEXTS)
+    assert len(batches) > 10
+    assert all(sum(len(TEXTS[i]) for i in batch) <= 20 for batch in batches)
+    assert [int(vector[0]) for vector in vectors] == list(range(len(TEXTS)))
+    assert stub.requests == executor.requests_sent == len(batches)
+    assert stub.max_in_flight <= 4
+    executor.close()
+
+
+def test_concurrency_halves_on_rate_limit_and_recovers(stub, byte_encoding):
+    limited = []
+
+    def rate_limit_once(texts):
+        if not limited:
+            limited.append(texts)
+            return True
+        return False
+
+    stub.rate_limit = rate_limit_once
+    executor = make_executor(stub, byte_encoding, concurrency=4, max_inputs=5)
+    limits_after_429 = []
+    on_rate_limited = executor._limit.on_rate_limited
+
+    def record():
+        on_rate_limited()
+        limits_after_429.append(executor._limit.limit)
+
+    executor._limit.on_rate_limited = record
+
+    vectors = executor.embed(TEXTS)
+
+    assert [int(vector[0]) for vector in vectors] == list(range(len(TEXTS)))
+    assert executor.rate_limited == 1
+    assert executor.requests_sent == len(executor.pack_batches(TEXTS)) + 1  # one retry
+    assert limits_after_429 == [2]
+    assert min(stub.limits) < 4  # later requests ran under the reduced limit ...
+    assert executor._limit.limit == 4  # ... which grew back after enough successes
+    executor.close()
+
+
+def test_a_batch_failing_for_good_truncates_the_result(stub, byte_encoding):
+    stub.rate_limit = lambda texts: "123" in texts
+    executor = make_executor(stub, byte_encoding, concurrency=4, max_inputs=10, max_retries=2)
+
+    vectors = executor.embed(TEXTS)
+
+    failing_batch = next(batch for batch in executor.pack_batches(TEXTS) if 123 in batch)
+    assert len(vectors) == failing_batch[0]
+    assert [int(vector[0]) for vector in vectors] == list(range(failing_batch[0]))
+    assert executor.rate_limited == 3  # first attempt and both retries
+    executor.close()
+
+
+def test_retries_are_counted_by_reason(stub, byte_encoding):
+    failed = set()
+
+    def once(status):
+        def fail(texts):
+            if "7" in texts and status not in failed:
+                failed.add(status)
+                return True
+            return False
+        return fail
+
+    stub.rate_limit = once(429)
+    stub.server_error = once(503)
+    executor = make_executor(stub, byte_encoding, concurrency=1, max_inputs=10)
+
+    vectors = executor.embed(TEXTS)
+
+    assert len(vectors) == len(TEXTS)
+    assert executor.retry_counts() == {"rate_limited": 1, "server_error": 1}
+    assert executor.rate_limited == 1
+    executor.close()
@@ -0,0 +1,42 @@
+import pytest
+
+import html_extract
+from benchmarks.bench_extract import bs4_extract
+
+URL = "https://example.com/docs/page.html"
+
+PAGES = {
+    "entities": """<html><body><p>Fish &amp; chips &lt;cheap&gt; for&nbsp;two, caf&eacute; cr&#232;me &#x2014; &quot;ok&quot;</p>
+        <a href="/a?x=1&amp;y=2">A&amp;B</a></body></html>""",
+    "nested ignored tags": """<html><body>
+        <nav>Menu <script>var nav = "<b>x</b>";</script> <aside>inside nav <footer>deeper</footer></aside> still nav</nav>
+        <aside><nav><header>Nested</header></nav> aside text</aside>
+        <main><p>Kept <style>p { color: red }</style>text</p><a href="hidden.html">hidden?</a></main>
+        <footer><a href="/footer-link">Footer</a><script>document.write('<nav>')</script></footer>
+        <p>After the footer</p></body></html>""",
+    "br": """<html><body><p>first line<br>second line<br/>third<BR>fourth</p>
+        <p>a<br><br>b</p></body></html>""",
+    "pre": """<html><body><pre>
+def f(x):
+    return  x   *  2
+
+\tindented	with tabs
+</pre><p>after   the   pre</p></body></html>""",
+    "uppercase tags": """<HTML><HEAD><TITLE>Upper</TITLE><STYLE>BODY { margin: 0 }</STYLE></HEAD>
+        <BODY><NAV><A HREF="/nav.html">Nav</A></NAV><P>Shouting <B>text</B></P>
+        <SCRIPT>alert(1)</SCRIPT><A HREF=" relative.html ">Link</A><A Href="../up.html">Up</A></BODY></HTML>""",
+    "links": """<html><body><a href="#frag">f</a><a>no href</a><a href="">empty</a>
+        <a href="https://other.example.org/x">abs</a><a href="mailto:a@b.c">mail</a><p>text</p></body></html>""",
+}
+
+BACKENDS = ["html.parser"] + (["lxml"] if html_extract.etree is not None else [])
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("name", list(PAGES))
+def test_extract_page_matches_the_beautifulsoup_baseline(name, backend):
+    text, links = html_extract.extract_page(PAGES[name], URL, backend=backend)
+
+    expected_text, expected_links = bs4_extract(PAGES[name], URL)
+    assert text == expected_text
+    assert links == expected_links
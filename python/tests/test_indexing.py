@@ -0,0 +1,220 @@
+import hashlib
+import threading
+import time
+from functools import partial
+
+import numpy as np
+import pytest
+
+import scrape_website
+from conftest import FixtureSite, page_html
+from embedding_cache import EmbeddingCache
+from sites import Site
+
+DIM = 8
+
+
+def fake_embed(texts):
+    vectors = []
+    for text in texts:
+        seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+        vectors.append(np.random.default_rng(seed).standard_normal(DIM).tolist())
+    return vectors
+
+
+@pytest.fixture
+def indexer(monkeypatch, tmp_path, byte_encoding):
+    """scrape_website writing to the local backend in `tmp_path`, with fake (cached) embeddings and no politeness delay."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(scrape_website, "VECTOR_STORE_BACKEND", "local")
+    monkeypatch.setattr(scrape_website, "LOCAL_INDEX_DIR", str(tmp_path / "local_index"))
+    monkeypatch.setattr(scrape_website, "USE_SITEMAPS", False)
+    cache = EmbeddingCache(str(tmp_path / "embedding_cache.sqlite"))
+    monkeypatch.setattr(scrape_website, "embedding_cache", cache)
+    monkeypatch.setattr(scrape_website, "_embed_batches", fake_embed)
+    monkeypatch.setattr(scrape_website, "_crawl", partial(scrape_website._crawl, delay=0))
+    yield scrape_website
+    cache.close()
+
+
+def make_site(fixture_site, n_pages: int, prefix: str = "page"):
+    paths = ["/"] + [f"/{prefix}{i}.html" for i in range(1, n_pages)]
+    for i, path in enumerate(paths):
+        fixture_site.pages[path] = page_html(f"{prefix} {i}", paths, text=f"{prefix} number {i}. " * 40)
+    return paths
+
+
+def point_count(indexer, site_name=None):
+    store = scrape_website._Collection(indexer.COLLECTION_NAME, None).store
+    return store.count({"site": site_name} if site_name else None)
+
+
+@pytest.mark.parametrize("streaming", [True, False])
+def test_temporary_fetch_failure_keeps_the_page(indexer, fixture_site, streaming):
+    make_site(fixture_site, 10)
+    site = Site("a", fixture_site.url)
+    assert indexer.index_sites([site], streaming=streaming) == []
+    indexed = point_count(indexer)
+    assert indexed >= 10
+
+    fixture_site.status["/page4.html"] = 503
+    assert indexer.index_sites([site], streaming=streaming) == []
+    assert point_count(indexer) == indexed
+
+    del fixture_site.status["/page4.html"]
+    del fixture_site.pages["/page4.html"]  # now a 404
+    assert indexer.index_sites([site], streaming=streaming) == []
+    assert 0 < point_count(indexer) < indexed
+
+
+def streaming_target(indexer, fixture_site):
+    collection = scrape_website._Collection(indexer.COLLECTION_NAME, None)
+    collection.begin(rebuild=True)
+    return scrape_website._SiteIndex(Site("a", fixture_site.url), collection)
+
+
+def generated_pages(target, n_pages: int, fail_after: int = None):
+    for i in range(n_pages):
+        if i == fail_after:
+            time.sleep(0.5)  # long enough for the consumer to be waiting on an empty queue
+            raise RuntimeError("crawl failed")
+        url = f"{target.site.url}page{i}.html"
+        target.page_state[url] = {}
+        yield url, f"Text of page {i}. " * 50, None
+
+
+def run_with_deadline(function, *args, seconds: float = 20):
+    """Run `function` in a thread; fails the test if it has not returned within `seconds`."""
+    outcome = {}
+
+    def run():
+        try:
+            outcome["result"] = function(*args)
+        except Exception as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(seconds)
+    assert not thread.is_alive(), f"{function.__name__} did not return within {seconds}s"
+    return outcome
+
+
+def pipeline_threads():
+    return [t for t in threading.enumerate() if t.name == "index-crawl" or t.name.startswith("index-upsert-")]
+
+
+def test_streaming_returns_when_the_crawl_fails(indexer, fixture_site, monkeypatch):
+    monkeypatch.setattr(indexer, "BATCH_SIZE_EMBEDDING", 5)
+    target = streaming_target(indexer, fixture_site)
+
+    outcome = run_with_deadline(indexer._index_streaming, target, generated_pages(target, 100, fail_after=12))
+
+    assert outcome == {"result": None}
+    assert pipeline_threads() == []
+
+
+@pytest.mark.parametrize("stage", ["embed", "ensure", "upsert"])
+def test_streaming_stops_every_thread_when_a_stage_fails(indexer, fixture_site, monkeypatch, stage):
+    monkeypatch.setattr(indexer, "BATCH_SIZE_EMBEDDING", 5)
+    monkeypatch.setattr(indexer, "PIPELINE_QUEUE_SIZE", 5)
+    target = streaming_target(indexer, fixture_site)
+    produced = []
+
+    def pages():
+        for page in generated_pages(target, 1000):
+            produced.append(page[0])
+            yield page
+
+    def fail(*args, **kwargs):
+        raise ConnectionError(f"{stage} failed")
+
+    if stage == "embed":
+        monkeypatch.setattr(indexer, "_embed_texts", fail)
+    elif stage == "ensure":
+        monkeypatch.setattr(target.collection, "ensure", fail)
+    else:
+        monkeypatch.setattr(indexer, "_upsert_points", fail)
+
+    outcome = run_with_deadline(indexer._index_streaming, target, pages())
+
+    if stage == "upsert":
+        assert outcome == {"result": None}
+    else:
+        assert isinstance(outcome.get("error"), ConnectionError)
+    assert pipeline_threads() == []
+    assert len(produced) < 1000  # the crawl was stopped, not run to the end
+
+
+@pytest.fixture(params=["local", "qdrant"])
+def backend(request, indexer, monkeypatch):
+    if request.param == "qdrant":
+        import qdrant_client
+        monkeypatch.setattr(indexer, "VECTOR_STORE_BACKEND", "qdrant")
+        monkeypatch.setattr(indexer, "qdrant", qdrant_client.QdrantClient(":memory:"))
+    return request.param
+
+
+def bm25_sites(indexer):
+    from bm25_index import BM25Index
+    return sorted(payload["site"] for payload in BM25Index(indexer.BM25_INDEX_PATH).payloads())
+
+
+@pytest.mark.parametrize("incremental", [True, False])
+def test_indexing_some_sites_keeps_the_others_in_a_shared_collection(indexer, fixture_site, backend, incremental):
+    other_site = FixtureSite()
+    try:
+        make_site(fixture_site, 6, prefix="alpha")
+        make_site(other_site, 4, prefix="beta")
+        a, b = Site("a", fixture_site.url), Site("b", other_site.url)
+        assert indexer.index_sites([a]) == []
+        a_points = point_count(indexer, "a")
+        assert indexer.index_sites([b]) == []  # no state for b, but the collection exists
+        b_points = point_count(indexer, "b")
+        assert a_points > 0 and b_points > 0
+        assert point_count(indexer, "a") == a_points
+        assert bm25_sites(indexer).count("a") == a_points
+
+        del fixture_site.pages["/alpha5.html"]
+        assert indexer.index_sites([a], incremental=incremental) == []
+
+        assert 0 < point_count(indexer, "a") < a_points
+        assert point_count(indexer, "b") == b_points
+        assert point_count(indexer) == point_count(indexer, "a") + b_points
+        assert bm25_sites(indexer) == ["a"] * point_count(indexer, "a") + ["b"] * b_points
+    finally:
+        other_site.close()
+
+
+def test_a_failed_site_leaves_no_points_behind_in_a_shared_collection(indexer, fixture_site, backend, monkeypatch):
+    other_site = FixtureSite()
+    try:
+        make_site(fixture_site, 4, prefix="alpha")
+        make_site(other_site, 4, prefix="beta")
+        a, b = Site("a", fixture_site.url), Site("b", other_site.url)
+        assert indexer.index_sites([a, b]) == []
+        b_points = point_count(indexer, "b")
+
+        make_site(fixture_site, 6, prefix="alpha")
+        make_site(other_site, 6, prefix="beta")
+        upsert_points = indexer._upsert_points
+
+        def fail_after_writing_b(collection, ids, vectors, payloads):
+            upsert_points(collection, ids, vectors, payloads)
+            if any(payload["site"] == "b" for payload in payloads):
+                raise ConnectionError("connection lost after the upsert")
+
+        monkeypatch.setattr(indexer, "_upsert_points", fail_after_writing_b)
+        assert indexer.index_sites([a, b]) == ["b"]
+
+        a_points = point_count(indexer, "a")
+        assert point_count(indexer, "b") == b_points  # b's new pages are not kept without its state
+        assert bm25_sites(indexer) == ["a"] * a_points + ["b"] * b_points
+
+        monkeypatch.setattr(indexer, "_upsert_points", upsert_points)
+        assert indexer.index_sites([a, b]) == []
+        assert point_count(indexer, "a") == a_points
+        assert point_count(indexer, "b") > b_points
+        assert bm25_sites(indexer) == ["a"] * a_points + ["b"] * point_count(indexer, "b")
+    finally:
+        other_site.close()
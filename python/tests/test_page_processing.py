@@ -0,0 +1,38 @@
+import os
+import subprocess
+import sys
+
+from conftest import install_byte_encoding
+from page_processing import PageProcessor, process_page
+
+PAGE = ("<html><body><nav>Menu</nav><main>"
+        + "".join(f"<p>Paragraph {i} of the page, with enough text to fill several chunks.</p>" for i in range(40))
+        + "<a href='/a.html'>A</a></main><script>var x = 1;</script></body></html>").encode("utf-8")
+
+
+def test_worker_processes_are_not_forked_from_the_threaded_parent(byte_encoding):
+    processor = PageProcessor(1, 200, 20, initializer=install_byte_encoding)
+    try:
+        assert processor._pool._mp_context.get_start_method() in ("forkserver", "spawn")
+        processed = processor(PAGE, None, "https://example.com/")
+    finally:
+        processor.close()
+
+    assert len(processed.chunks) > 1
+    assert processed == process_page(PAGE, None, "https://example.com/", 200, 20)
+
+
+def test_importing_the_indexer_has_no_side_effects(tmp_path):
+    # Parse workers re-import the indexer script, so its import must not build clients or open files.
+    script = (
+        "import sys, metrics, scrape_website as s; "
+        "assert s.openai_client is None and s.qdrant is None and s.embedding_cache is None; "
+        "assert not metrics._collectors; "
+        "assert 'qdrant_client' not in sys.modules"
+    )
+    env = {k: v for k, v in os.environ.items() if k != "OPENAI_API_KEY"}
+    env["PYTHONPATH"] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-c", script], cwd=tmp_path, env=env, capture_output=True, text=True)
+
+    assert result.returncode == 0, result.stderr
+    assert os.listdir(tmp_path) == []
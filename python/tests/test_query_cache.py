@@ -0,0 +1,70 @@
+import os
+
+import query_cache
+from query_cache import QueryCache, normalize_query
+
+ANSWER = ("It opens at nine.", ["https://example.com/hours"])
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_normalize_query_ignores_case_spacing_and_trailing_punctuation():
+    assert normalize_query("  When does it\tOPEN? ") == normalize_query("when does it open") == "when does it open"
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(query_cache.time, "monotonic", clock)
+    cache = QueryCache(ttl=60)
+    cache.put("opening hours", [1.0, 0.0], ANSWER)
+
+    clock.now += 59
+    assert cache.get_exact("opening hours") == ANSWER
+    assert cache.get_similar([1.0, 0.0]) == ANSWER
+
+    clock.now += 2
+    assert cache.get_exact("opening hours") is None
+    assert cache.get_similar([1.0, 0.0]) is None
+    assert (cache.exact_hits, cache.semantic_hits, cache.misses) == (1, 1, 1)
+
+
+def test_the_least_recently_used_entry_is_evicted():
+    cache = QueryCache(max_entries=2)
+    cache.put("a", [1.0, 0.0, 0.0], ("A", []))
+    cache.put("b", [0.0, 1.0, 0.0], ("B", []))
+    assert cache.get_exact("a") == ("A", [])  # "b" is now the least recently used
+
+    cache.put("c", [0.0, 0.0, 1.0], ("C", []))
+
+    assert cache.get_exact("b") is None
+    assert cache.get_exact("a") == ("A", [])
+    assert cache.get_exact("c") == ("C", [])
+
+
+def test_similar_queries_are_matched_above_the_threshold_within_their_scope():
+    cache = QueryCache(threshold=0.9)
+    cache.put("opening hours", [1.0, 0.1], ANSWER, scope="a")
+
+    assert cache.get_similar([1.0, 0.0], scope="a") == ANSWER
+    assert cache.get_similar([1.0, 0.0], scope="b") is None
+    assert cache.get_similar([0.0, 1.0], scope="a") is None
+
+
+def test_a_new_index_version_drops_every_entry(tmp_path):
+    version_path = tmp_path / "index_version"
+    version_path.write_text("1\n")
+    cache = QueryCache(version_path=str(version_path))
+    cache.put("opening hours", [1.0, 0.0], ANSWER)
+    assert cache.get_exact("opening hours") == ANSWER
+
+    stat = os.stat(version_path)
+    os.utime(version_path, (stat.st_atime, stat.st_mtime + 10))
+
+    assert cache.get_exact("opening hours") is None
+    assert cache.get_similar([1.0, 0.0]) is None
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+from vector_store import LocalStore
+
+DIM = 16
+
+
+def corpus(n: int = 200, seed: int = 0):
+    vectors = np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+    ids = [f"p{i}" for i in range(n)]
+    payloads = [{"site": "a" if i % 2 else "b", "url": f"https://example.com/{i}"} for i in range(n)]
+    return ids, vectors, payloads
+
+
+def exact_top(vectors, query, top_k, rows=None):
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = unit @ (query / np.linalg.norm(query))
+    rows = np.arange(len(vectors)) if rows is None else np.asarray(rows)
+    order = rows[np.argsort(-scores[rows])][:top_k]
+    return [f"p{i}" for i in order], scores[order]
+
+
+def published_store(tmp_path, quantization=None, oversampling=2.0):
+    ids, vectors, payloads = corpus()
+    store = LocalStore(str(tmp_path), "docs", quantization)
+    store.ensure_collection(DIM)
+    store.upsert(ids, vectors.tolist(), payloads)
+    store.flush()
+    return LocalStore(str(tmp_path), "docs", quantization, oversampling), vectors
+
+
+def test_search_returns_the_nearest_vectors_with_their_payloads(tmp_path):
+    store, vectors = published_store(tmp_path)
+    query = np.random.default_rng(1).standard_normal(DIM)
+
+    hits = store.search(query.tolist(), 5)
+
+    expected_ids, expected_scores = exact_top(vectors, query, 5)
+    assert [hit.id for hit in hits] == expected_ids
+    assert np.allclose([hit.score for hit in hits], expected_scores, atol=1e-5)
+    assert hits[0].payload["url"] == f"https://example.com/{expected_ids[0][1:]}"
+
+
+def test_site_filter_only_returns_and_counts_that_site(tmp_path):
+    store, vectors = published_store(tmp_path)
+    query = np.random.default_rng(2).standard_normal(DIM)
+
+    hits = store.search(query.tolist(), 10, where={"site": "a"})
+
+    expected_ids, _ = exact_top(vectors, query, 10, rows=range(1, len(vectors), 2))
+    assert [hit.id for hit in hits] == expected_ids
+    assert {hit.payload["site"] for hit in hits} == {"a"}
+    assert store.count({"site": "a"}) == len(vectors) // 2
+    assert store.search(query.tolist(), 10, where={"site": "missing"}) == []
+
+
+def test_site_filter_skips_deleted_points(tmp_path):
+    store, vectors = published_store(tmp_path)
+    query = vectors[1]  # site "a"
+    store.delete(["p1"])
+
+    hits = store.search(query.tolist(), 3, where={"site": "a"})
+
+    assert "p1" not in [hit.id for hit in hits]
+    assert store.count({"site": "a"}) == len(vectors) // 2 - 1
+
+
+@pytest.mark.parametrize("quantization", ["float16", "int8"])
+def test_quantized_search_rescores_candidates_with_the_float32_vectors(tmp_path, quantization):
+    store, vectors = published_store(tmp_path, quantization, oversampling=4.0)
+    query = np.random.default_rng(3).standard_normal(DIM)
+
+    hits = store.search(query.tolist(), 10)
+
+    assert store._codes is not None and store._codes.dtype == np.dtype(quantization)
+    expected_ids, expected_scores = exact_top(vectors, query, 10)
+    assert [hit.id for hit in hits] == expected_ids
+    assert np.allclose([hit.score for hit in hits], expected_scores, atol=1e-5)  # exact, not quantized, scores
+
+
+@pytest.mark.parametrize("quantization", ["float16", "int8"])
+def test_quantized_search_with_a_site_filter(tmp_path, quantization):
+    store, vectors = published_store(tmp_path, quantization, oversampling=4.0)
+    query = np.random.default_rng(4).standard_normal(DIM)
+
+    hits = store.search(query.tolist(), 5, where={"site": "b"})
+
+    expected_ids, _ = exact_top(vectors, query, 5, rows=range(0, len(vectors), 2))
+    assert [hit.id for hit in hits] == expected_ids
+
+
+def test_quantization_recorded_by_the_writer_is_followed_by_readers(tmp_path):
+    published_store(tmp_path, "int8")
+
+    reader = LocalStore(str(tmp_path), "docs")
+    reader.search([1.0] * DIM, 1)
+
+    assert reader._codes is not None and reader._codes.dtype == np.int8
@@ -0,0 +1,540 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from qdrant_client.http.models import Filter
+
+# qdrant_client takes about half a second to import, so its models are imported where QdrantStore uses them:
+# the chat app starts without it and the local backend never loads it.
+
+_SCORE_BLOCK_ROWS = 256  # quantized rows widened to float32 at a time while scoring (small enough to stay in cache)
+_SCROLL_LIMIT = 1000  # points fetched per Qdrant scroll request (and per `points()` batch)
+
+Where = Optional[Dict[str, str]]  # payload filter: every key must equal its value, e.g. {"site": "ruter"}
+
+
+class SearchHit(NamedTuple):
+    """One search result; mirrors the fields of Qdrant's ScoredPoint that the chat app uses."""
+    id: str
+    score: float
+    payload: dict
+
+
+def _check_quantization(quantization: Optional[str], supported) -> Optional[str]:
+    if quantization not in supported:
+        raise ValueError(f"Unsupported vector quantization {quantization!r}; expected one of {supported}")
+    return quantization
+
+
+def _qdrant_filter(where: Where) -> Optional["Filter"]:
+    if not where:
+        return None
+    from qdrant_client.http.models import FieldCondition, Filter, MatchValue
+    return Filter(must=[FieldCondition(key=key, match=MatchValue(value=value)) for key, value in where.items()])
+
+
+class QdrantStore:
+    """Vector store backed by a Qdrant server (or Qdrant's in-memory client).
+
+    With `quantization` ("int8" scalar or "pq" product quantization) new
+    collections keep the quantized vectors in RAM and the originals on disk;
+    searches fetch `oversampling` times more candidates from the quantized
+    index and rescore them with the originals. The in-memory client ignores
+    quantization.
+
+    `collection_name` may be an alias. A rebuild writes into a `staging()`
+    collection and `publish()` then points the alias at it in one atomic
+    step, so searches never see a half-built collection. New collections get
+    a keyword payload index on every field in `payload_indexes`, for
+    filtered searches (`where`).
+    """
+
+    def __init__(self, client, collection_name: str, async_client=None, quantization: Optional[str] = None,
+                 oversampling: float = 2.0, payload_indexes: Sequence[str] = ()):
+        self.client = client
+        self.async_client = async_client
+        self.collection_name = collection_name
+        self.quantization = _check_quantization(quantization, (None, "int8", "pq"))
+        self.oversampling = oversampling
+        self.payload_indexes = tuple(payload_indexes)
+        from qdrant_client.http.models import QuantizationSearchParams, SearchParams
+        self._search_params = SearchParams(quantization=QuantizationSearchParams(
+            rescore=True, oversampling=oversampling)) if quantization else None
+
+    def _alias_target(self) -> Optional[str]:
+        """The collection behind this store's name if it is an alias, else None."""
+        for alias in self.client.get_aliases().aliases:
+            if alias.alias_name == self.collection_name:
+                return alias.collection_name
+        return None
+
+    def _is_collection(self) -> bool:
+        return any(c.name == self.collection_name for c in self.client.get_collections().collections)
+
+    def collection_exists(self) -> bool:
+        return self._is_collection() or self._alias_target() is not None
+
+    def ensure_collection(self, vector_size: int, recreate: bool = True):
+        if not recreate and self.collection_exists():
+            logging.info(f"Collection '{self.collection_name}' already exists, keeping it.")
+            return
+        logging.info(f"Recreating Qdrant collection: '{self.collection_name}' with vector size {vector_size}, "
+                     f"COSINE distance and quantization {self.quantization}.")
+        from qdrant_client.http.models import (CompressionRatio, Distance, PayloadSchemaType, ProductQuantization,
+                                               ProductQuantizationConfig, ScalarQuantization,
+                                               ScalarQuantizationConfig, ScalarType, VectorParams)
+        if self.quantization == "int8":
+            quantization_config = ScalarQuantization(scalar=ScalarQuantizationConfig(
+                type=ScalarType.INT8, quantile=0.99, always_ram=True))
+        elif self.quantization == "pq":
+            quantization_config = ProductQuantization(product=ProductQuantizationConfig(
+                compression=CompressionRatio.X16, always_ram=True))
+        else:
+            quantization_config = None
+        self.client.recreate_collection(
+            collection_name=self.collection_name,
+            vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE,
+                                        on_disk=True if quantization_config else None),
+            quantization_config=quantization_config,
+        )
+        for field in self.payload_indexes:
+            self.client.create_payload_index(collection_name=self.collection_name, field_name=field,
+                                             field_schema=PayloadSchemaType.KEYWORD)
+        time.sleep(2) # Delay for stability
+
+    def staging(self) -> "QdrantStore":
+        """A store for a new, uniquely named collection that `publish` can swap in behind this one's name."""
+        name = f"{self.collection_name}-{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        return QdrantStore(self.client, name, self.async_client, self.quantization, self.oversampling,
+                           self.payload_indexes)
+
+    def publish(self, staging: Optional["QdrantStore"] = None):
+        """Atomically point this store's alias at `staging`'s collection and drop the collection it replaced.
+
+        A plain collection of the same name (from before aliases were used)
+        has to be deleted first, so it is briefly unavailable once.
+        """
+        if staging is None or staging.collection_name == self.collection_name:
+            return  # Qdrant persists every write itself
+        from qdrant_client.http.models import CreateAlias, CreateAliasOperation, DeleteAlias, DeleteAliasOperation
+        previous = self._alias_target()
+        operations = [CreateAliasOperation(create_alias=CreateAlias(collection_name=staging.collection_name,
+                                                                    alias_name=self.collection_name))]
+        if previous is not None:
+            operations.insert(0, DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=self.collection_name)))
+        elif self._is_collection():
+            logging.warning(f"Replacing collection '{self.collection_name}' with an alias of the same name.")
+            self.client.delete_collection(collection_name=self.collection_name)
+        self.client.update_collection_aliases(change_aliases_operations=operations)
+        logging.info(f"Alias '{self.collection_name}' now points to collection '{staging.collection_name}'.")
+        if previous is not None:
+            self.client.delete_collection(collection_name=previous)
+
+    def discard(self, staging: Optional["QdrantStore"] = None):
+        """Drop an unpublished `staging` collection (after a failed rebuild)."""
+        if staging is not None and staging.collection_name != self.collection_name and staging._is_collection():
+            self.client.delete_collection(collection_name=staging.collection_name)
+
+    def upsert(self, ids: List[str], vectors: List[List[float]], payloads: List[dict]):
+        from qdrant_client.http.models import PointStruct
+        points = [PointStruct(id=pid, vector=vec, payload=pl) for pid, vec, pl in zip(ids, vectors, payloads)]
+        self.client.upsert(collection_name=self.collection_name, points=points, wait=True)
+
+    def delete(self, ids: List[str]):
+        from qdrant_client.http.models import PointIdsList
+        self.client.delete(collection_name=self.collection_name, points_selector=PointIdsList(points=ids), wait=True)
+
+    def point_ids(self, where: Where = None) -> List[str]:
+        """IDs of all points whose payload matches `where`."""
+        ids, offset = [], None
+        while True:
+            records, offset = self.client.scroll(collection_name=self.collection_name,
+                                                 scroll_filter=_qdrant_filter(where), limit=_SCROLL_LIMIT,
+                                                 offset=offset, with_payload=False, with_vectors=False)
+            ids.extend(str(record.id) for record in records)
+            if offset is None:
+                return ids
+
+    def points(self):
+        """Batches of (ids, vectors, payloads) of every point, e.g. to copy them into a `staging()` collection."""
+        offset = None
+        while True:
+            records, offset = self.client.scroll(collection_name=self.collection_name, limit=_SCROLL_LIMIT,
+                                                 offset=offset, with_payload=True, with_vectors=True)
+            if records:
+                yield ([str(record.id) for record in records], [record.vector for record in records],
+                       [record.payload for record in records])
+            if offset is None:
+                return
+
+    def flush(self):
+        pass  # Qdrant persists every write itself
+
+    def count(self, where: Where = None) -> int:
+        if where:
+            return self.client.count(collection_name=self.collection_name, count_filter=_qdrant_filter(where),
+                                     exact=True).count
+        return self.client.get_collection(collection_name=self.collection_name).points_count or 0
+
+    async def count_async(self, where: Where = None) -> int:
+        if where:
+            result = await self.async_client.count(collection_name=self.collection_name,
+                                                   count_filter=_qdrant_filter(where), exact=True)
+            return result.count
+        info = await self.async_client.get_collection(collection_name=self.collection_name)
+        return info.points_count or 0
+
+    def search(self, vector: List[float], top_k: int, where: Where = None) -> List[SearchHit]:
+        hits = self.client.search(collection_name=self.collection_name, query_vector=vector,
+                                  query_filter=_qdrant_filter(where), limit=top_k, with_payload=True,
+                                  search_params=self._search_params)
+        return [SearchHit(hit.id, hit.score, hit.payload) for hit in hits]
+
+    async def search_async(self, vector: List[float], top_k: int, where: Where = None) -> List[SearchHit]:
+        hits = await self.async_client.search(collection_name=self.collection_name, query_vector=vector,
+                                              query_filter=_qdrant_filter(where), limit=top_k, with_payload=True,
+                                              search_params=self._search_params)
+        return [SearchHit(hit.id, hit.score, hit.payload) for hit in hits]
+
+
+def _quantize(matrix: np.ndarray, quantization: str):
+    """(codes, per-row scales or None) of unit vectors: float16 as is, int8 scaled per row to its largest value."""
+    if quantization == "float16":
+        return matrix.astype(np.float16), None
+    scales = np.maximum(np.abs(matrix).max(axis=1), 1e-12).astype(np.float32) / 127
+    return np.rint(matrix / scales[:, None]).astype(np.int8), scales
+
+
+def _approximate_scores(codes: np.ndarray, scales: Optional[np.ndarray], query: np.ndarray) -> np.ndarray:
+    """Dot products of `query` with quantized rows, widening a block of rows at a time to bound memory."""
+    scores = np.empty(len(codes), dtype=np.float32)
+    for start in range(0, len(codes), _SCORE_BLOCK_ROWS):
+        block = codes[start:start + _SCORE_BLOCK_ROWS]
+        scores[start:start + len(block)] = block.astype(np.float32) @ query
+    if scales is not None:
+        scores *= scales
+    return scores
+
+
+class LocalStore:
+    """In-process vector store: a memory-mapped float32 matrix of unit vectors on disk.
+
+    Search is a normalized dot product (cosine similarity) over the whole
+    matrix with `argpartition` top-k, returning the same payloads as Qdrant.
+    Writes are buffered in memory and published by `flush()`, which writes a
+    new versioned vectors/payloads file pair and then atomically swaps
+    `meta.json`, so readers never see a half-written collection. Readers load
+    lazily and reload when `meta.json` changes.
+
+    With `quantization` ("float16" or "int8") `flush()` also writes a
+    quantized copy of the vectors, which readers load into RAM and scan
+    instead of the float32 matrix; the best `oversampling` x top_k
+    candidates are then rescored with their float32 vectors, so only those
+    rows of the memory map are ever read. Readers follow the quantization
+    recorded in `meta.json`; unpublished writes are searched exactly. int8
+    needs a quarter of the RAM and scans about as fast as float32; float16
+    halves it, but NumPy widens float16 slowly (see
+    benchmarks/bench_quantization.py).
+
+    Filtered searches (`where`) only score the rows whose payload matches,
+    found through a value -> rows index built per payload field on first use.
+    Since `flush()` is already atomic, `staging()` is just another store over
+    the same directory, whose writes stay in memory until `publish()` flushes
+    them over the published files.
+    """
+
+    def __init__(self, directory: str, collection_name: str, quantization: Optional[str] = None,
+                 oversampling: float = 2.0):
+        self.path = os.path.join(directory, collection_name)
+        self.collection_name = collection_name
+        self.quantization = _check_quantization(quantization, (None, "float16", "int8"))
+        self.oversampling = oversampling
+        self._lock = threading.RLock()
+        self._loaded_mtime = None
+        self._dim = None
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._codes = None  # quantized rows of the published matrix, if any
+        self._scales = None
+        self._pending = []  # unit vectors appended since the matrix was last materialized
+        self._alive = np.zeros(0, dtype=bool)
+        self._ids = []
+        self._payloads = []
+        self._row_of = {}
+        self._payload_index = {}  # field -> {value: rows}, rebuilt lazily after changes
+        self._dirty = False
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.path, "meta.json")
+
+    def _load(self):
+        try:
+            mtime = os.stat(self._meta_path).st_mtime
+        except OSError:
+            return
+        with open(self._meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(os.path.join(self.path, meta["payloads"]), "r", encoding="utf-8") as f:
+            rows = json.load(f)
+        dim, count = meta["dim"], len(rows)
+        codes = scales = None
+        if count:
+            matrix = np.memmap(os.path.join(self.path, meta["vectors"]), dtype=np.float32, mode="r", shape=(count, dim))
+            if meta.get("codes"):
+                dtype = np.int8 if meta["quantization"] == "int8" else np.float16
+                codes = np.fromfile(os.path.join(self.path, meta["codes"]), dtype=dtype).reshape(count, dim)
+            if meta.get("scales"):
+                scales = np.fromfile(os.path.join(self.path, meta["scales"]), dtype=np.float32)
+        else:
+            matrix = np.zeros((0, dim), dtype=np.float32)
+        self._dim = dim
+        self._matrix = matrix
+        self._codes, self._scales = codes, scales
+        self._pending = []
+        self._ids = [pid for pid, _ in rows]
+        self._payloads = [payload for _, payload in rows]
+        self._row_of = {pid: row for row, pid in enumerate(self._ids)}
+        self._alive = np.ones(count, dtype=bool)
+        self._payload_index = {}
+        self._loaded_mtime = mtime
+        logging.info(f"Loaded local vector index '{self.collection_name}' with {count} vectors of dim {dim}"
+                     f" (quantization {meta.get('quantization')}).")
+
+    def _ensure_loaded(self):
+        if self._dirty:
+            return  # unpublished local writes take precedence
+        try:
+            mtime = os.stat(self._meta_path).st_mtime
+        except OSError:
+            mtime = None
+        if mtime != self._loaded_mtime:
+            self._load()
+
+    def _rows_where(self, where: Dict[str, str]) -> np.ndarray:
+        """Rows (alive or not) whose payload matches every field of `where`."""
+        rows = None
+        for field, value in where.items():
+            index = self._payload_index.get(field)
+            if index is None:
+                groups = {}
+                for row, payload in enumerate(self._payloads):
+                    if payload is not None and field in payload:
+                        groups.setdefault(payload[field], []).append(row)
+                index = self._payload_index[field] = {key: np.asarray(group, dtype=np.int64)
+                                                      for key, group in groups.items()}
+            matches = index.get(value, np.zeros(0, dtype=np.int64))
+            rows = matches if rows is None else np.intersect1d(rows, matches, assume_unique=True)
+        return rows
+
+    def _materialize(self) -> np.ndarray:
+        if self._pending:
+            self._matrix = np.vstack([np.asarray(self._matrix), *self._pending])
+            self._pending = []
+        return self._matrix
+
+    def collection_exists(self) -> bool:
+        return os.path.exists(self._meta_path)
+
+    def ensure_collection(self, vector_size: int, recreate: bool = True):
+        with self._lock:
+            if not recreate:
+                self._ensure_loaded()
+            if not recreate and self._loaded_mtime is not None:
+                logging.info(f"Local index '{self.collection_name}' already exists, keeping it.")
+                return
+            logging.info(f"Creating local index '{self.collection_name}' with vector size {vector_size}.")
+            self._reset(vector_size)
+            self._dirty = True
+
+    def _reset(self, dim: Optional[int]):
+        self._dim = dim
+        self._matrix = np.zeros((0, dim or 0), dtype=np.float32)
+        self._codes = self._scales = None
+        self._pending = []
+        self._alive = np.zeros(0, dtype=bool)
+        self._ids, self._payloads, self._row_of = [], [], {}
+        self._payload_index = {}
+
+    def staging(self) -> "LocalStore":
+        return LocalStore(os.path.dirname(self.path), self.collection_name, self.quantization, self.oversampling)
+
+    def publish(self, staging: Optional["LocalStore"] = None):
+        if staging is None or staging is self:
+            self.flush()
+            return
+        staging.flush()
+        with self._lock:
+            self._loaded_mtime = None  # reload what `staging` published on next use
+
+    def discard(self, staging: Optional["LocalStore"] = None):
+        """Forget unpublished writes; the published files are reloaded on next use."""
+        store = self if staging is None else staging
+        with store._lock:
+            store._reset(None)
+            store._dirty = False
+            store._loaded_mtime = None
+
+    def upsert(self, ids: List[str], vectors: List[List[float]], payloads: List[dict]):
+        unit = np.array(vectors, dtype=np.float32)  # a copy: normalized in place below
+        unit /= np.maximum(np.linalg.norm(unit, axis=1, keepdims=True), 1e-12)
+        with self._lock:
+            self._ensure_loaded()
+            new_rows = []
+            for pid, vec, payload in zip(ids, unit, payloads):
+                pid = str(pid)
+                row = self._row_of.get(pid)
+                if row is None:
+                    self._row_of[pid] = len(self._ids)
+                    self._ids.append(pid)
+                    self._payloads.append(payload)
+                    new_rows.append(vec)
+                else:
+                    matrix = self._materialize()
+                    if not matrix.flags.writeable:
+                        self._matrix = matrix = np.array(matrix)
+                    matrix[row] = vec
+                    self._payloads[row] = payload
+            if new_rows:
+                self._pending.append(np.stack(new_rows))
+                self._alive = np.concatenate([self._alive, np.ones(len(new_rows), dtype=bool)])
+            self._codes = self._scales = None
+            self._payload_index = {}
+            self._dirty = True
+
+    def delete(self, ids: List[str]):
+        with self._lock:
+            self._ensure_loaded()
+            for pid in ids:
+                row = self._row_of.pop(str(pid), None)
+                if row is not None:
+                    self._alive[row] = False
+                    self._ids[row] = None
+                    self._payloads[row] = None
+            self._dirty = True
+
+    def flush(self):
+        """Publish buffered writes: compact deleted rows and atomically swap in new files."""
+        with self._lock:
+            if not self._dirty:
+                return
+            matrix = self._materialize()[self._alive]
+            rows = [[pid, payload] for pid, payload in zip(self._ids, self._payloads) if pid is not None]
+            os.makedirs(self.path, exist_ok=True)
+            version = uuid.uuid4().hex[:12]
+            vectors_file, payloads_file = f"vectors-{version}.f32", f"payloads-{version}.json"
+            np.ascontiguousarray(matrix, dtype=np.float32).tofile(os.path.join(self.path, vectors_file))
+            with open(os.path.join(self.path, payloads_file), "w", encoding="utf-8") as f:
+                json.dump(rows, f)
+            meta = {"dim": self._dim, "count": len(rows), "vectors": vectors_file, "payloads": payloads_file,
+                    "quantization": self.quantization}
+            if self.quantization and len(rows):
+                codes, scales = _quantize(np.asarray(matrix, dtype=np.float32), self.quantization)
+                meta["codes"] = f"codes-{version}.{'i8' if self.quantization == 'int8' else 'f16'}"
+                codes.tofile(os.path.join(self.path, meta["codes"]))
+                if scales is not None:
+                    meta["scales"] = f"scales-{version}.f32"
+                    scales.tofile(os.path.join(self.path, meta["scales"]))
+            tmp_meta = self._meta_path + ".tmp"
+            with open(tmp_meta, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(tmp_meta, self._meta_path)
+            current = {vectors_file, payloads_file, meta.get("codes"), meta.get("scales")}
+            for name in os.listdir(self.path):
+                if name.startswith(("vectors-", "payloads-", "codes-", "scales-")) and name not in current:
+                    try:
+                        os.remove(os.path.join(self.path, name))
+                    except OSError:
+                        pass  # still mapped by a reader on some platforms; removed on the next flush
+            self._dirty = False
+            self._load()
+
+    def count(self, where: Where = None) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            if self._dim is None:
+                raise FileNotFoundError(f"Local index '{self.collection_name}' not found in {self.path}")
+            if where:
+                return int(self._alive[self._rows_where(where)].sum())
+            return len(self._row_of)
+
+    async def count_async(self, where: Where = None) -> int:
+        return self.count(where)
+
+    def point_ids(self, where: Where = None) -> List[str]:
+        """IDs of all points whose payload matches `where`."""
+        with self._lock:
+            self._ensure_loaded()
+            if not where:
+                return list(self._row_of)
+            return [self._ids[row] for row in self._rows_where(where) if self._alive[row]]
+
+    def points(self):
+        """Batches of (ids, vectors, payloads) of every point, e.g. to copy them into a `staging()` collection."""
+        with self._lock:
+            self._ensure_loaded()
+            matrix = self._materialize()
+            rows = np.flatnonzero(self._alive)
+            ids, payloads = list(self._ids), list(self._payloads)
+        for start in range(0, len(rows), _SCROLL_LIMIT):
+            block = rows[start:start + _SCROLL_LIMIT]
+            yield [ids[row] for row in block], matrix[block].tolist(), [payloads[row] for row in block]
+
+    def search(self, vector: List[float], top_k: int, where: Where = None) -> List[SearchHit]:
+        query = np.asarray(vector, dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+        with self._lock:
+            self._ensure_loaded()
+            matrix = self._materialize()
+            codes, scales = self._codes, self._scales
+            alive, ids, payloads = self._alive, self._ids, self._payloads
+            rows = self._rows_where(where) if where else None
+        if not len(matrix):
+            return []
+        if rows is None:  # score every row, masking deleted ones
+            k = min(top_k, int(alive.sum()))
+            if k <= 0:
+                return []
+            scores = matrix @ query if codes is None else _approximate_scores(codes, scales, query)
+            if not alive.all():
+                scores = np.where(alive, scores, -np.inf)
+        else:  # score only the matching live rows; positions in `scores` map to `rows`
+            rows = rows[alive[rows]]
+            k = min(top_k, len(rows))
+            if k <= 0:
+                return []
+            scores = matrix[rows] @ query if codes is None else _approximate_scores(
+                codes[rows], None if scales is None else scales[rows], query)
+        if codes is not None:
+            n_candidates = min(len(scores), max(k, int(np.ceil(k * self.oversampling))))
+            candidates = np.argpartition(-scores, n_candidates - 1)[:n_candidates]
+            candidates = candidates[np.isfinite(scores[candidates])]
+            if rows is not None:
+                candidates = rows[candidates]
+            candidates = np.sort(candidates)  # in file order for the memory map
+            exact = matrix[candidates] @ query
+            order = np.argsort(-exact)[:k]
+            return [SearchHit(ids[row], float(exact[i]), payloads[row]) for i, row in zip(order, candidates[order])]
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [SearchHit(ids[row], float(scores[i]), payloads[row])
+                for i, row in zip(top, top if rows is None else rows[top])]
+
+    async def search_async(self, vector: List[float], top_k: int, where: Where = None) -> List[SearchHit]:
+        return self.search(vector, top_k, where)
+
+
+def open_store(backend: str, collection_name: str, qdrant=None, async_qdrant=None, local_dir: Optional[str] = None,
+               quantization: Optional[str] = None, oversampling: float = 2.0, payload_indexes: Sequence[str] = ()):
+    """Build the configured vector store ("qdrant" or "local")."""
+    if backend == "local":
+        return LocalStore(local_dir, collection_name, quantization, oversampling)
+    if backend == "qdrant":
+        return QdrantStore(qdrant, collection_name, async_qdrant, quantization, oversampling, payload_indexes)
+    raise ValueError(f"Unknown vector store backend: {backend!r}")